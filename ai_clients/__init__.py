@@ -1,16 +1,18 @@
-"""
-AI客户端接口包
-提供多种AI服务的客户端实现
-"""
-
-from ai_clients.deepseek import get_deepseek_response
-from ai_clients.ark import get_ark_response
-from ai_clients.coze import get_coze_response
-from ai_clients.moonshot import recognize_image_with_moonshot
-
-__all__ = [
-    'get_deepseek_response',
-    'get_ark_response',
-    'get_coze_response',
-    'recognize_image_with_moonshot'
+"""
+AI客户端接口包
+提供多种AI服务的客户端实现
+"""
+
+from ai_clients.deepseek import get_deepseek_response, stream_deepseek_response
+from ai_clients.ark import get_ark_response, stream_ark_response
+from ai_clients.coze import get_coze_response
+from ai_clients.moonshot import recognize_image_with_moonshot
+
+__all__ = [
+    'get_deepseek_response',
+    'stream_deepseek_response',
+    'get_ark_response',
+    'stream_ark_response',
+    'get_coze_response',
+    'recognize_image_with_moonshot'
 ] 
\ No newline at end of file
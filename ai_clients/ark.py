@@ -1,100 +1,171 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-"""
-火山方舟(ARK) API 客户端
-"""
-
-import logging
-import os
-import requests
-from config import ARK_API_KEY, ARK_BASE_URL, ARK_MODEL
-from utils.chat_context_manager import get_recent_conversation, save_chat_record
-
-logger = logging.getLogger(__name__)
-
-def get_user_prompt(user_id, intention_key, root_dir):
-    """
-    获取用户的自定义 Prompt，如果不存在则使用默认的 prompt.md
-    """
-    if "None" in intention_key:
-        prompt_path = os.path.join(root_dir, 'prompts', f'{user_id}.md')
-    elif "Constellation" in intention_key:
-        prompt_path = os.path.join(root_dir, 'prompts', f'{intention_key}.md')
-
-    if os.path.exists(prompt_path):
-        with open(prompt_path, 'r', encoding='utf-8') as file:
-            return file.read()
-    else:
-        with open(os.path.join(root_dir, 'prompt.md'), 'r', encoding='utf-8') as file:
-            return file.read()
-
-def get_ark_response(message, user_id, intention_key, root_dir=None):
-    """
-    调用火山方舟(ARK) API 获取回复，整合数据库中的上下文信息
-
-    Args:
-        message (str): 用户消息
-        user_id (str): 用户ID
-        intention_key (str): 意图关键词
-        root_dir (str, optional): 项目根目录
-
-    Returns:
-        str: 方舟模型的回复
-    """
-    try:
-        logger.info(f"调用火山方舟 API - 用户ID:{user_id}, 消息：{message}")
-
-        if root_dir:
-            user_prompt = get_user_prompt(user_id, intention_key, root_dir)
-        else:
-            user_prompt = "你是一个有用的AI助手。"
-            try:
-                with open('prompt.md', 'r', encoding='utf-8') as file:
-                    user_prompt = file.read()
-            except FileNotFoundError:
-                logger.warning("未找到 prompt.md 文件，使用默认 Prompt")
-
-        # 获取数据库中的历史对话记录
-        conversation_context = get_recent_conversation(user_id, limit=30)
-        system_message = f"{user_prompt}\n\n历史对话记录：\n{conversation_context}" if conversation_context else user_prompt
-
-        data = {
-            "model": ARK_MODEL,
-            "stream": False,
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": message}
-            ]
-        }
-
-        headers = {
-            "Authorization": f"Bearer {ARK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        response = requests.post(
-            f"{ARK_BASE_URL}/bots/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30
-        )
-
-        if response.status_code != 200:
-            logger.error(f"火山API错误[{response.status_code}]:{response.text}")
-            return "服务器响应异常，请稍后再试"
-
-        result = response.json()
-        if not result.get('choices'):
-            logger.error("火山API返回异常结构")
-            return "服务器响应异常，请稍后再试"
-
-        reply = result['choices'][0]['message']['content'].strip()
-
-        # 保存当前对话记录到数据库
-        save_chat_record(user_id, user_id, message, reply)
-
-        logger.info(f"火山API回复：{reply}")
-        return reply
-    except Exception as e:
-        logger.error(f"火山API调用失败：{str(e)}", exc_info=True)
-        return "暂时无法回复，请稍后再试"
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+火山方舟(ARK) API 客户端
+"""
+
+import json
+import logging
+import os
+from config import ARK_API_KEY, ARK_BASE_URL, ARK_MODEL
+from ai_clients import transport
+from ai_clients.prompts import prompt_registry
+from utils.context_builder import build_context_messages
+
+logger = logging.getLogger(__name__)
+
+# 项目根目录（当前文件所在目录的上一级）
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def get_user_prompt(user_id, intention_key, root_dir):
+    """
+    获取用户的自定义 Prompt，如果不存在则使用默认的 prompt.md
+    内容由 Prompt 注册表缓存，文件修改后自动重新加载
+
+    Args:
+        user_id (str): 用户ID
+        intention_key (str): 意图关键词
+        root_dir (str): 项目根目录
+
+    Returns:
+        str: Prompt 内容
+    """
+    return prompt_registry.get_user_prompt(user_id, intention_key, root_dir, 'prompts')
+
+def build_ark_messages(message, user_id, intention_key, root_dir=None):
+    """
+    构造方舟请求的消息列表：系统提示（Prompt + 预算内的历史对话）与用户消息
+
+    Args:
+        message (str): 用户消息
+        user_id (str): 用户ID
+        intention_key (str): 意图关键词
+        root_dir (str, optional): 项目根目录
+
+    Returns:
+        list: 消息列表
+    """
+    if root_dir:
+        user_prompt = get_user_prompt(user_id, intention_key, root_dir)
+    else:
+        user_prompt = prompt_registry.get_default_prompt(ROOT_DIR)
+
+    # 按模型的 token 预算附加历史对话记录
+    return build_context_messages(user_prompt, message, user_id, ARK_MODEL)
+
+def get_ark_response(message, user_id, intention_key, root_dir=None):
+    """
+    调用火山方舟(ARK) API 获取回复，整合数据库中的上下文信息
+
+    Args:
+        message (str): 用户消息
+        user_id (str): 用户ID
+        intention_key (str): 意图关键词
+        root_dir (str, optional): 项目根目录
+
+    Returns:
+        str: 方舟模型的回复
+    """
+    try:
+        logger.info(f"调用火山方舟 API - 用户ID:{user_id}, 消息：{message}")
+
+        data = {
+            "model": ARK_MODEL,
+            "stream": False,
+            "messages": build_ark_messages(message, user_id, intention_key, root_dir)
+        }
+
+        headers = {
+            "Authorization": f"Bearer {ARK_API_KEY}",
+            "Content-Type": "application/json"
+        }
+
+        response = transport.post(
+            f"{ARK_BASE_URL}/bots/chat/completions",
+            headers=headers,
+            json=data
+        )
+
+        if response.status_code != 200:
+            logger.error(f"火山API错误[{response.status_code}]:{response.text}")
+            return "服务器响应异常，请稍后再试"
+
+        result = response.json()
+        if not result.get('choices'):
+            logger.error("火山API返回异常结构")
+            return "服务器响应异常，请稍后再试"
+
+        reply = result['choices'][0]['message']['content'].strip()
+
+        logger.info(f"火山API回复：{reply}")
+        return reply
+    except Exception as e:
+        logger.error(f"火山API调用失败：{str(e)}", exc_info=True)
+        return "暂时无法回复，请稍后再试"
+
+def stream_ark_response(message, user_id, intention_key, root_dir=None):
+    """
+    以流式方式调用火山方舟(ARK) API，逐段产出回复增量
+
+    Args:
+        message (str): 用户消息
+        user_id (str): 用户ID
+        intention_key (str): 意图关键词
+        root_dir (str, optional): 项目根目录
+
+    Yields:
+        str: 回复文本增量
+    """
+    chunks = []
+    try:
+        logger.info(f"流式调用火山方舟 API - 用户ID:{user_id}, 消息：{message}")
+
+        data = {
+            "model": ARK_MODEL,
+            "stream": True,
+            "messages": build_ark_messages(message, user_id, intention_key, root_dir)
+        }
+
+        headers = {
+            "Authorization": f"Bearer {ARK_API_KEY}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream"
+        }
+
+        with transport.post(
+            f"{ARK_BASE_URL}/bots/chat/completions",
+            headers=headers,
+            json=data,
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                logger.error(f"火山API错误[{response.status_code}]:{response.text}")
+                yield "服务器响应异常，请稍后再试"
+                return
+
+            # SSE 按行传输，每行 "data: {...}"，以 "data: [DONE]" 结束
+            for line in response.iter_lines():
+                if not line or not line.startswith(b"data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == b"[DONE]":
+                    break
+                choices = json.loads(payload.decode('utf-8')).get('choices')
+                if not choices:
+                    continue
+                delta = (choices[0].get('delta') or {}).get('content')
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+
+        reply = "".join(chunks).strip()
+        if not reply:
+            logger.error("火山API流式返回为空")
+            yield "服务器响应异常，请稍后再试"
+            return
+
+        logger.info(f"火山API流式回复：{reply}")
+    except Exception as e:
+        logger.error(f"火山API流式调用失败：{str(e)}", exc_info=True)
+        if not chunks:
+            yield "暂时无法回复，请稍后再试"
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Coze 星座运势缓存
+群聊里的星座消息大多是"某星座今天/明天/本周运势"，按 意图 + 星座 + 主题 + 日期 缓存 Coze 的回复，
+同一天内再次询问直接返回缓存；配对、星盘等具体问题、缓存不支持的时间范围和较长的消息不使用缓存。
+可选的每日预取在早上安静时间结束后把 12 星座的今日运势提前请求好。
+"""
+
+import logging
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from config import (
+    BOT_NAME, COZE_CACHE_ENABLED, COZE_CACHE_TTL_SECONDS, COZE_CACHE_MAX_QUERY_CHARS,
+    COZE_CACHE_BYPASS_KEYWORDS, COZE_PREFETCH_TIME, COZE_PREFETCH_INTERVAL_SECONDS
+)
+from ai_clients.coze import get_coze_response, FAILURE_TEXTS
+from utils.metrics import PROVIDER_SECONDS
+from utils.time_utils import is_quiet_time, parse_time, strip_timestamps
+
+logger = logging.getLogger(__name__)
+
+# 星座名称及别称，键为规范名称
+SIGNS = {
+    "白羊": ("白羊",),
+    "金牛": ("金牛",),
+    "双子": ("双子",),
+    "巨蟹": ("巨蟹",),
+    "狮子": ("狮子",),
+    "处女": ("处女",),
+    "天秤": ("天秤", "天平"),
+    "天蝎": ("天蝎",),
+    "射手": ("射手", "人马"),
+    "摩羯": ("摩羯", "魔羯"),
+    "水瓶": ("水瓶", "宝瓶"),
+    "双鱼": ("双鱼",),
+}
+_SIGN_ALIASES = {alias: sign for sign, aliases in SIGNS.items() for alias in aliases}
+
+# 询问运势的关键词，消息中必须含有其中之一才会使用缓存
+FORTUNE_KEYWORDS = ("运势", "运程", "运气")
+
+# 时间范围：(意图, 关键词)，按顺序匹配，都没有时视为今日运势
+PERIODS = (
+    ("tomorrow", ("明天", "明日")),
+    ("week", ("本周", "这周", "这一周", "这星期", "本星期")),
+    ("month", ("本月", "这个月", "这月")),
+    ("today", ("今天", "今日")),
+)
+
+# PERIODS 以外的时间范围，含有这些词时不能按今日运势回答，直接请求 Coze
+OTHER_PERIOD_KEYWORDS = (
+    "昨天", "昨日", "前天", "后天", "上周", "下周", "上星期", "下星期", "周末",
+    "上个月", "下个月", "上月", "下月", "今年", "明年", "去年", "本年", "年度"
+)
+
+# 运势主题：(主题, 关键词)，都没有时为综合运势；同时问多个主题时不使用缓存
+TOPICS = (
+    ("love", ("爱情", "感情", "桃花", "恋爱")),
+    ("career", ("事业", "工作", "职场")),
+    ("wealth", ("财运", "财富", "偏财", "正财")),
+    ("health", ("健康", "身体")),
+    ("study", ("学业", "学习", "考试")),
+)
+
+# 规范化时去掉的 @机器人、空白和标点
+_NOISE = re.compile(rf'@{re.escape(BOT_NAME)}|[\s　，。！？、,.!?~～]+')
+
+
+def _period_date(period, today):
+    """时间范围对应的日期：明天为次日，本周为周一，本月为 1 号，其余为当天"""
+    if period == "tomorrow":
+        return today + timedelta(days=1)
+    if period == "week":
+        return today - timedelta(days=today.weekday())
+    if period == "month":
+        return today.replace(day=1)
+    return today
+
+
+def get_cache_key(message, today=None):
+    """
+    计算消息的缓存键，消息不是简单的星座运势询问时返回 None
+
+    Args:
+        message (str): 用户消息（可含时间戳和 @机器人）
+        today (date, optional): 当天日期，默认取系统日期
+
+    Returns:
+        tuple: (意图, 星座, 主题, 日期)，不可缓存时为 None
+    """
+    text = _NOISE.sub('', strip_timestamps(message))
+    if not text or len(text) > COZE_CACHE_MAX_QUERY_CHARS:
+        return None
+    if not any(keyword in text for keyword in FORTUNE_KEYWORDS):
+        return None
+    if any(keyword in text for keyword in COZE_CACHE_BYPASS_KEYWORDS):
+        return None
+
+    signs = {sign for alias, sign in _SIGN_ALIASES.items() if alias in text}
+    if len(signs) != 1:
+        return None
+    if any(keyword in text for keyword in OTHER_PERIOD_KEYWORDS):
+        return None
+
+    topics = [name for name, keywords in TOPICS if any(k in text for k in keywords)]
+    if len(topics) > 1:
+        return None
+
+    period = next((name for name, keywords in PERIODS if any(k in text for k in keywords)), "today")
+    day = _period_date(period, today or date.today())
+    return period, signs.pop(), topics[0] if topics else "general", day.isoformat()
+
+
+def _request_coze(message, user_id):
+    """调用 Coze 并记录请求耗时"""
+    with PROVIDER_SECONDS.time(provider='coze'):
+        return get_coze_response(message, user_id)
+
+
+class CozeResponseCache:
+    """Coze 回复缓存，同一缓存键的并发请求只调用一次 Coze"""
+
+    def __init__(self, ttl_seconds):
+        """
+        初始化
+
+        Args:
+            ttl_seconds (float): 回复最长保留时间（秒）
+        """
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}  # {缓存键: (回复, 过期时间)}
+        self._pending = {}  # {缓存键: threading.Event}，正在请求 Coze 的键
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        获取未过期的缓存回复
+
+        Args:
+            key (tuple): 缓存键
+
+        Returns:
+            str: 缓存的回复，没有或已过期时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def fetch(self, key, message, user_id):
+        """
+        获取缓存键对应的回复，缓存未命中时调用 Coze 并缓存成功的回复
+
+        Args:
+            key (tuple): 缓存键
+            message (str): 发给 Coze 的消息
+            user_id (str): 用户ID
+
+        Returns:
+            str: 回复内容
+        """
+        while True:
+            reply = self.get(key)
+            if reply is not None:
+                with self._lock:
+                    self.hits += 1
+                logger.info(f"星座运势缓存命中: {key}")
+                return reply
+            with self._lock:
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # 相同的请求正在进行，等待其结果
+            event.wait(timeout=60)
+
+        try:
+            reply = _request_coze(message, user_id)
+            if reply and reply not in FAILURE_TEXTS:
+                self._store(key, reply)
+            return reply
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            event.set()
+
+    def _store(self, key, reply):
+        """保存回复并清理过期的缓存"""
+        now = time.monotonic()
+        with self._lock:
+            for stale in [k for k, (_, expires) in self._entries.items() if expires <= now]:
+                del self._entries[stale]
+            self._entries[key] = (reply, now + self.ttl_seconds)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
+# 全局 Coze 回复缓存，未启用时为 None
+coze_cache = CozeResponseCache(COZE_CACHE_TTL_SECONDS) if COZE_CACHE_ENABLED else None
+
+
+def get_cached_coze_response(message, user_id):
+    """
+    获取 Coze 回复，简单的星座运势询问优先使用缓存
+
+    Args:
+        message (str): 用户消息
+        user_id (str): 用户ID
+
+    Returns:
+        str: 回复内容
+    """
+    key = get_cache_key(message) if coze_cache else None
+    if key is None:
+        return _request_coze(message, user_id)
+    return coze_cache.fetch(key, message, user_id)
+
+
+def prefetch_daily_fortunes(user_id='prefetch'):
+    """
+    预取 12 星座的今日运势，已缓存的星座跳过
+
+    Args:
+        user_id (str): 请求 Coze 时使用的用户ID
+    """
+    if coze_cache is None:
+        return
+    today = date.today()
+    fetched = 0
+    for sign in SIGNS:
+        key = ("today", sign, "general", today.isoformat())
+        if coze_cache.get(key) is not None:
+            continue
+        if fetched:
+            time.sleep(COZE_PREFETCH_INTERVAL_SECONDS)
+        coze_cache.fetch(key, f"{sign}座今日运势", user_id)
+        fetched += 1
+    logger.info(f"星座运势预取完成: 请求 {fetched} 个星座")
+
+
+def run_prefetch_schedule():
+    """每天在 COZE_PREFETCH_TIME 预取今日运势，处于安静时间时等到安静时间结束（在后台线程中运行）"""
+    prefetch_time = parse_time(COZE_PREFETCH_TIME)
+    while True:
+        now = datetime.now()
+        due = datetime.combine(now.date(), prefetch_time)
+        if due <= now:
+            due += timedelta(days=1)
+        time.sleep((due - now).total_seconds())
+
+        while is_quiet_time():
+            time.sleep(60)
+        try:
+            prefetch_daily_fortunes()
+        except Exception as e:
+            logger.error(f"星座运势预取失败: {str(e)}")
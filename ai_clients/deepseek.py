@@ -1,101 +1,184 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-"""
-DeepSeek API 客户端
-"""
-
-import logging
-import os
-from openai import OpenAI
-from config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, MODEL, TEMPERATURE, MAX_TOKEN
-from utils.chat_context_manager import get_recent_conversation, save_chat_record
-
-logger = logging.getLogger(__name__)
-
-# 初始化 OpenAI 客户端
-client = OpenAI(
-    api_key=DEEPSEEK_API_KEY,
-    base_url=DEEPSEEK_BASE_URL
-)
-
-def get_user_prompt(user_id, intention_key, root_dir):
-    """
-    获取用户的自定义 Prompt，如果不存在则使用默认的 prompt.md
-
-    Args:
-        user_id (str): 用户ID
-        intention_key (str): 意图关键词
-        root_dir (str): 项目根目录
-
-    Returns:
-        str: Prompt 内容
-    """
-    if "None" in intention_key:
-        prompt_path = os.path.join(root_dir, 'prompt', f'{user_id}.md')
-    elif "Constellation" in intention_key:
-        prompt_path = os.path.join(root_dir, 'prompt', f'{intention_key}.md')
-    if os.path.exists(prompt_path):
-        with open(prompt_path, 'r', encoding='utf-8') as file:
-            return file.read()
-    else:
-        with open(os.path.join(root_dir, 'prompt.md'), 'r', encoding='utf-8') as file:
-            return file.read()
-
-def get_deepseek_response(message, user_id, intention_key, root_dir=None):
-    """
-    调用 DeepSeek API 获取回复，整合数据库上下文信息
-
-    Args:
-        message (str): 用户消息
-        user_id (str): 用户ID
-        intention_key (str): 意图关键词
-        root_dir (str, optional): 项目根目录，用于加载 Prompt 文件
-
-    Returns:
-        str: DeepSeek 模型的回复
-    """
-    try:
-        logger.info(f"调用 DeepSeek API - 用户ID: {user_id}, 消息: {message}")
-
-        if root_dir:
-            user_prompt = get_user_prompt(user_id, intention_key, root_dir)
-        else:
-            user_prompt = "你是一个有用的AI助手。"
-            try:
-                with open('prompt.md', 'r', encoding='utf-8') as file:
-                    user_prompt = file.read()
-            except FileNotFoundError:
-                logger.warning("未找到 prompt.md 文件，使用默认 Prompt")
-
-        # 从数据库获取用户最近对话记录（上下文）
-        conversation_context = get_recent_conversation(user_id, limit=30)
-        # 构造系统提示（system message），包含用户的自定义 Prompt 与历史对话
-        system_message = f"{user_prompt}\n\n历史对话记录：\n{conversation_context}" if conversation_context else user_prompt
-
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": message}
-        ]
-
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=messages,
-            temperature=TEMPERATURE,
-            max_tokens=MAX_TOKEN,
-            stream=False
-        )
-
-        if not response.choices:
-            logger.error("API 返回空 choices")
-            return "服务响应异常，请稍后再试"
-
-        reply = response.choices[0].message.content.strip()
-
-        # 保存当前对话记录到数据库
-        save_chat_record(user_id, user_id, message, reply)
-
-        logger.info(f"DeepSeek API 回复: {reply}")
-        return reply
-    except Exception as e:
-        logger.error(f"DeepSeek 调用失败: {str(e)}", exc_info=True)
-        return "抱歉，我现在有点忙，稍后再聊吧。"
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+DeepSeek API 客户端
+"""
+
+import logging
+import os
+from openai import OpenAI
+from config import (
+    DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, MODEL, TEMPERATURE, MAX_TOKEN,
+    SUMMARY_MODEL, SUMMARY_MAX_TOKENS
+)
+from utils.context_builder import build_context_messages
+from ai_clients.transport import get_openai_http_client
+from ai_clients.prompts import prompt_registry
+
+logger = logging.getLogger(__name__)
+
+# 项目根目录（当前文件所在目录的上一级）
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 初始化 OpenAI 客户端，使用共享的长连接池
+client = OpenAI(
+    api_key=DEEPSEEK_API_KEY,
+    base_url=DEEPSEEK_BASE_URL,
+    http_client=get_openai_http_client()
+)
+
+def get_user_prompt(user_id, intention_key, root_dir):
+    """
+    获取用户的自定义 Prompt，如果不存在则使用默认的 prompt.md
+    内容由 Prompt 注册表缓存，文件修改后自动重新加载
+
+    Args:
+        user_id (str): 用户ID
+        intention_key (str): 意图关键词
+        root_dir (str): 项目根目录
+
+    Returns:
+        str: Prompt 内容
+    """
+    return prompt_registry.get_user_prompt(user_id, intention_key, root_dir, 'prompt')
+
+def build_deepseek_messages(message, user_id, intention_key, root_dir=None):
+    """
+    构造 DeepSeek 请求的消息列表：系统提示（Prompt + 预算内的历史对话）与用户消息
+
+    Args:
+        message (str): 用户消息
+        user_id (str): 用户ID
+        intention_key (str): 意图关键词
+        root_dir (str, optional): 项目根目录，用于加载 Prompt 文件
+
+    Returns:
+        list: 消息列表
+    """
+    if root_dir:
+        user_prompt = get_user_prompt(user_id, intention_key, root_dir)
+    else:
+        user_prompt = prompt_registry.get_default_prompt(ROOT_DIR)
+
+    # 按模型的 token 预算附加历史对话记录
+    return build_context_messages(user_prompt, message, user_id, MODEL)
+
+def get_deepseek_response(message, user_id, intention_key, root_dir=None):
+    """
+    调用 DeepSeek API 获取回复，整合数据库上下文信息
+
+    Args:
+        message (str): 用户消息
+        user_id (str): 用户ID
+        intention_key (str): 意图关键词
+        root_dir (str, optional): 项目根目录，用于加载 Prompt 文件
+
+    Returns:
+        str: DeepSeek 模型的回复
+    """
+    try:
+        logger.info(f"调用 DeepSeek API - 用户ID: {user_id}, 消息: {message}")
+
+        messages = build_deepseek_messages(message, user_id, intention_key, root_dir)
+
+        response = client.chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKEN,
+            stream=False
+        )
+
+        if not response.choices:
+            logger.error("API 返回空 choices")
+            return "服务响应异常，请稍后再试"
+
+        reply = response.choices[0].message.content.strip()
+
+        logger.info(f"DeepSeek API 回复: {reply}")
+        return reply
+    except Exception as e:
+        logger.error(f"DeepSeek 调用失败: {str(e)}", exc_info=True)
+        return "抱歉，我现在有点忙，稍后再聊吧。"
+
+def stream_deepseek_response(message, user_id, intention_key, root_dir=None):
+    """
+    以流式方式调用 DeepSeek API，逐段产出回复增量
+
+    Args:
+        message (str): 用户消息
+        user_id (str): 用户ID
+        intention_key (str): 意图关键词
+        root_dir (str, optional): 项目根目录，用于加载 Prompt 文件
+
+    Yields:
+        str: 回复文本增量
+    """
+    chunks = []
+    try:
+        logger.info(f"流式调用 DeepSeek API - 用户ID: {user_id}, 消息: {message}")
+
+        stream = client.chat.completions.create(
+            model=MODEL,
+            messages=build_deepseek_messages(message, user_id, intention_key, root_dir),
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKEN,
+            stream=True
+        )
+
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                chunks.append(delta)
+                yield delta
+
+        reply = "".join(chunks).strip()
+        if not reply:
+            logger.error("DeepSeek 流式返回为空")
+            yield "服务响应异常，请稍后再试"
+            return
+
+        logger.info(f"DeepSeek API 流式回复: {reply}")
+    except Exception as e:
+        logger.error(f"DeepSeek 流式调用失败: {str(e)}", exc_info=True)
+        if not chunks:
+            yield "抱歉，我现在有点忙，稍后再聊吧。"
+
+def summarize_conversation(previous_summary, conversation):
+    """
+    使用低成本模型把较早的对话压缩为摘要
+
+    Args:
+        previous_summary (str): 之前的摘要，没有时为空字符串
+        conversation (str): 需要合并进摘要的对话记录
+
+    Returns:
+        str: 新的摘要，调用失败时返回 None
+    """
+    prompt = (
+        "请把下面的聊天记录合并进已有的对话摘要，生成一段新的摘要。"
+        "保留用户的身份信息、偏好、重要事件、约定和未完成的话题，省略寒暄和重复内容，"
+        "使用第三人称，不超过300字，只输出摘要本身。\n\n"
+        f"已有摘要：\n{previous_summary or '（无）'}\n\n"
+        f"新的聊天记录：\n{conversation}"
+    )
+    try:
+        response = client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            stream=False
+        )
+        if not response.choices:
+            logger.error("摘要 API 返回空 choices")
+            return None
+        summary = response.choices[0].message.content.strip()
+        if "</think>" in summary:
+            summary = summary.split("</think>", 1)[1].strip()
+        return summary or None
+    except Exception as e:
+        logger.error(f"生成对话摘要失败: {str(e)}")
+        return None
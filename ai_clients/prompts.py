@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Prompt 注册表
+人设/Prompt 文件只在首次使用和文件修改时间变化时读取，其余请求直接使用内存中的内容
+"""
+
+import logging
+import os
+import threading
+import time
+from config import PROMPT_RELOAD_CHECK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 找不到任何 Prompt 文件时使用的默认 Prompt
+DEFAULT_PROMPT = "你是一个有用的AI助手。"
+
+
+class PromptRegistry:
+    """Prompt 文件缓存"""
+
+    def __init__(self, check_interval):
+        """
+        初始化注册表
+
+        Args:
+            check_interval (float): 两次检查同一文件修改时间的最小间隔（秒）
+        """
+        self.check_interval = check_interval
+        self._files = {}  # {文件路径: (修改时间, 内容, 上次检查时间)}，文件不存在时修改时间和内容为 None
+        self._resolved = {}  # {(根目录, prompt 目录, 用户ID, 意图关键词): (最终 Prompt, 解析时间)}
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        """
+        读取文件内容，检查间隔内直接返回缓存，修改时间变化时重新加载
+
+        Args:
+            path (str): 文件路径
+
+        Returns:
+            str: 文件内容，文件不存在时返回 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._files.get(path)
+            if entry and now - entry[2] < self.check_interval:
+                return entry[1]
+
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+
+            if entry and entry[0] == mtime:
+                content = entry[1]
+            elif mtime is None:
+                content = None
+            else:
+                with open(path, 'r', encoding='utf-8') as file:
+                    content = file.read()
+                logger.info(f"已加载 Prompt 文件: {path}")
+            self._files[path] = (mtime, content, now)
+            return content
+
+    def get_default_prompt(self, root_dir):
+        """
+        获取默认 Prompt（项目根目录下的 prompt.md）
+
+        Args:
+            root_dir (str): 项目根目录
+
+        Returns:
+            str: Prompt 内容
+        """
+        content = self.read(os.path.join(root_dir, 'prompt.md'))
+        if content is None:
+            logger.warning("未找到 prompt.md 文件，使用默认 Prompt")
+            return DEFAULT_PROMPT
+        return content
+
+    def get_user_prompt(self, user_id, intention_key, root_dir, prompt_dir='prompts'):
+        """
+        获取用户或意图对应的 Prompt，不存在时使用默认的 prompt.md
+
+        Args:
+            user_id (str): 用户ID
+            intention_key (str): 意图关键词，包含 "Constellation" 时使用意图对应的 Prompt
+            root_dir (str): 项目根目录
+            prompt_dir (str): Prompt 文件所在目录名
+
+        Returns:
+            str: Prompt 内容
+        """
+        key = (root_dir, prompt_dir, user_id, intention_key)
+        now = time.monotonic()
+        resolved = self._resolved.get(key)
+        if resolved and now - resolved[1] < self.check_interval:
+            return resolved[0]
+
+        name = intention_key if "Constellation" in intention_key else user_id
+        content = self.read(os.path.join(root_dir, prompt_dir, f'{name}.md'))
+        if content is None:
+            content = self.get_default_prompt(root_dir)
+
+        with self._lock:
+            self._resolved[key] = (content, now)
+        return content
+
+
+# 全局 Prompt 注册表
+prompt_registry = PromptRegistry(PROMPT_RELOAD_CHECK_SECONDS)
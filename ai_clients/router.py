@@ -1,81 +1,181 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-"""
-AI 路由器
-负责根据不同类型的请求，将请求转发至相应的 AI 服务
-"""
-
-import logging
-import re
-from config import (
-    USE_ARK_API, COZE_TRIGGER_KEYWORDS, COZE_DATABASE_KEYWORDS,
-    GROUP_LIST
-)
-
-from ai_clients.deepseek import get_deepseek_response
-from ai_clients.ark import get_ark_response
-from ai_clients.coze import get_coze_response
-from ai_clients.moonshot import recognize_image_with_moonshot
-
-logger = logging.getLogger(__name__)
-
-# 合并所有 Coze 关键词（此处仍保留，供其它地方参考）
-COZE_KEY_WORDS = COZE_TRIGGER_KEYWORDS + COZE_DATABASE_KEYWORDS
-
-
-def get_ai_response(message, user_id, intention_key):
-    """
-    AI 响应路由器
-    根据消息内容、用户 ID 及意图关键词，将请求路由到不同的 AI 服务
-
-    Args:
-        message (str): 用户消息内容
-        user_id (str): 用户 ID
-        intention_key (str): 意图识别关键词，取值可能为 "Constellation" 或 "None"
-
-    Returns:
-        str: AI 响应内容
-    """
-    # 去除前后空白字符
-    stripped_message = message.strip()
-
-    # 签到功能
-    if "签到" in message:
-        # 延迟导入，避免循环导入
-        from user.services import perform_sign_in
-        return perform_sign_in(user_id)
-
-    # 查询金币余额
-    elif "金币余额" in message:
-        # 延迟导入，避免循环导入
-        from user.services import query_coin_balance
-        return query_coin_balance(user_id)
-
-    # 处理图片和表情包消息
-    elif "发送了图片：" in message or "发送了表情包：" in message:
-        logger.info("检测到图片或表情包消息，直接返回消息内容（移除时间戳）")
-        # 使用正则表达式移除时间戳 [YYYY-MM-DD HH:MM:SS]
-        cleaned_message = re.sub(r'\[\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\] ', '', message)
-        return cleaned_message
-
-    # 判断是否为群聊消息
-    is_group_chat = user_id in GROUP_LIST
-    
-    # 优先根据意图识别结果决定调用哪个服务，但只对群聊进行意图识别
-    if is_group_chat and intention_key == "Constellation":
-        logger.info("群聊消息，意图识别结果为 'Constellation'，调用 Coze API")
-        return get_coze_response(message, user_id)
-    else:
-        if is_group_chat:
-            logger.info("群聊消息，意图识别结果为 'None'，调用其他服务")
-        else:
-            logger.info("私聊消息，直接调用 AI 服务，不进行意图识别")
-            
-        # 根据配置选择使用火山方舟或 DeepSeek
-        if USE_ARK_API:
-            logger.info(f"使用火山方舟 API 处理请求: {message}")
-            return get_ark_response(message, user_id, intention_key if is_group_chat else "None")
-        else:
-            logger.info(f"使用 DeepSeek API 处理请求: {message}")
-            return get_deepseek_response(message, user_id, intention_key if is_group_chat else "None")
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+AI 路由器
+负责根据不同类型的请求，将请求转发至相应的 AI 服务
+"""
+
+import logging
+import time
+from config import (
+    USE_ARK_API, COZE_TRIGGER_KEYWORDS, COZE_DATABASE_KEYWORDS,
+    GROUP_LIST, PROFILER_ADMINS
+)
+
+from ai_clients.deepseek import get_deepseek_response, stream_deepseek_response
+from ai_clients.ark import get_ark_response, stream_ark_response
+from ai_clients.coze_cache import get_cached_coze_response
+from ai_clients.moonshot import recognize_image_with_moonshot
+from utils.time_utils import strip_timestamps
+from utils.keyword_matcher import classify, SIGN_IN, COIN_BALANCE, LEADERBOARD, PROFILE, MEDIA
+from utils.metrics import PROVIDER_SECONDS, PROVIDER_FIRST_DELTA_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 合并所有 Coze 关键词（此处仍保留，供其它地方参考）
+COZE_KEY_WORDS = COZE_TRIGGER_KEYWORDS + COZE_DATABASE_KEYWORDS
+
+
+def _resolve_route(message, user_id, intention_key):
+    """
+    根据消息内容、用户 ID 及意图关键词决定由哪个服务处理
+
+    Args:
+        message (str): 用户消息内容
+        user_id (str): 用户 ID
+        intention_key (str): 意图识别关键词
+
+    Returns:
+        str: 路由名称，取值为 "sign_in"、"coin_balance"、"leaderboard"、"profile"、"media"、"coze"、"ark" 或 "deepseek"
+    """
+    categories = classify(message)
+
+    # 签到功能
+    if SIGN_IN in categories:
+        return "sign_in"
+
+    # 查询金币余额
+    elif COIN_BALANCE in categories:
+        return "coin_balance"
+
+    # 查询金币排行榜
+    elif LEADERBOARD in categories:
+        return "leaderboard"
+
+    # 管理员私聊开启性能分析，其他人发送时按普通消息处理
+    elif PROFILE in categories and user_id in PROFILER_ADMINS:
+        return "profile"
+
+    # 处理图片和表情包消息
+    elif MEDIA in categories:
+        return "media"
+
+    # 判断是否为群聊消息
+    is_group_chat = user_id in GROUP_LIST
+
+    # 优先根据意图识别结果决定调用哪个服务，但只对群聊进行意图识别
+    if is_group_chat and intention_key == "Constellation":
+        logger.info("群聊消息，意图识别结果为 'Constellation'，调用 Coze API")
+        return "coze"
+
+    if is_group_chat:
+        logger.info("群聊消息，意图识别结果为 'None'，调用其他服务")
+    else:
+        logger.info("私聊消息，直接调用 AI 服务，不进行意图识别")
+
+    # 根据配置选择使用火山方舟或 DeepSeek
+    return "ark" if USE_ARK_API else "deepseek"
+
+
+def get_ai_response(message, user_id, intention_key):
+    """
+    AI 响应路由器
+    根据消息内容、用户 ID 及意图关键词，将请求路由到不同的 AI 服务
+
+    Args:
+        message (str): 用户消息内容
+        user_id (str): 用户 ID
+        intention_key (str): 意图识别关键词，取值可能为 "Constellation" 或 "None"
+
+    Returns:
+        str: AI 响应内容
+    """
+    route = _resolve_route(message, user_id, intention_key)
+
+    if route == "sign_in":
+        # 延迟导入，避免循环导入
+        from user.services import perform_sign_in
+        return perform_sign_in(user_id)
+
+    elif route == "coin_balance":
+        # 延迟导入，避免循环导入
+        from user.services import query_coin_balance
+        return query_coin_balance(user_id)
+
+    elif route == "leaderboard":
+        # 延迟导入，避免循环导入
+        from user.services import query_leaderboard
+        return query_leaderboard(user_id)
+
+    elif route == "profile":
+        # 延迟导入，避免循环导入
+        from utils.profiler import start_profiling_command
+        logger.info(f"管理员 {user_id} 请求性能分析")
+        return start_profiling_command(message)
+
+    elif route == "media":
+        logger.info("检测到图片或表情包消息，直接返回消息内容（移除时间戳）")
+        # 移除时间戳 [YYYY-MM-DD HH:MM:SS]
+        return strip_timestamps(message)
+
+    elif route == "coze":
+        return get_cached_coze_response(message, user_id)
+
+    model_intention = intention_key if user_id in GROUP_LIST else "None"
+    if route == "ark":
+        logger.info(f"使用火山方舟 API 处理请求: {message}")
+        with PROVIDER_SECONDS.time(provider=route):
+            return get_ark_response(message, user_id, model_intention)
+    else:
+        logger.info(f"使用 DeepSeek API 处理请求: {message}")
+        with PROVIDER_SECONDS.time(provider=route):
+            return get_deepseek_response(message, user_id, model_intention)
+
+
+def stream_ai_response(message, user_id, intention_key):
+    """
+    流式 AI 响应路由器
+    只有火山方舟和 DeepSeek 支持流式输出，其它服务返回 None，由调用方改用 get_ai_response
+
+    Args:
+        message (str): 用户消息内容
+        user_id (str): 用户 ID
+        intention_key (str): 意图识别关键词
+
+    Returns:
+        Iterator[str]: 回复文本增量的迭代器，不支持流式时返回 None
+    """
+    route = _resolve_route(message, user_id, intention_key)
+    model_intention = intention_key if user_id in GROUP_LIST else "None"
+
+    if route == "ark":
+        logger.info(f"使用火山方舟 API 流式处理请求: {message}")
+        return _timed_stream(route, stream_ark_response(message, user_id, model_intention))
+    elif route == "deepseek":
+        logger.info(f"使用 DeepSeek API 流式处理请求: {message}")
+        return _timed_stream(route, stream_deepseek_response(message, user_id, model_intention))
+    return None
+
+
+def _timed_stream(provider, deltas):
+    """
+    记录流式请求的首个增量耗时和总耗时，增量原样转发
+
+    Args:
+        provider (str): 服务名称
+        deltas (Iterator[str]): 回复文本增量的迭代器
+
+    Yields:
+        str: 回复文本增量
+    """
+    start = time.perf_counter()
+    first = True
+    try:
+        for delta in deltas:
+            if first:
+                PROVIDER_FIRST_DELTA_SECONDS.observe(time.perf_counter() - start, provider=provider)
+                first = False
+            yield delta
+    finally:
+        PROVIDER_SECONDS.observe(time.perf_counter() - start, provider=provider)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+共享 HTTP 传输层
+按服务商主机复用长连接池，所有 AI 客户端共用，避免每次请求重新进行 TCP+TLS 握手
+"""
+
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import (
+    HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_KEEPALIVE_SECONDS,
+    ARK_BASE_URL, COZE_API_ENDPOINT, MOONSHOT_BASE_URL, DEEPSEEK_BASE_URL
+)
+
+logger = logging.getLogger(__name__)
+
+# 默认超时：(连接超时, 读取超时)
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_sessions = {}  # {scheme://host: requests.Session}
+_sessions_lock = threading.Lock()
+_openai_http_client = None
+
+
+def _origin(url):
+    """获取 URL 的 scheme://host 部分，作为连接池的键"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url):
+    """
+    获取目标主机的共享会话，不存在时创建
+
+    Args:
+        url (str): 请求地址
+
+    Returns:
+        requests.Session: 带长连接池的会话
+    """
+    origin = _origin(url)
+    session = _sessions.get(origin)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(origin)
+        if session is None:
+            session = requests.Session()
+            # 只重试建立连接阶段的失败，已发出的请求不重放
+            retries = Retry(total=1, connect=1, read=0, status=0)
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=HTTP_POOL_SIZE,
+                max_retries=retries
+            )
+            session.mount(origin, adapter)
+            _sessions[origin] = session
+            logger.info(f"已为 {origin} 创建 HTTP 连接池，大小: {HTTP_POOL_SIZE}")
+    return session
+
+
+def post(url, **kwargs):
+    """
+    通过共享连接池发送 POST 请求，参数与 requests.post 相同
+
+    Args:
+        url (str): 请求地址
+        **kwargs: 传给 requests 的其它参数，未指定 timeout 时使用默认超时
+
+    Returns:
+        requests.Response: 响应对象
+    """
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    return get_session(url).post(url, **kwargs)
+
+
+def get_openai_http_client():
+    """
+    获取 OpenAI SDK 使用的共享 httpx 客户端
+
+    Returns:
+        httpx.Client: 带长连接池的客户端
+    """
+    global _openai_http_client
+    with _sessions_lock:
+        if _openai_http_client is None:
+            _openai_http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_SIZE,
+                    max_keepalive_connections=HTTP_POOL_SIZE,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+                ),
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+            )
+    return _openai_http_client
+
+
+def warm_up_connections():
+    """
+    预热各服务商的连接，提前完成 DNS 解析和 TLS 握手
+    只发送 HEAD 请求建立连接，不关心响应状态
+    """
+    for url in (ARK_BASE_URL, COZE_API_ENDPOINT, MOONSHOT_BASE_URL):
+        try:
+            get_session(url).head(url, timeout=DEFAULT_TIMEOUT)
+            logger.info(f"连接预热完成: {_origin(url)}")
+        except Exception as e:
+            logger.warning(f"连接预热失败 {_origin(url)}: {str(e)}")
+
+    try:
+        get_openai_http_client().head(DEEPSEEK_BASE_URL)
+        logger.info(f"连接预热完成: {_origin(DEEPSEEK_BASE_URL)}")
+    except Exception as e:
+        logger.warning(f"连接预热失败 {_origin(DEEPSEEK_BASE_URL)}: {str(e)}")
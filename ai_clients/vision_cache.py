@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图片识别缓存
+按图片内容哈希持久化 Moonshot 的识别结果，同一张表情包/图片再次出现时直接返回描述，
+可选的感知哈希（dHash）让重新编码过的同一张图也能命中
+"""
+
+import atexit
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from database import Session
+from models import ImageRecognition
+from config import VISION_CACHE_ENABLED, VISION_CACHE_MAX_ENTRIES, VISION_CACHE_PHASH_DISTANCE
+
+try:
+    from PIL import Image
+except ImportError:  # 未安装 Pillow 时只按内容完全匹配
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(image_bytes):
+    """
+    计算图片内容的 SHA-256
+
+    Args:
+        image_bytes (bytes): 图片文件内容
+
+    Returns:
+        str: 十六进制哈希
+    """
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def perceptual_hash(image_bytes):
+    """
+    计算图片的 64 位差异哈希（dHash）：缩放为 9x8 灰度图，比较相邻像素的明暗
+    动图只取第一帧
+
+    Args:
+        image_bytes (bytes): 图片文件内容
+
+    Returns:
+        int: 哈希值，无法解码、图片没有明暗变化或未安装 Pillow 时返回 None
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            pixels = list(image.convert('L').resize((9, 8)).getdata())
+    except Exception as e:
+        logger.warning(f"计算图片感知哈希失败: {str(e)}")
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    # 纯色或单调渐变的图片哈希全 0/全 1，无法区分不同图片
+    if value in (0, (1 << 64) - 1):
+        return None
+    return value
+
+
+def hash_bands(distance):
+    """
+    把 64 位感知哈希划分为 distance + 1 段：汉明距离不超过 distance 的两个哈希，
+    差异位最多落在 distance 段中，至少有一段完全相同，查找时只需比较有相同分段的条目
+
+    Args:
+        distance (int): 最大汉明距离
+
+    Returns:
+        list: [(位移, 掩码), ...]，每段一个
+    """
+    count = min(distance + 1, 64)
+    bands = []
+    shift = 0
+    for index in range(count):
+        width = 64 // count + (index < 64 % count)
+        bands.append((shift, (1 << width) - 1))
+        shift += width
+    return bands
+
+
+class VisionCache:
+    """
+    识别结果缓存
+    数据库保存全部条目，内存中保存同样的索引用于查找；条目按最近使用顺序（LRU）淘汰。
+    感知哈希按分段建立倒排索引，相似查找只比较至少有一段相同的条目，不必遍历全部缓存；
+    相似命中的内容哈希记为所匹配条目的别名，同一份重新编码的图片再次出现时直接按内容命中。
+    命中时只更新内存，最近使用时间在下次写入或程序退出时批量写回数据库；
+    数据库提交在锁外进行，写入期间其它识别线程的查找不必等待磁盘。
+    """
+
+    def __init__(self, max_entries, phash_distance):
+        """
+        初始化缓存
+
+        Args:
+            max_entries (int): 最多缓存的条目数量
+            phash_distance (int): 感知哈希匹配的最大汉明距离，0 表示不使用感知哈希
+        """
+        self.max_entries = max_entries
+        self.phash_distance = phash_distance
+        self._entries = None  # OrderedDict {(mode, content_hash): [id, description, perceptual_hash]}，首次使用时加载
+        self._bands = hash_bands(phash_distance) if phash_distance else []
+        self._buckets = {}  # {(mode, 段序号, 段的值): {(mode, content_hash), ...}}
+        self._aliases = OrderedDict()  # {(mode, content_hash): 相似命中的条目键}，按最近使用淘汰
+        self._storing = set()  # 正在写入数据库的条目键
+        self._touched = {}  # {id: 最近使用时间}，尚未写回数据库的命中记录
+        self._lock = threading.Lock()
+
+    def lookup(self, image_bytes, mode):
+        """
+        查找图片的识别结果
+
+        Args:
+            image_bytes (bytes): 图片文件内容
+            mode (str): 识别模式，emoji 或 picture
+
+        Returns:
+            tuple: (识别结果, 内容哈希, 感知哈希)，未命中时识别结果为 None；
+                   哈希在写入缓存时复用，感知哈希只在完全匹配未命中时计算
+        """
+        digest = content_hash(image_bytes)
+        with self._lock:
+            self._ensure_loaded()
+            key = self._aliases.get((mode, digest), (mode, digest))
+            entry = self._entries.get(key)
+            if entry is not None:
+                if key != (mode, digest):
+                    self._aliases.move_to_end((mode, digest))
+                self._touch(key, entry)
+                return entry[1], digest, entry[2]
+            # 别名指向的条目已被淘汰
+            self._aliases.pop((mode, digest), None)
+
+        if not self.phash_distance:
+            return None, digest, None
+        phash = perceptual_hash(image_bytes)
+        if phash is None:
+            return None, digest, None
+
+        with self._lock:
+            candidates = set()
+            for index, (shift, mask) in enumerate(self._bands):
+                candidates.update(self._buckets.get((mode, index, (phash >> shift) & mask), ()))
+            best = None
+            for key in candidates:
+                entry = self._entries[key]
+                distance = bin(entry[2] ^ phash).count('1')
+                if distance <= self.phash_distance and (best is None or distance < best[0]):
+                    best = (distance, key, entry)
+            if best is not None:
+                _, key, entry = best
+                self._aliases[(mode, digest)] = key
+                while len(self._aliases) > self.max_entries:
+                    self._aliases.popitem(last=False)
+                self._touch(key, entry)
+                return entry[1], digest, phash
+        return None, digest, phash
+
+    def store(self, digest, phash, mode, description):
+        """
+        保存一条识别结果，超出容量时淘汰最久未使用的条目
+
+        Args:
+            digest (str): 内容哈希
+            phash (int): 感知哈希，可以为 None
+            mode (str): 识别模式
+            description (str): 识别结果
+        """
+        key = (mode, digest)
+        # 在锁内确定要淘汰的条目并取出命中记录，数据库写入在锁外进行
+        with self._lock:
+            self._ensure_loaded()
+            if key in self._entries or key in self._storing:
+                return
+            self._storing.add(key)
+            self._aliases.pop(key, None)
+            evicted = []
+            while self._entries and len(self._entries) + len(self._storing) > self.max_entries:
+                old_key, old = self._entries.popitem(last=False)
+                self._unindex(old_key, old[2])
+                evicted.append(old[0])
+                self._touched.pop(old[0], None)
+            touched, self._touched = self._touched, {}
+
+        record = ImageRecognition(
+            content_hash=digest,
+            perceptual_hash=None if phash is None else f"{phash:016x}",
+            mode=mode,
+            description=description
+        )
+        session = Session()
+        try:
+            session.add(record)
+            if evicted:
+                session.query(ImageRecognition)\
+                    .filter(ImageRecognition.id.in_(evicted))\
+                    .delete(synchronize_session=False)
+            self._write_touched(session, touched)
+            session.commit()
+            with self._lock:
+                self._entries[key] = [record.id, description, phash]
+                self._index(key, phash)
+            logger.info(f"已缓存图片识别结果（{mode}），淘汰 {len(evicted)} 条")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"保存图片识别缓存失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._storing.discard(key)
+            session.close()
+
+    def flush(self):
+        """把内存中的命中记录写回数据库"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        session = Session()
+        try:
+            self._write_touched(session, touched)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"写回图片识别缓存使用记录失败: {str(e)}")
+        finally:
+            session.close()
+
+    def _touch(self, key, entry):
+        """记录一次命中（调用方需持有锁）"""
+        self._entries.move_to_end(key)
+        self._touched[entry[0]] = datetime.now()
+        logger.info(f"图片识别缓存命中（{key[0]}）")
+
+    def _index(self, key, phash):
+        """把条目加入感知哈希的分段索引（调用方需持有锁）"""
+        if phash is None:
+            return
+        for index, (shift, mask) in enumerate(self._bands):
+            self._buckets.setdefault((key[0], index, (phash >> shift) & mask), set()).add(key)
+
+    def _unindex(self, key, phash):
+        """把条目移出感知哈希的分段索引（调用方需持有锁）"""
+        if phash is None:
+            return
+        for index, (shift, mask) in enumerate(self._bands):
+            bucket_key = (key[0], index, (phash >> shift) & mask)
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[bucket_key]
+
+    @staticmethod
+    def _write_touched(session, touched):
+        """
+        在给定会话中写回命中记录
+
+        Args:
+            session (Session): 数据库会话
+            touched (dict): {id: 最近使用时间}
+        """
+        for record_id, last_used in touched.items():
+            session.query(ImageRecognition)\
+                .filter_by(id=record_id)\
+                .update({
+                    ImageRecognition.last_used: last_used,
+                    ImageRecognition.hit_count: ImageRecognition.hit_count + 1
+                }, synchronize_session=False)
+
+    def _ensure_loaded(self):
+        """首次使用时从数据库加载最近使用的条目（调用方需持有锁）"""
+        if self._entries is not None:
+            return
+        self._entries = OrderedDict()
+        session = Session()
+        try:
+            records = session.query(
+                ImageRecognition.id, ImageRecognition.content_hash, ImageRecognition.perceptual_hash,
+                ImageRecognition.mode, ImageRecognition.description
+            ).order_by(ImageRecognition.last_used.desc()).limit(self.max_entries).all()
+            for record in reversed(records):
+                phash = int(record.perceptual_hash, 16) if record.perceptual_hash else None
+                self._entries[(record.mode, record.content_hash)] = [record.id, record.description, phash]
+                self._index((record.mode, record.content_hash), phash)
+            logger.info(f"已加载图片识别缓存 {len(self._entries)} 条")
+        except Exception as e:
+            logger.error(f"加载图片识别缓存失败: {str(e)}")
+        finally:
+            session.close()
+
+
+# 全局识别缓存，未启用时为 None
+vision_cache = VisionCache(VISION_CACHE_MAX_ENTRIES, VISION_CACHE_PHASH_DISTANCE) if VISION_CACHE_ENABLED else None
+if vision_cache is not None:
+    atexit.register(vision_cache.flush)
@@ -0,0 +1,7 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基准测试包
+离线测量消息处理热路径的耗时，运行方式见 benchmarks/run.py
+"""
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+消息处理热路径的基准测试用例
+导入本模块前需先调用 benchmarks.stubs.install()，项目模块在各用例的准备函数中导入
+"""
+
+import atexit
+import itertools
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.harness import benchmark
+from benchmarks.stubs import FakeStreamResponse, build_coze_stream
+
+# 测试消息：覆盖普通聊天、星座、表情包请求、指令和带时间戳的合并消息
+MESSAGES = [
+    "[2026-01-01 08:00:00] 今天好累啊，上班一点都不开心",
+    "[2026-01-01 08:00:05] @螃蟹青年星 白羊座今天运势怎么样",
+    "来个表情包",
+    "签到",
+    "[2026-01-01 08:01:00] 你觉得周末去爬山还是去看电影比较好？顺便推荐几部最近的电影吧",
+    "哈哈哈哈哈哈笑死我了",
+    "金币余额",
+    "The quick brown fox jumps over the lazy dog " * 4,
+]
+
+# 种子数据规模：用户数超过对话缓存容量，保证轮换查询时每次都访问数据库
+SEED_USERS = 600
+SEED_TURNS_PER_USER = 40
+
+_database_dir = None
+
+
+def _reply_text(paragraphs=12):
+    """构造一段约 2000 token 的回复，包含标题、代码块、空行和反斜杠分段"""
+    sentence = "这是回复中的一句话，用来模拟模型生成的较长内容。"
+    parts = ["## 回答"]
+    for i in range(paragraphs):
+        parts.append(sentence * 8)
+        if i == paragraphs // 2:
+            parts.append("```python\nfor i in range(10):\n    print(i)\n```")
+    return "\n\n".join(parts) + "\\好了\\就这些"
+
+
+def _setup_database():
+    """创建临时 SQLite 数据库并写入聊天记录，全局会话工厂改为绑定到该数据库（只执行一次）"""
+    global _database_dir
+    if _database_dir is not None:
+        return
+
+    from sqlalchemy import create_engine, event, insert
+    from base import Base
+    import database
+    import models  # noqa: F401  注册所有表
+    from migrations import run_migrations
+
+    _database_dir = tempfile.mkdtemp(prefix='wxbot-bench-')
+    atexit.register(shutil.rmtree, _database_dir, True)
+    engine = create_engine(f"sqlite:///{os.path.join(_database_dir, 'bench.db')}")
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in database.SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    database.Session.configure(bind=engine)
+
+    start = datetime.now() - timedelta(days=1)
+    rows = [
+        {
+            'sender_id': f'user{u}', 'sender_name': f'user{u}',
+            'message': f"{MESSAGES[t % len(MESSAGES)]} #{t}",
+            'reply': f"这是第 {t} 条回复，内容长度大致与真实回复相当。" * 3,
+            'created_at': start + timedelta(seconds=u * SEED_TURNS_PER_USER + t),
+        }
+        for u in range(SEED_USERS) for t in range(SEED_TURNS_PER_USER)
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(database.ChatMessage), rows)
+
+
+@benchmark("keyword_matcher.get_intention_key")
+def bench_intention_key():
+    from utils.keyword_matcher import get_intention_key
+    messages = itertools.cycle(MESSAGES)
+    return lambda: get_intention_key(next(messages))
+
+
+@benchmark("emoji_utils.is_emoji_request")
+def bench_is_emoji_request():
+    from utils.emoji_utils import is_emoji_request
+    messages = itertools.cycle(MESSAGES)
+    return lambda: is_emoji_request(next(messages))
+
+
+@benchmark("chat_context.get_recent_conversation[cache]")
+def bench_recent_conversation_cached():
+    _setup_database()
+    from utils.chat_context_manager import get_recent_conversation
+    return lambda: get_recent_conversation('user0', 30)
+
+
+@benchmark("chat_context.get_recent_conversation[db]")
+def bench_recent_conversation_db():
+    _setup_database()
+    from utils.chat_context_manager import get_recent_conversation
+    users = itertools.cycle([f'user{u}' for u in range(SEED_USERS)])
+    return lambda: get_recent_conversation(next(users), 30)
+
+
+@benchmark("coze.sse_parse")
+def bench_coze_sse_parse():
+    from ai_clients import coze, transport
+    body = build_coze_stream(_reply_text())
+    transport.post = lambda url, **kwargs: FakeStreamResponse(body)
+    return lambda: coze.get_coze_response("白羊座今日运势", "bench")
+
+
+@benchmark("sender.split_long_text")
+def bench_split_long_text():
+    from wechat.sender import WeChatSender
+    text = _reply_text().replace('#', '').replace('```', '').replace('\\', '\n\n')
+    return lambda: WeChatSender.split_long_text(None, text)
+
+
+@benchmark("sender.split_markdown_content")
+def bench_split_markdown_content():
+    from wechat.sender import WeChatSender
+    text = _reply_text()
+    return lambda: WeChatSender.split_markdown_content(None, text)
+
+
+# 含反斜杠的 Markdown 回复：路径和代码块中的反斜杠不能被当作分段边界
+MARKDOWN_WITH_BACKSLASH = (
+    "## 安装\n把文件放到 C:\\Program Files\\bot 下\n\n"
+    "```python\nparts = re.split(r'\\s+', line)\n```\n完成后运行 C:\\bot\\run.bat"
+)
+
+
+def _stream_segments(text, size=4):
+    """按固定大小的增量流式分段"""
+    from wechat.segmenter import StreamSegmenter
+    segmenter = StreamSegmenter()
+    segments = []
+    for start in range(0, len(text), size):
+        segments += segmenter.feed(text[start:start + size])
+    return segments + segmenter.flush()
+
+
+@benchmark("segmenter.stream")
+def bench_segmenter_stream():
+    from wechat.segmenter import segment_reply
+    # 计时前先确认流式分段与整段分段的结果一致
+    for sample in (_reply_text(), MARKDOWN_WITH_BACKSLASH):
+        for size in (1, 4, 7):
+            assert _stream_segments(sample, size) == segment_reply(sample, pack=False), "流式分段与整段分段结果不一致"
+    text = _reply_text()
+    return lambda: _stream_segments(text)
+
+
+class _Message:
+    """微信消息的替身"""
+
+    def __init__(self, sender, content, chat_who):
+        self.sender = sender
+        self.content = content
+        self.chat_who = chat_who
+
+
+class _NullSender:
+    """不发送任何内容的发送器"""
+
+    def send_reply(self, *args, **kwargs):
+        pass
+
+
+@benchmark("user_manager.handle_message")
+def bench_handle_message():
+    from user.manager import UserManager
+    manager = UserManager(_NullSender())
+    messages = itertools.cycle([
+        _Message(f'member{i}', MESSAGES[i % len(MESSAGES)], f'chat{i % 50}') for i in range(200)
+    ])
+    return lambda: manager.handle_message(next(messages))
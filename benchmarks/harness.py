@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基准测试框架
+注册测试用例、自动确定循环次数并计时，结果可与保存的基线比较
+"""
+
+import gc
+import statistics
+import time
+
+# 已注册的测试用例：[(名称, 准备函数)]，准备函数返回每次调用执行一次被测操作的函数
+_CASES = []
+
+
+def benchmark(name):
+    """
+    注册测试用例的装饰器
+
+    Args:
+        name (str): 用例名称，按 "模块.操作" 命名
+
+    Returns:
+        Callable: 装饰器，被装饰的准备函数需返回无参数的被测函数
+    """
+    def decorator(setup):
+        _CASES.append((name, setup))
+        return setup
+    return decorator
+
+
+def get_cases(pattern=None):
+    """
+    获取已注册的测试用例
+
+    Args:
+        pattern (str, optional): 只返回名称中包含该字符串的用例
+
+    Returns:
+        list: [(名称, 准备函数)]
+    """
+    return [(name, setup) for name, setup in _CASES if not pattern or pattern in name]
+
+
+def _time_loops(func, loops):
+    """执行 loops 次被测函数，返回总耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - start
+
+
+def measure(func, min_time=0.2, repeat=5):
+    """
+    测量被测函数单次调用的耗时
+
+    先倍增循环次数直到一轮耗时不少于 min_time，再重复 repeat 轮取统计值；
+    计时期间关闭垃圾回收，减少抖动。
+
+    Args:
+        func (Callable): 无参数的被测函数
+        min_time (float): 每轮的最短耗时（秒）
+        repeat (int): 重复轮数
+
+    Returns:
+        dict: {'loops': 每轮次数, 'min_us': 最小值, 'median_us': 中位数, 'stdev_us': 标准差}，单位为微秒/次
+    """
+    func()  # 预热，触发懒加载和缓存填充
+    loops = 1
+    while _time_loops(func, loops) < min_time and loops < 10 ** 7:
+        loops *= 2
+
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = [_time_loops(func, loops) / loops * 1e6 for _ in range(repeat)]
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return {
+        'loops': loops,
+        'min_us': round(min(samples), 3),
+        'median_us': round(statistics.median(samples), 3),
+        'stdev_us': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    与基线比较，按最小耗时判断是否变慢
+
+    Args:
+        results (dict): 本次结果 {名称: 统计值}
+        baseline (dict): 基线结果 {名称: 统计值}
+        threshold (float): 允许变慢的比例，例如 0.2 表示慢 20% 以内不算回退
+
+    Returns:
+        list: [(名称, 基线耗时, 本次耗时, 变化比例, 是否回退)]，基线中没有的用例变化比例为 None
+    """
+    rows = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('min_us'):
+            rows.append((name, None, stats['min_us'], None, False))
+            continue
+        change = stats['min_us'] / base['min_us'] - 1
+        rows.append((name, base['min_us'], stats['min_us'], change, change > threshold))
+    return rows
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+运行基准测试
+
+用法（在项目根目录执行）：
+    python -m benchmarks.run                      # 运行全部用例，与基线比较
+    python -m benchmarks.run --filter sender      # 只运行名称包含 sender 的用例
+    python -m benchmarks.run --save-baseline      # 把本次结果保存为新的基线
+
+结果写入 JSON 文件；存在基线时，任一用例的最小耗时比基线慢超过阈值则以退出码 1 结束。
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'latest.json')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'results', 'baseline.json')
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="消息处理热路径基准测试")
+    parser.add_argument('--filter', help="只运行名称包含该字符串的用例")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="结果文件路径")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果保存为基线")
+    parser.add_argument('--threshold', type=float, default=0.2, help="允许变慢的比例，默认 0.2（20%%）")
+    parser.add_argument('--min-time', type=float, default=0.2, help="每轮最短耗时（秒）")
+    parser.add_argument('--repeat', type=int, default=5, help="每个用例重复的轮数")
+    return parser.parse_args(argv)
+
+
+def _write_json(path, data):
+    """写入 JSON 文件，目录不存在时创建"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def main(argv=None):
+    """
+    运行基准测试
+
+    Returns:
+        int: 退出码，发现性能回退时为 1
+    """
+    args = parse_args(argv)
+
+    # 替身模块必须在导入任何项目模块之前注册
+    sys.path.insert(0, ROOT_DIR)
+    from benchmarks import stubs
+    stubs.install()
+    from benchmarks import cases  # noqa: F401  注册用例
+    from benchmarks.harness import get_cases, measure, compare
+
+    results = {}
+    for name, setup in get_cases(args.filter):
+        stats = measure(setup(), min_time=args.min_time, repeat=args.repeat)
+        results[name] = stats
+        print(f"{name:<48} {stats['min_us']:>12.2f} us  (median {stats['median_us']:.2f}, x{stats['loops']})")
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    _write_json(args.output, report)
+    print(f"\n结果已写入 {args.output}")
+
+    if args.save_baseline:
+        _write_json(args.baseline, report)
+        print(f"已保存为基线 {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("没有基线文件，跳过比较（使用 --save-baseline 保存基线）")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f).get('results', {})
+
+    regressions = 0
+    print(f"\n与基线比较（阈值 {args.threshold:.0%}）：")
+    for name, base, current, change, regressed in compare(results, baseline, args.threshold):
+        if change is None:
+            print(f"{name:<48} {'新用例':>12}")
+            continue
+        mark = "  <-- 回退" if regressed else ""
+        print(f"{name:<48} {base:>10.2f} -> {current:>10.2f} us  {change:+.1%}{mark}")
+        regressions += regressed
+    if regressions:
+        print(f"\n{regressions} 个用例比基线慢超过 {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
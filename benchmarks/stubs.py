@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基准测试使用的替身模块
+wxauto、pyautogui 只能在 Windows 桌面上操作微信，AI 服务需要联网；
+基准测试在导入项目模块之前用这里的替身替换它们，保证测试可在 Linux 上离线运行且结果稳定。
+"""
+
+import json
+import sys
+import types
+
+
+class FakeWeChat:
+    """wxauto.WeChat 的替身，只记录发送的内容"""
+
+    def __init__(self, *args, **kwargs):
+        self.sent = []
+
+    def SendMsg(self, msg, who=None, *args, **kwargs):
+        self.sent.append((who, msg))
+
+    def SendFiles(self, filepath, who=None, *args, **kwargs):
+        self.sent.append((who, filepath))
+
+    def AddListenChat(self, *args, **kwargs):
+        pass
+
+    def GetListenMessage(self, *args, **kwargs):
+        return {}
+
+    def GetGroupMsg(self, *args, **kwargs):
+        return []
+
+
+class FakeStreamResponse:
+    """requests 流式响应的替身，按固定大小分块返回预先准备好的内容"""
+
+    def __init__(self, body, chunk_size=1024):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=None):
+        size = chunk_size or self.chunk_size
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+
+def build_coze_stream(answer, pieces=200):
+    """
+    构造 Coze 流式接口的 SSE 响应体
+
+    Args:
+        answer (str): 完整回复
+        pieces (int): 拆分成多少个增量事件
+
+    Returns:
+        bytes: SSE 响应体
+    """
+    step = max(1, len(answer) // pieces)
+    events = []
+    for start in range(0, len(answer), step):
+        delta = {"type": "answer", "content": answer[start:start + step]}
+        events.append(f"event:conversation.message.delta\ndata:{json.dumps(delta, ensure_ascii=False)}\n\n")
+    completed = {"type": "answer", "content": answer}
+    events.append(f"event:conversation.message.completed\ndata:{json.dumps(completed, ensure_ascii=False)}\n\n")
+    events.append("event:done\ndata:{}\n\n")
+    return "".join(events).encode('utf-8')
+
+
+def install():
+    """在 sys.modules 中注册 wxauto 和 pyautogui 的替身，需在导入项目模块之前调用"""
+    wxauto = types.ModuleType('wxauto')
+    wxauto.WeChat = FakeWeChat
+    sys.modules['wxauto'] = wxauto
+
+    pyautogui = types.ModuleType('pyautogui')
+    pyautogui.FAILSAFE = False
+    for name in ('click', 'moveTo', 'rightClick', 'hotkey', 'press', 'screenshot'):
+        setattr(pyautogui, name, lambda *args, **kwargs: None)
+    sys.modules['pyautogui'] = pyautogui
@@ -1,70 +1,192 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-"""
-配置文件
-包含应用程序的所有配置参数
-"""
-
-# ***********************************************************************
-# Modified based on the My-Dream-Moments project
-# Copyright of the original project: Copyright (C) 2025, umaru
-# Copyright of this modification: Copyright (C) 2025, iwyxdxl
-# Licensed under GNU GPL-3.0 or higher, see the LICENSE file for details.
-# ***********************************************************************
-
-# 用户列表(请配置要和bot说话的账号的微信昵称，不要写备注！)
-# 例如：LISTEN_LIST = ['用户1','用户2']
-LISTEN_LIST = ['文件传输助手','梁培利','螃蟹青年']
-GROUP_LIST = ['测试2','AI 产品经理小组']
-BOT_NAME = '螃蟹青年星'
-
-# DeepSeek API 配置
-DEEPSEEK_API_KEY = 'sk-ptlmtumpudtgxkiufynwnmsrccpvwaywhtkpvspqsnybdsmz'
-# 硅基流动API注册地址，免费15元额度 https://cloud.siliconflow.cn/
-DEEPSEEK_BASE_URL = 'https://api.siliconflow.cn/v1/'
-# 硅基流动API的模型
-MODEL = 'Pro/deepseek-ai/DeepSeek-V3'
-
-#火山方舟配置
-ARK_API_KEY = '7b233883-61dd-4087-8dec-12c0ca0b70eb'
-ARK_BASE_URL = 'https://ark.cn-beijing.volces.com/api/v3'
-ARK_MODEL = 'bot-20250219111142-fql46'
-USE_ARK_API = True
-
-# 如果要使用官方的API
-# DEEPSEEK_BASE_URL = 'https://api.deepseek.com'
-# 官方API的V3模型
-# MODEL = 'deepseek-chat'
-
-#COZE配置
-#测试API
-#COZE_API_KEY = 'pat_L1RHaMzCeeOeEcJmePAqEUWGrMJSEJLsrFQNXIXgCGWUkuzUYpF8c9cUPV76CgaT'
-
-COZE_API_KEY = 'pat_lxKXyKdrF0IRFPM0NqMPXaBBATs8U3rI9vNUN4XSsZYo6vFp5PJYzopaXYY6ydR6'
-#测试ID
-#COZE_BOT_ID = '7481688080375169087'
-COZE_BOT_ID = '7480740807264239631'
-COZE_API_ENDPOINT = 'https://api.coze.cn/v3/chat'
-COZE_TRIGGER_KEYWORDS = ['星座']
-COZE_DATABASE_KEYWORDS = ['金币余额','签到']
-
-# 回复最大token
-MAX_TOKEN = 2000
-# DeepSeek温度
-TEMPERATURE = 1.1
-# Moonshot AI配置（用于图片和表情包识别）
-# API申请https://platform.moonshot.cn/
-MOONSHOT_API_KEY = 'sk-0RuxglJsBJxsDzzHSqT9IF3vBARtCYKU4TgTEYIjdJf3h6hP'
-MOONSHOT_BASE_URL = "https://api.moonshot.cn/v1"
-MOONSHOT_MODEL = "moonshot-v1-128k-vision-preview"
-MOONSHOT_TEMPERATURE = 0.3
-#表情包存放目录
-EMOJI_DIR = 'emojis'
-# 自动消息配置
-AUTO_MESSAGE = "请你模拟系统设置的角色，在微信上找对方发消息想知道对方在做什么"
-MIN_COUNTDOWN_HOURS = 0.2  # 最小倒计时时间（小时）
-MAX_COUNTDOWN_HOURS = 0.5  # 最大倒计时时间（小时）
-# 消息发送时间限制
-QUIET_TIME_START = "22:00"  # 安静时间开始
-QUIET_TIME_END = "8:00"    # 安静时间结束 
\ No newline at end of file
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+配置文件
+包含应用程序的所有配置参数
+"""
+
+# ***********************************************************************
+# Modified based on the My-Dream-Moments project
+# Copyright of the original project: Copyright (C) 2025, umaru
+# Copyright of this modification: Copyright (C) 2025, iwyxdxl
+# Licensed under GNU GPL-3.0 or higher, see the LICENSE file for details.
+# ***********************************************************************
+
+# 用户列表(请配置要和bot说话的账号的微信昵称，不要写备注！)
+# 例如：LISTEN_LIST = ['用户1','用户2']
+LISTEN_LIST = ['文件传输助手','梁培利','螃蟹青年']
+GROUP_LIST = ['测试2','AI 产品经理小组']
+BOT_NAME = '螃蟹青年星'
+
+# DeepSeek API 配置
+DEEPSEEK_API_KEY = 'sk-ptlmtumpudtgxkiufynwnmsrccpvwaywhtkpvspqsnybdsmz'
+# 硅基流动API注册地址，免费15元额度 https://cloud.siliconflow.cn/
+DEEPSEEK_BASE_URL = 'https://api.siliconflow.cn/v1/'
+# 硅基流动API的模型
+MODEL = 'Pro/deepseek-ai/DeepSeek-V3'
+
+#火山方舟配置
+ARK_API_KEY = '7b233883-61dd-4087-8dec-12c0ca0b70eb'
+ARK_BASE_URL = 'https://ark.cn-beijing.volces.com/api/v3'
+ARK_MODEL = 'bot-20250219111142-fql46'
+USE_ARK_API = True
+
+# 如果要使用官方的API
+# DEEPSEEK_BASE_URL = 'https://api.deepseek.com'
+# 官方API的V3模型
+# MODEL = 'deepseek-chat'
+
+#COZE配置
+#测试API
+#COZE_API_KEY = 'pat_L1RHaMzCeeOeEcJmePAqEUWGrMJSEJLsrFQNXIXgCGWUkuzUYpF8c9cUPV76CgaT'
+
+COZE_API_KEY = 'pat_lxKXyKdrF0IRFPM0NqMPXaBBATs8U3rI9vNUN4XSsZYo6vFp5PJYzopaXYY6ydR6'
+#测试ID
+#COZE_BOT_ID = '7481688080375169087'
+COZE_BOT_ID = '7480740807264239631'
+COZE_API_ENDPOINT = 'https://api.coze.cn/v3/chat'
+COZE_TRIGGER_KEYWORDS = ['星座']
+COZE_DATABASE_KEYWORDS = ['金币余额','签到']
+
+# 关键词配置（启动时编译为一个多模式匹配器，英文不区分大小写）
+# 星座相关关键词，群聊中命中时无需 @ 机器人，交给 Coze 回复
+CONSTELLATION_KEYWORDS = [
+    "星座", "白羊", "金牛", "双子", "巨蟹", "狮子", "处女",
+    "天秤", "天蝎", "射手", "摩羯", "水瓶", "双鱼",
+    "运势", "星盘", "水逆", "太阳星座", "上升星座", "星座配对", "占星"
+]
+# 直接请求表情包的关键词
+EMOJI_REQUEST_KEYWORDS = ["表情包", "表情", "斗图", "gif", "动图"]
+# 情感表达关键词，消息或回复中命中时附带表情包
+EMOTION_KEYWORDS = [
+    "开心", "难过", "生气", "委屈", "高兴", "伤心", "哭", "笑", "怒",
+    "喜", "悲", "乐", "泪", "哈哈", "呜呜", "嘿嘿", "嘻嘻", "哼",
+    "啊啊", "呵呵", "可爱", "惊讶", "惊喜", "恐惧", "害怕", "紧张",
+    "放松", "激动", "满足", "失望", "愤怒", "羞愧", "兴奋", "愉快",
+    "心酸", "愧疚", "懊悔", "孤独", "寂寞", "安慰", "安宁", "放心",
+    "烦恼", "忧虑", "疑惑", "困惑", "怀疑", "鄙视", "厌恶", "厌倦",
+    "失落", "愉悦", "惊恐", "惊魂未定", "震惊"
+]
+
+# 数据库连接地址
+DATABASE_URL = 'sqlite:///game_user.db'
+
+# 回复最大token
+MAX_TOKEN = 2000
+# DeepSeek温度
+TEMPERATURE = 1.1
+# Moonshot AI配置（用于图片和表情包识别）
+# API申请https://platform.moonshot.cn/
+MOONSHOT_API_KEY = 'sk-0RuxglJsBJxsDzzHSqT9IF3vBARtCYKU4TgTEYIjdJf3h6hP'
+MOONSHOT_BASE_URL = "https://api.moonshot.cn/v1"
+MOONSHOT_MODEL = "moonshot-v1-128k-vision-preview"
+MOONSHOT_TEMPERATURE = 0.3
+#表情包存放目录
+EMOJI_DIR = 'emojis'
+# 自动消息配置
+AUTO_MESSAGE = "请你模拟系统设置的角色，在微信上找对方发消息想知道对方在做什么"
+MIN_COUNTDOWN_HOURS = 0.2  # 最小倒计时时间（小时）
+MAX_COUNTDOWN_HOURS = 0.5  # 最大倒计时时间（小时）
+# 消息发送时间限制
+QUIET_TIME_START = "22:00"  # 安静时间开始
+QUIET_TIME_END = "8:00"    # 安静时间结束 
+
+# 运行模式配置
+USE_ASYNC_RUNTIME = False  # 是否使用 asyncio 事件驱动模式（监听、合并、AI 调用、发送以协作任务运行）
+REPLY_WORKER_COUNT = 4  # 同时生成回复的会话数量（同一会话内的回复始终按顺序处理）
+MESSAGE_DEBOUNCE_SECONDS = 7  # 用户停止发言多少秒后合并处理其消息
+# 按会话单独设置静默合并时间（秒），未配置的会话使用 MESSAGE_DEBOUNCE_SECONDS
+# 例如：MESSAGE_DEBOUNCE_OVERRIDES = {'测试2': 3}
+MESSAGE_DEBOUNCE_OVERRIDES = {}
+STREAM_REPLIES = False  # 流式接收火山方舟/DeepSeek 回复，每段完整后立即发送到微信
+
+# HTTP 连接配置（所有 AI 客户端共用）
+HTTP_POOL_SIZE = 10  # 每个服务商主机保持的最大长连接数
+HTTP_CONNECT_TIMEOUT = 5  # 建立连接超时（秒）
+HTTP_READ_TIMEOUT = 30  # 读取响应超时（秒）
+HTTP_KEEPALIVE_SECONDS = 60  # 空闲长连接保留时间（秒）
+HTTP_WARMUP_ON_START = True  # 启动时预热各服务商连接
+
+# 对话上下文缓存配置
+CONTEXT_CACHE_MAX_USERS = 500  # 最多缓存多少个用户的最近对话，超出后淘汰最久未使用的用户
+CONTEXT_CACHE_TURNS = 30  # 每个用户缓存的对话轮次
+
+# 聊天记录写入配置（后台批量提交）
+CHAT_WRITE_BATCH_SIZE = 50  # 聊天记录攒够多少条立即批量写入数据库
+CHAT_WRITE_FLUSH_SECONDS = 1.0  # 聊天记录最多等待多少秒写入数据库
+
+# Prompt 文件缓存配置
+PROMPT_RELOAD_CHECK_SECONDS = 2  # 两次检查 Prompt 文件是否被修改的最小间隔（秒）
+
+# 图片识别缓存配置（按图片内容缓存 Moonshot 的识别结果）
+VISION_CACHE_ENABLED = True  # 是否缓存图片/表情包识别结果
+VISION_CACHE_MAX_ENTRIES = 2000  # 最多缓存多少条识别结果，超出后淘汰最久未使用的
+VISION_CACHE_PHASH_DISTANCE = 4  # 感知哈希最大汉明距离，重新编码的同一张图也能命中；0 表示只按内容完全匹配
+
+# 图片识别流水线配置
+IMAGE_RECOGNITION_WORKERS = 2  # 同时进行的图片识别请求数量
+IMAGE_RECOGNITION_QUEUE_SIZE = 20  # 最多排队识别的图片数量，队列满时新图片按识别失败处理
+
+# 图片上传前的预处理配置
+VISION_MAX_SIDE = 1024  # 上传给视觉模型的图片最长边（像素）
+VISION_IMAGE_FORMAT = 'JPEG'  # 重新压缩的格式：JPEG 或 WEBP
+VISION_IMAGE_QUALITY = 85  # 重新压缩的质量（1-100）
+VISION_GIF_FRAMES = 3  # 动图最多抽取几帧拼接后上传
+
+# 表情包索引配置
+# 文件名（如 开心_哈哈.gif）或 emojis/index.json 中的标签用于按情感选择表情包
+EMOJI_REFRESH_SECONDS = 10  # 两次检查表情包目录是否变化的最小间隔（秒）
+
+# 上下文 token 预算配置（按估算的 token 数从最新一轮开始填充历史对话）
+# 默认每次请求的上下文预算（Prompt + 历史对话 + 用户消息），足以容纳 CONTEXT_CACHE_TURNS 轮普通长度的对话，
+# 只有对话很长时才从最早的一轮开始舍弃；调小可以降低请求成本，但模型能看到的历史会相应变少
+CONTEXT_TOKEN_BUDGET = 12000
+# 按模型单独设置预算，例如：CONTEXT_TOKEN_BUDGETS = {'deepseek-chat': 6000}
+CONTEXT_TOKEN_BUDGETS = {}
+CONTEXT_TURN_MAX_TOKENS = 400  # 单条历史消息或回复超出时截断
+
+# 对话摘要配置（较早的对话由低成本模型在后台压缩为摘要，上下文只发送摘要和最近的对话）
+SUMMARY_ENABLED = False  # 是否启用对话摘要（需要配置好 DeepSeek 接口，USE_ARK_API 为 True 时同样通过该接口生成摘要）
+SUMMARY_MODEL = 'Qwen/Qwen2.5-7B-Instruct'  # 生成摘要使用的模型（通过 DeepSeek 配置的接口调用）
+SUMMARY_MAX_TOKENS = 500  # 摘要的最大长度
+SUMMARY_KEEP_TURNS = 20  # 最近多少轮对话保留原文，不合并进摘要
+SUMMARY_TRIGGER_TURNS = 10  # 保留窗口之外积攒多少轮未摘要的对话时触发一次摘要
+SUMMARY_MAX_BACKLOG_TURNS = 100  # 一次最多合并保留窗口之外最新的多少轮，更早的积压（如开启前的历史记录）直接跳过
+
+# Coze 星座运势缓存配置（按 意图 + 星座 + 主题 + 日期 缓存 Coze 的回复）
+COZE_CACHE_ENABLED = True  # 是否缓存星座运势回复
+COZE_CACHE_TTL_SECONDS = 6 * 3600  # 缓存的回复最长保留时间（秒），日期变化后自动失效
+COZE_CACHE_MAX_QUERY_CHARS = 20  # 去掉时间戳和 @ 后超过此长度的消息视为具体问题，不使用缓存
+# 含有这些词的消息不使用缓存（配对、星盘等需要个性化回答的问题）；
+# 按子串匹配，避免使用单个字，例如 "和" 会误伤 "温和"、"和谐"
+COZE_CACHE_BYPASS_KEYWORDS = [
+    "配对", "星盘", "上升", "月亮", "水逆", "合不合", "适合", "为什么", "怎么办",
+    "和我", "跟我", "和他", "跟他", "和她", "跟她", "男朋友", "女朋友", "对象"
+]
+COZE_PREFETCH_ENABLED = False  # 是否每天定时预取 12 星座的今日运势
+COZE_PREFETCH_TIME = "8:30"  # 每天预取的时间，处于安静时间时顺延到安静时间结束后
+COZE_PREFETCH_INTERVAL_SECONDS = 3  # 预取时两次请求之间的间隔（秒）
+
+# 金币配置
+SIGN_IN_REWARD = 10  # 每日签到奖励的金币数量
+BALANCE_CACHE_MAX_USERS = 5000  # 最多缓存多少个账户的余额，超出后淘汰最久未使用的账户
+LEADERBOARD_KEYWORDS = ['金币排行']  # 查询金币排行榜的指令，群聊中无需 @ 机器人
+LEADERBOARD_SIZE = 10  # 排行榜显示的人数
+LEADERBOARD_CACHE_SECONDS = 30  # 排行榜结果缓存时间（秒）
+
+# 运行指标配置（各处理阶段的耗时直方图、队列长度等，以 Prometheus 文本格式输出）
+METRICS_ENABLED = False  # 是否启动指标 HTTP 服务，访问 http://METRICS_HOST:METRICS_PORT/metrics 读取
+METRICS_HOST = '127.0.0.1'  # 指标服务监听地址，默认只允许本机访问
+METRICS_PORT = 9108  # 指标服务端口
+
+# 性能分析配置（运行中按需采样所有线程的调用栈，输出可生成火焰图的折叠栈文件）
+PROFILER_ENABLED = True  # 是否允许触发性能分析，未采样时几乎没有开销
+PROFILER_ADMINS = []  # 可以私聊发送性能分析指令的联系人昵称，例如 ['文件传输助手']
+PROFILER_KEYWORDS = ['性能分析']  # 性能分析指令，可在后面附上采样秒数，例如 "性能分析 30"
+PROFILER_DEFAULT_SECONDS = 30  # 默认采样时长（秒）
+PROFILER_MAX_SECONDS = 300  # 最长采样时长（秒）
+PROFILER_INTERVAL_SECONDS = 0.01  # 采样间隔（秒）
+PROFILER_OUTPUT_DIR = 'profiles'  # 折叠栈文件的输出目录（相对项目根目录）
+PROFILER_TRIGGER_FILE = 'profile.flag'  # 标记文件（相对项目根目录），创建后开始采样，文件内容可写采样秒数
+PROFILER_FLAG_CHECK_SECONDS = 2  # 检查标记文件的间隔（秒）
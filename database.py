@@ -1,44 +1,73 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-"""
-数据库模块
-处理数据库连接和会话管理
-"""
-
-from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
-from sqlalchemy.orm import sessionmaker
-from base import Base  # 从 base.py 导入 Base
-
-# 创建数据库引擎
-engine = create_engine('sqlite:///game_user.db')
-
-# 创建会话工厂
-Session = sessionmaker(bind=engine)
-
-class ChatMessage(Base):
-    """聊天消息模型"""
-    __tablename__ = 'chat_messages'
-
-    id = Column(Integer, primary_key=True)
-    sender_id = Column(String(100))  # 发送者微信ID
-    sender_name = Column(String(100))  # 发送者昵称
-    message = Column(Text)  # 发送的消息
-    reply = Column(Text)  # 机器人的回复
-    created_at = Column(DateTime, default=datetime.now)
-
-# 确保所有表被创建
-def init_db():
-    """初始化数据库，创建所有表"""
-    # 导入其他模型（这里 GameUser 模型在 models.py 中定义）
-    from models import GameUser
-    
-    # 创建所有数据库表（包括 chat_messages 和 game_users）
-    Base.metadata.create_all(engine)
-    
-    print("数据库初始化完成")
-
-if __name__ == '__main__':
-    init_db()
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据库模块
+处理数据库连接和会话管理
+"""
+
+from datetime import datetime
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.orm import sessionmaker
+from base import Base  # 从 base.py 导入 Base
+from config import DATABASE_URL
+
+# 创建数据库引擎
+engine = create_engine(DATABASE_URL)
+
+# SQLite 连接参数：WAL 日志模式允许读写并发，NORMAL 同步级别在 WAL 下仍可保证崩溃一致性
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新连接建立时设置 SQLite 参数"""
+    if engine.dialect.name != 'sqlite':
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+# 创建会话工厂
+Session = sessionmaker(bind=engine)
+
+class ChatMessage(Base):
+    """聊天消息模型"""
+    __tablename__ = 'chat_messages'
+
+    id = Column(Integer, primary_key=True)
+    sender_id = Column(String(100))  # 发送者微信ID
+    sender_name = Column(String(100))  # 发送者昵称
+    message = Column(Text)  # 发送的消息
+    reply = Column(Text)  # 机器人的回复
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        # 按用户查询最近对话记录
+        Index('ix_chat_messages_sender_created', 'sender_id', 'created_at'),
+    )
+
+# 确保所有表被创建
+def init_db():
+    """初始化数据库，创建所有表"""
+    # 导入其他模型（这里 GameUser 模型在 models.py 中定义）
+    from models import GameUser
+    
+    # 创建所有数据库表（包括 chat_messages 和 game_users）
+    Base.metadata.create_all(engine)
+    
+    # 对已有的数据库文件执行结构迁移
+    from migrations import run_migrations
+    run_migrations(engine)
+    
+    print("数据库初始化完成")
+
+if __name__ == '__main__':
+    init_db()
     print("数据库创建成功，新数据库文件为 game_user.db") 
\ No newline at end of file
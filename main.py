@@ -1,80 +1,129 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-"""
-主程序入口
-"""
-
-import logging
-import threading
-import time
-import shutil
-import os
-
-from wechat.listener import WeChatListener
-from wechat.sender import WeChatSender
-from user.manager import UserManager
-from utils.time_utils import setup_logging
-from database import init_db
-
-# 设置日志
-logger = setup_logging()
-
-def clean_up_temp_files():
-    """清理临时文件和目录"""
-    temp_dirs = ["screenshot", "wxauto文件"]
-    for dir_name in temp_dirs:
-        if os.path.isdir(dir_name):
-            shutil.rmtree(dir_name)
-            logger.info(f"目录 {dir_name} 已成功删除")
-        else:
-            logger.info(f"目录 {dir_name} 不存在，无需删除")
-
-def main():
-    """主函数"""
-    try:
-        # 初始化数据库
-        init_db()
-        
-        # 清理临时文件
-        clean_up_temp_files()
-        
-        # 初始化微信发送器
-        sender = WeChatSender()
-        
-        # 初始化用户管理器
-        user_manager = UserManager(sender)
-        
-        # 初始化微信监听器
-        listener = WeChatListener(user_manager)
-        
-        # 启动消息监听线程
-        listener_thread = threading.Thread(target=listener.start)
-        listener_thread.daemon = True
-        listener_thread.start()
-        
-        # 启动用户消息处理线程
-        checker_thread = threading.Thread(target=user_manager.check_inactive_users)
-        checker_thread.daemon = True
-        checker_thread.start()
-        
-        # 启动用户超时检查线程
-        #timeout_thread = threading.Thread(target=user_manager.check_user_timeouts)
-        #timeout_thread.daemon = True
-        #timeout_thread.start()
-        
-        logger.info("机器人已启动，等待消息...")
-        
-        # 主循环保持程序运行
-        while True:
-            time.sleep(1)
-            
-    except KeyboardInterrupt:
-        logger.info("用户终止程序")
-    except Exception as e:
-        logger.error(f"程序运行异常: {str(e)}", exc_info=True)
-    finally:
-        logger.info("程序退出")
-
-if __name__ == "__main__":
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+主程序入口
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import shutil
+import os
+
+from wechat.listener import WeChatListener
+from wechat.sender import WeChatSender
+from user.manager import UserManager
+from utils.time_utils import setup_logging
+from database import init_db
+from config import (
+    USE_ASYNC_RUNTIME, HTTP_WARMUP_ON_START, COZE_PREFETCH_ENABLED,
+    METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+)
+from ai_clients.transport import warm_up_connections
+from ai_clients.coze_cache import run_prefetch_schedule
+from utils.chat_context_manager import chat_record_writer
+from utils.metrics import start_metrics_server
+from utils.profiler import install_profiler_triggers
+
+# 设置日志
+logger = setup_logging()
+
+def clean_up_temp_files():
+    """清理临时文件和目录"""
+    temp_dirs = ["screenshot", "wxauto文件"]
+    for dir_name in temp_dirs:
+        if os.path.isdir(dir_name):
+            shutil.rmtree(dir_name)
+            logger.info(f"目录 {dir_name} 已成功删除")
+        else:
+            logger.info(f"目录 {dir_name} 不存在，无需删除")
+
+def run_async(user_manager, sender):
+    """
+    以 asyncio 事件驱动模式运行机器人
+
+    Args:
+        user_manager: 用户管理器
+        sender: 微信消息发送器
+    """
+    # 延迟导入，线程模式下不加载异步运行时
+    from runtime import AsyncBotRuntime
+
+    runtime = AsyncBotRuntime(user_manager, sender)
+    # 监听器把消息交给运行时调度，而不是直接写入用户管理器
+    runtime.attach_listener(WeChatListener(runtime.dispatcher))
+
+    logger.info("机器人已启动（异步模式），等待消息...")
+    asyncio.run(runtime.run())
+
+def main():
+    """主函数"""
+    try:
+        # 初始化数据库
+        init_db()
+        
+        # 清理临时文件
+        clean_up_temp_files()
+        
+        # 后台预热 AI 服务商连接
+        if HTTP_WARMUP_ON_START:
+            threading.Thread(target=warm_up_connections, name='http-warmup', daemon=True).start()
+        
+        # 每天定时预取星座运势
+        if COZE_PREFETCH_ENABLED:
+            threading.Thread(target=run_prefetch_schedule, name='coze-prefetch', daemon=True).start()
+        
+        # 本机指标服务
+        if METRICS_ENABLED:
+            start_metrics_server(METRICS_HOST, METRICS_PORT)
+        
+        # 性能分析触发方式（信号处理函数只能在主线程注册）
+        install_profiler_triggers()
+        
+        # 初始化微信发送器
+        sender = WeChatSender()
+        
+        # 初始化用户管理器
+        user_manager = UserManager(sender)
+        
+        if USE_ASYNC_RUNTIME:
+            run_async(user_manager, sender)
+            return
+        
+        # 初始化微信监听器
+        listener = WeChatListener(user_manager)
+        
+        # 启动消息监听线程
+        listener_thread = threading.Thread(target=listener.start, name='wx-listener')
+        listener_thread.daemon = True
+        listener_thread.start()
+        
+        # 启动用户消息处理线程
+        checker_thread = threading.Thread(target=user_manager.check_inactive_users, name='message-checker')
+        checker_thread.daemon = True
+        checker_thread.start()
+        
+        # 启动用户超时检查线程
+        #timeout_thread = threading.Thread(target=user_manager.check_user_timeouts)
+        #timeout_thread.daemon = True
+        #timeout_thread.start()
+        
+        logger.info("机器人已启动，等待消息...")
+        
+        # 主循环保持程序运行
+        while True:
+            time.sleep(1)
+            
+    except KeyboardInterrupt:
+        logger.info("用户终止程序")
+    except Exception as e:
+        logger.error(f"程序运行异常: {str(e)}", exc_info=True)
+    finally:
+        # 写完尚未落盘的聊天记录
+        chat_record_writer.stop()
+        logger.info("程序退出")
+
+if __name__ == "__main__":
     main() 
\ No newline at end of file
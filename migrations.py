@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据库迁移模块
+按版本号依次对已有的数据库文件执行结构变更，当前版本记录在 SQLite 的 PRAGMA user_version 中
+"""
+
+import logging
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+def _add_chat_message_index(connection):
+    """为 chat_messages 增加 (sender_id, created_at) 复合索引，按用户查询最近对话时不再全表扫描"""
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_chat_messages_sender_created "
+        "ON chat_messages (sender_id, created_at)"
+    ))
+
+
+def _add_coin_ledger(connection):
+    """为 game_users 增加余额索引，并把已有账户的余额记为金币流水的期初余额"""
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_game_users_coin_balance "
+        "ON game_users (coin_balance)"
+    ))
+    connection.execute(text(
+        "INSERT INTO coin_transactions (user_id, amount, balance_after, reason, created_at) "
+        "SELECT id, coin_balance, coin_balance, 'opening', datetime('now', 'localtime') "
+        "FROM game_users WHERE coin_balance != 0"
+    ))
+
+
+# 迁移列表：(版本号, 说明, 迁移函数)，版本号必须递增，已发布的迁移不要修改
+MIGRATIONS = [
+    (1, "chat_messages 增加 (sender_id, created_at) 复合索引", _add_chat_message_index),
+    (2, "game_users 增加余额索引，新增金币流水并写入期初余额", _add_coin_ledger),
+]
+
+
+def get_schema_version(connection):
+    """
+    获取数据库当前的结构版本
+
+    Args:
+        connection: SQLAlchemy 连接
+
+    Returns:
+        int: 结构版本号
+    """
+    return connection.execute(text("PRAGMA user_version")).scalar() or 0
+
+
+def run_migrations(engine):
+    """
+    执行所有尚未应用的迁移，每个迁移在独立事务中完成并更新版本号
+
+    Args:
+        engine: SQLAlchemy 引擎
+    """
+    with engine.connect() as connection:
+        current = get_schema_version(connection)
+
+    pending = [m for m in MIGRATIONS if m[0] > current]
+    if not pending:
+        logger.info(f"数据库结构已是最新版本: {current}")
+        return
+
+    for version, description, migrate in pending:
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.execute(text(f"PRAGMA user_version = {int(version)}"))
+        logger.info(f"已执行数据库迁移 {version}: {description}")
+
+    # 更新查询优化器的统计信息，使新索引立即生效
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
@@ -1,19 +1,67 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-"""
-数据库模型模块
-定义应用使用的数据库模型
-"""
-
-from sqlalchemy import Column, Integer, String, Date
-from base import Base
-
-class GameUser(Base):
-    """游戏用户模型"""
-    __tablename__ = 'game_users'
-    
-    id = Column(String, primary_key=True)       # 用户ID
-    name = Column(String)                       # 用户名
-    coin_balance = Column(Integer, default=0)   # 金币余额
-    last_sign_in_date = Column(Date)            # 最后一次签到日期 
\ No newline at end of file
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据库模型模块
+定义应用使用的数据库模型
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Date, DateTime, Text, Index
+from base import Base
+
+class GameUser(Base):
+    """游戏用户模型"""
+    __tablename__ = 'game_users'
+    
+    id = Column(String, primary_key=True)       # 用户ID
+    name = Column(String)                       # 用户名
+    coin_balance = Column(Integer, default=0)   # 金币余额
+    last_sign_in_date = Column(Date)            # 最后一次签到日期
+
+    __table_args__ = (
+        Index('ix_game_users_coin_balance', 'coin_balance'),  # 金币排行榜按余额倒序读取前 N 名
+    )
+
+class CoinTransaction(Base):
+    """金币流水模型（只追加），每次金币变动一条记录"""
+    __tablename__ = 'coin_transactions'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False)            # 用户ID
+    amount = Column(Integer, nullable=False)            # 变动数量，负数为扣除
+    balance_after = Column(Integer, nullable=False)     # 变动后的余额
+    reason = Column(String(20), nullable=False)         # 变动原因：sign_in（签到）、reward（发放）、opening（迁移时的期初余额）等
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_coin_transactions_user_created', 'user_id', 'created_at'),
+    )
+
+class ImageRecognition(Base):
+    """图片/表情包识别结果缓存模型"""
+    __tablename__ = 'image_recognitions'
+
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), nullable=False)    # 图片内容的 SHA-256
+    perceptual_hash = Column(String(16))                 # 图片的 64 位差异哈希（dHash），用于匹配重新编码的同一张图
+    mode = Column(String(10), nullable=False)            # 识别模式：emoji（表情包）或 picture（图片）
+    description = Column(Text, nullable=False)           # 识别结果文本
+    hit_count = Column(Integer, default=0)               # 命中次数
+    created_at = Column(DateTime, default=datetime.now)
+    last_used = Column(DateTime, default=datetime.now)   # 最近一次使用时间，用于淘汰
+
+    __table_args__ = (
+        Index('ix_image_recognitions_hash_mode', 'content_hash', 'mode', unique=True),
+        Index('ix_image_recognitions_last_used', 'last_used'),
+    )
+
+class ConversationSummary(Base):
+    """用户较早对话的滚动摘要模型"""
+    __tablename__ = 'conversation_summaries'
+
+    user_id = Column(String, primary_key=True)          # 用户ID（会话ID）
+    summary = Column(Text, nullable=False)              # 摘要内容
+    summarized_until = Column(DateTime, nullable=False) # 已合并进摘要的最后一条聊天记录的时间
+    summarized_turns = Column(Integer, default=0)       # 已合并进摘要的对话轮次总数
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -0,0 +1,8 @@
+"""
+运行时模块
+提供基于 asyncio 的事件驱动运行模式
+"""
+
+from runtime.async_runtime import AsyncBotRuntime
+
+__all__ = ['AsyncBotRuntime']
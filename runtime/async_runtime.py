@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+asyncio 事件驱动运行时
+监听、消息合并、AI 调用和发送以协作任务运行，任务之间通过队列衔接：
+
+    监听任务 --inbound--> 合并任务 --ready--> 回复工作者 --outbound--> 发送任务
+
+wxauto 和各 AI 客户端都是阻塞接口，分别放在专用线程池中执行，
+事件循环本身只负责调度，不会被任何一次阻塞调用卡住。
+会话的合并到期时间由用户管理器的合并调度器维护，两种运行模式共用。
+开启流式回复时，回复工作者边接收模型输出边分段发送，不再经过 outbound 队列。
+回复分段之间的打字延迟由发送器的发送调度器按目标等待，发送任务只负责把回复交给调度器。
+回复交给发送调度器后工作者即可处理其它会话；会话在回复的全部分段发出后才释放，
+发送期间到期的新批次等待当前回复结束。
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import REPLY_WORKER_COUNT, STREAM_REPLIES
+from user.manager import FLUSH_RETRY_SECONDS
+from user.chat_state import AWAITING_MEDIA
+
+logger = logging.getLogger(__name__)
+
+
+class _LoopDispatcher:
+    """
+    监听器的消息分发目标
+    监听器在线程中运行，这里把消息线程安全地投递到事件循环的 inbound 队列
+    """
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+
+    def handle_message(self, msg):
+        self.runtime.submit_inbound('message', msg)
+
+    def handle_emoji_message(self, msg):
+        self.runtime.submit_inbound('emoji', msg)
+
+    def hold_media(self, chat_id):
+        # 立即生效，保证图片识别期间会话不会被合并
+        self.runtime.user_manager.hold_media(chat_id)
+
+    def release_media(self, chat_id):
+        # 与识别结果经同一个队列送达，识别结果入队后才解除暂缓
+        self.runtime.submit_inbound('release_media', chat_id)
+
+
+class AsyncBotRuntime:
+    """asyncio 运行时"""
+
+    def __init__(self, user_manager, sender, worker_count=REPLY_WORKER_COUNT):
+        """
+        初始化运行时
+
+        Args:
+            user_manager: 用户管理器
+            sender: 微信消息发送器
+            worker_count (int): 并发生成回复的工作者数量
+        """
+        self.user_manager = user_manager
+        self.sender = sender
+        self.worker_count = max(1, worker_count)
+        self.dispatcher = _LoopDispatcher(self)
+        self.listener = None
+
+        # wxauto 基于界面自动化，监听和发送各自固定在一个线程上执行
+        self._listen_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wx-listener')
+        self._send_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wx-sender')
+        self._timer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='debounce')
+        self._ai_executor = ThreadPoolExecutor(max_workers=self.worker_count, thread_name_prefix='ai-worker')
+
+        self._loop = None
+        self._inbound = None
+        self._ready = None
+        self._outbound = None
+
+
+    def attach_listener(self, listener):
+        """
+        绑定微信监听器，监听器应以 self.dispatcher 作为用户管理器创建
+
+        Args:
+            listener: 微信消息监听器
+        """
+        self.listener = listener
+
+    def submit_inbound(self, kind, msg):
+        """
+        从任意线程投递一条新消息
+
+        Args:
+            kind (str): 消息类别，'message'、'emoji' 或 'release_media'
+            msg: 微信消息对象（'release_media' 时为会话ID）
+        """
+        self._loop.call_soon_threadsafe(self._inbound.put_nowait, (kind, msg))
+
+    async def run(self):
+        """运行所有协作任务，直到被取消"""
+        self._loop = asyncio.get_running_loop()
+        self._inbound = asyncio.Queue()
+        self._ready = asyncio.Queue()
+        self._outbound = asyncio.Queue()
+
+        tasks = [
+            asyncio.create_task(self._listen(), name='listener'),
+            asyncio.create_task(self._enqueue(), name='enqueue'),
+            asyncio.create_task(self._debounce(), name='debounce'),
+            asyncio.create_task(self._send(), name='sender'),
+        ]
+        tasks.extend(
+            asyncio.create_task(self._reply_worker(), name=f'reply-worker-{i}')
+            for i in range(self.worker_count)
+        )
+        logger.info(f"异步运行时已启动，回复工作者数量: {self.worker_count}")
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._listen_executor.shutdown(wait=False)
+            self._timer_executor.shutdown(wait=False)
+            self._ai_executor.shutdown(wait=False)
+            self._send_executor.shutdown(wait=False)
+
+    async def _listen(self):
+        """监听任务：在监听线程中拉取微信消息，消息经 dispatcher 进入 inbound 队列"""
+        logger.info("开始监听微信消息（异步模式）")
+        while True:
+            await self._loop.run_in_executor(self._listen_executor, self.listener.poll_once)
+            await asyncio.sleep(self.listener.wait)
+
+    async def _enqueue(self):
+        """入队任务：把新消息写入用户队列，用户管理器会同时设置会话的合并到期时间"""
+        while True:
+            kind, msg = await self._inbound.get()
+            if kind == 'release_media':
+                self.user_manager.release_media(msg)
+            elif kind == 'emoji':
+                self.user_manager.handle_emoji_message(msg)
+            else:
+                self.user_manager.handle_message(msg)
+
+    async def _debounce(self):
+        """合并任务：在调度线程中等待会话到期，到期会话交给回复工作者"""
+        scheduler = self.user_manager.debounce_scheduler
+        while True:
+            # 带超时等待，保证运行时取消后调度线程能及时退出
+            due = await self._loop.run_in_executor(self._timer_executor, scheduler.wait_due, 1)
+            for chat_id in due:
+                self._on_due(chat_id)
+
+    def _on_due(self, chat_id):
+        """会话静默期结束，按会话状态决定交给回复工作者、稍后重试或等待当前回复结束"""
+        blocked = self.user_manager.chat_states.begin_flush(chat_id)
+        if blocked == AWAITING_MEDIA:
+            # 该会话还有图片在识别，稍后再合并
+            self.user_manager.debounce_scheduler.arm(chat_id, FLUSH_RETRY_SECONDS)
+        elif not blocked:
+            self._ready.put_nowait(chat_id)
+
+    def _release(self, chat_id):
+        """会话回复发送完毕，处理期间积攒的新批次"""
+        if self.user_manager.chat_states.finish(chat_id):
+            self._on_due(chat_id)
+
+    def _release_when_sent(self, chat_id, done):
+        """
+        回复全部发出后在事件循环中释放会话，不占用任何线程等待
+
+        Args:
+            chat_id (str): 会话ID
+            done (SendDone): 发送器返回的事件，为 None 时立即释放
+        """
+        if done is None:
+            self._release(chat_id)
+        else:
+            done.add_done_callback(lambda: self._loop.call_soon_threadsafe(self._release, chat_id))
+
+    async def _reply_worker(self):
+        """回复工作者：取出会话消息批次并在线程池中生成回复"""
+        while True:
+            chat_id = await self._ready.get()
+            # 回复交给发送器后由发送完成的回调释放会话，其余情况在这里释放
+            handed_off = False
+            try:
+                user_data = self.user_manager.pop_user_batch(chat_id)
+                if not user_data:
+                    continue
+                if STREAM_REPLIES:
+                    done = await self._loop.run_in_executor(
+                        self._ai_executor, self.user_manager.reply_to_batch, user_data
+                    )
+                    self._release_when_sent(chat_id, done)
+                    handed_off = True
+                    continue
+                merged_message, reply = await self._loop.run_in_executor(
+                    self._ai_executor, self.user_manager.generate_reply, user_data
+                )
+                # 发送任务在回复全部发出后释放会话，保证同一会话内的回复顺序
+                self.user_manager.chat_states.mark_sending(chat_id)
+                await self._outbound.put((chat_id, user_data, merged_message, reply))
+                handed_off = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"处理用户消息失败: {str(e)}")
+            finally:
+                if not handed_off:
+                    self._release(chat_id)
+
+    async def _send(self):
+        """
+        发送任务：在发送线程中把各会话的回复分段后交给发送调度器
+        分段全部发出后由发送完成的回调释放会话，不阻塞其它会话的回复入队
+        """
+        while True:
+            chat_id, user_data, merged_message, reply = await self._outbound.get()
+            try:
+                done = await self._loop.run_in_executor(
+                    self._send_executor, self.sender.send_reply,
+                    chat_id, user_data['sender_name'], user_data['username'], merged_message, reply
+                )
+            except Exception as e:
+                logger.error(f"发送回复失败: {str(e)}")
+                done = None
+            self._release_when_sent(chat_id, done)
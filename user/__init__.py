@@ -1,9 +1,9 @@
-"""
-用户管理模块
-负责用户会话管理、定时器和数据库交互
-"""
-
-from user.manager import UserManager
-from user.services import perform_sign_in, query_coin_balance
-
-__all__ = ['UserManager', 'perform_sign_in', 'query_coin_balance'] 
\ No newline at end of file
+"""
+用户管理模块
+负责用户会话管理、定时器和数据库交互
+"""
+
+from user.manager import UserManager
+from user.services import perform_sign_in, query_coin_balance, query_leaderboard, add_coins, reward_users
+
+__all__ = ['UserManager', 'perform_sign_in', 'query_coin_balance', 'query_leaderboard', 'add_coins', 'reward_users'] 
\ No newline at end of file
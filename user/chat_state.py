@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+会话状态机
+每个会话独立记录所处阶段，合并调度只查看到期会话自己的状态：
+
+    IDLE --新消息--> COLLECTING --到期--> GENERATING --> SENDING --> IDLE
+                         |  ^
+                    图片识别中 识别完成
+                         v  |
+                    AWAITING_MEDIA
+
+生成或发送期间到期的批次会被记下，本次回复结束后再处理，保证同一会话内的回复顺序。
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 会话状态
+IDLE = 'idle'  # 没有待处理的消息
+COLLECTING = 'collecting'  # 正在积攒消息，等待静默期结束
+AWAITING_MEDIA = 'awaiting_media'  # 有图片正在识别，识别结果写入队列前不合并
+GENERATING = 'generating'  # 正在生成回复
+SENDING = 'sending'  # 正在发送回复
+
+
+class ChatStateTracker:
+    """所有会话的状态表"""
+
+    def __init__(self):
+        """初始化状态表"""
+        self._chats = {}  # {chat_id: {'state': 状态, 'since': 进入该状态的时间, 'media': 识别中的图片数量, 'deferred': 是否有待处理的批次}}
+        self._lock = threading.Lock()
+
+    def _get(self, chat_id):
+        """获取会话状态记录，不存在时创建（调用方需持有锁）"""
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = {'state': IDLE, 'since': time.monotonic(), 'media': 0, 'deferred': False}
+        return chat
+
+    def _set(self, chat_id, chat, state):
+        """切换会话状态，空闲的会话不再保留记录（调用方需持有锁）"""
+        if chat['state'] != state:
+            logger.debug(f"会话 {chat_id} 状态: {chat['state']} -> {state}")
+            chat['since'] = time.monotonic()
+        chat['state'] = state
+        if state == IDLE and not chat['media'] and not chat['deferred']:
+            self._chats.pop(chat_id, None)
+
+    def state(self, chat_id):
+        """
+        获取会话当前状态
+
+        Args:
+            chat_id (str): 会话ID
+
+        Returns:
+            str: 会话状态
+        """
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            return chat['state'] if chat else IDLE
+
+    def since(self, chat_id):
+        """
+        获取会话进入当前状态的时间
+
+        Args:
+            chat_id (str): 会话ID
+
+        Returns:
+            float: time.monotonic() 时间，空闲会话返回 None
+        """
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            return chat['since'] if chat else None
+
+    def on_message(self, chat_id):
+        """
+        会话收到新消息
+
+        Args:
+            chat_id (str): 会话ID
+        """
+        with self._lock:
+            chat = self._get(chat_id)
+            if chat['state'] == IDLE:
+                self._set(chat_id, chat, COLLECTING)
+
+    def hold_media(self, chat_id):
+        """
+        会话有图片开始识别，暂缓合并
+
+        Args:
+            chat_id (str): 会话ID
+        """
+        with self._lock:
+            chat = self._get(chat_id)
+            chat['media'] += 1
+            if chat['state'] in (IDLE, COLLECTING):
+                self._set(chat_id, chat, AWAITING_MEDIA)
+
+    def release_media(self, chat_id):
+        """
+        会话的一张图片识别完成（结果已写入队列）
+
+        Args:
+            chat_id (str): 会话ID
+        """
+        with self._lock:
+            chat = self._get(chat_id)
+            chat['media'] = max(0, chat['media'] - 1)
+            if not chat['media'] and chat['state'] == AWAITING_MEDIA:
+                self._set(chat_id, chat, COLLECTING)
+
+    def begin_flush(self, chat_id):
+        """
+        会话到期，尝试开始生成回复
+
+        Args:
+            chat_id (str): 会话ID
+
+        Returns:
+            str: 成功进入 GENERATING 时返回 None；
+                 否则返回阻止合并的状态：AWAITING_MEDIA 需稍后重试，
+                 GENERATING/SENDING 时批次已被记下，当前回复结束后由 finish 通知
+        """
+        with self._lock:
+            chat = self._get(chat_id)
+            if chat['state'] in (GENERATING, SENDING):
+                chat['deferred'] = True
+                return chat['state']
+            if chat['media']:
+                self._set(chat_id, chat, AWAITING_MEDIA)
+                return AWAITING_MEDIA
+            self._set(chat_id, chat, GENERATING)
+            return None
+
+    def mark_sending(self, chat_id):
+        """
+        会话的回复开始发送
+
+        Args:
+            chat_id (str): 会话ID
+        """
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            if chat is not None and chat['state'] == GENERATING:
+                self._set(chat_id, chat, SENDING)
+
+    def finish(self, chat_id):
+        """
+        会话的本次回复结束
+
+        Args:
+            chat_id (str): 会话ID
+
+        Returns:
+            bool: 处理期间是否又有批次到期，为 True 时调用方应立即再次合并
+        """
+        with self._lock:
+            chat = self._get(chat_id)
+            deferred, chat['deferred'] = chat['deferred'], False
+            if chat['media']:
+                state = AWAITING_MEDIA
+            elif deferred:
+                state = COLLECTING
+            else:
+                state = IDLE
+            self._set(chat_id, chat, state)
+            return deferred
+
+    def snapshot(self):
+        """
+        获取所有非空闲会话的状态
+
+        Returns:
+            dict: {chat_id: 状态}
+        """
+        with self._lock:
+            return {chat_id: chat['state'] for chat_id, chat in self._chats.items()}
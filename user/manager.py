@@ -1,330 +1,482 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-"""
-用户管理器
-负责管理用户消息队列、超时检查和自动消息发送
-"""
-
-import logging
-import random
-import threading
-import time
-import os
-import re
-from datetime import datetime
-from typing import Dict, List, Any
-
-from database import Session, ChatMessage
-from config import (
-    AUTO_MESSAGE, MIN_COUNTDOWN_HOURS, MAX_COUNTDOWN_HOURS,
-    LISTEN_LIST, GROUP_LIST
-)
-from ai_clients.moonshot import can_send_messages, recognize_image_with_moonshot
-from utils.time_utils import is_quiet_time
-
-logger = logging.getLogger(__name__)
-
-
-def get_intention_key(message, root_dir):
-    """
-    调用意图识别专家，根据消息内容返回意图关键词
-    使用 prompt/Constellation.md 文件作为提示词来识别星座相关消息
-    当前的意图识别专家输出 "Constellation" 或 "None"
-
-    Args:
-        message (str): 用户消息内容
-        root_dir (str): 项目根目录路径
-
-    Returns:
-        str: 意图关键词
-    """
-    prompt_file = os.path.join(root_dir, 'prompt', 'Constellation.md')
-    try:
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            prompt_content = f.read()
-        logger.info("成功加载意图识别专家的定位文件")
-    except Exception as e:
-        logger.error(f"加载意图识别专家定位文件失败: {str(e)}")
-        prompt_content = ""
-
-    # 简单的星座关键词识别逻辑 (实际应该使用NLP模型)
-    constellation_keywords = [
-        "星座", "白羊", "金牛", "双子", "巨蟹", "狮子", "处女", 
-        "天秤", "天蝎", "射手", "摩羯", "水瓶", "双鱼", 
-        "运势", "星盘", "水逆", "太阳星座", "上升星座", "星座配对", "占星"
-    ]
-    
-    for keyword in constellation_keywords:
-        if keyword in message:
-            return "Constellation"
-    return "None"
-
-class UserManager:
-    """用户管理器"""
-
-    def __init__(self, sender):
-        """
-        初始化用户管理器
-
-        Args:
-            sender: 微信消息发送器
-        """
-        self.sender = sender
-        self.root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-        # 用户消息队列
-        self.user_queues = {}  # {user_id: {'messages': [], 'last_message_time': 时间戳, ...}}
-        self.queue_lock = threading.Lock()
-
-        # 用户定时器
-        self.user_timers = {}  # {user_id: 上次活跃时间}
-        self.user_wait_times = {}  # {user_id: 随机等待时间}
-
-        # 表情包定时器
-        self.emoji_timer = None
-        self.emoji_timer_lock = threading.Lock()
-
-        # 消息发送状态控制
-        self.is_sending_message = False
-
-        # 监听用户列表
-        self.listen_list = LISTEN_LIST + GROUP_LIST
-
-        logger.info("用户管理器初始化完成")
-
-    def on_user_message(self, user):
-        """
-        处理用户新消息，重置用户定时器
-
-        Args:
-            user (str): 用户ID
-        """
-        if user not in self.listen_list:
-            self.listen_list.append(user)
-            logger.info(f"添加新用户到监听列表: {user}")
-        self.reset_user_timer(user)
-
-    def reset_user_timer(self, user):
-        """
-        重置用户的定时器和等待时间
-
-        Args:
-            user (str): 用户ID
-        """
-        self.user_timers[user] = time.time()
-        self.user_wait_times[user] = self.get_random_wait_time()
-        logger.debug(f"重置用户 {user} 的定时器，等待时间: {self.user_wait_times[user]/3600:.2f}小时")
-
-    def get_random_wait_time(self):
-        """
-        获取随机等待时间
-
-        Returns:
-            float: 随机等待时间（秒）
-        """
-        return random.uniform(MIN_COUNTDOWN_HOURS, MAX_COUNTDOWN_HOURS) * 3600
-
-    def check_user_timeouts(self):
-        """
-        检查用户超时，发送自动消息
-        持续运行的后台线程
-        """
-        while True:
-            current_time = time.time()
-            for user in self.listen_list:
-                last_active = self.user_timers.get(user)
-                wait_time = self.user_wait_times.get(user)
-                if last_active and wait_time:
-                    if current_time - last_active >= wait_time:
-                        if not is_quiet_time():
-                            logger.info(f"用户 {user} 超时，发送自动消息")
-                            # 在使用时导入get_ai_response，避免循环导入
-                            from ai_clients.router import get_ai_response
-                            reply = get_ai_response(AUTO_MESSAGE, user, "None")
-                            self.sender.send_reply(user, user, user, AUTO_MESSAGE, reply)
-                        # 重置计时器和等待时间
-                        self.reset_user_timer(user)
-            time.sleep(10)  # 每10秒检查一次
-
-    def check_inactive_users(self):
-        """
-        检查不活跃用户，处理消息队列
-        持续运行的后台线程
-        """
-        while True:
-            current_time = time.time()
-            inactive_users = []
-
-            with self.queue_lock:
-                for username, user_data in self.user_queues.items():
-                    last_time = user_data.get('last_message_time', 0)
-                    if (current_time - last_time > 7 and
-                        can_send_messages and
-                        not self.is_sending_message):
-                        inactive_users.append(username)
-
-            for username in inactive_users:
-                self.process_user_messages(username)
-
-            time.sleep(1)  # 每秒检查一次
-
-    def handle_message(self, msg):
-        """
-        处理微信消息
-
-        Args:
-            msg: 微信消息对象
-        """
-        try:
-            # 如果消息来自群聊，则 chat_target 为群聊名称，否则为发送者的昵称
-            sender_name = msg.sender  # 实际发送者的昵称
-            chat_target = getattr(msg, 'chat_who', sender_name)
-
-            # 获取消息内容
-            content = getattr(msg, 'content', None) or getattr(msg, 'text', None)
-            if not content:
-                logger.warning("无法获取消息内容")
-                return
-
-            # 添加时间戳
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            content = f"[{current_time}] {content}"
-            logger.info(f"处理消息 - {chat_target}: {content}")
-
-            # 重置用户定时器
-            self.on_user_message(chat_target)
-
-            # 添加到消息队列
-            with self.queue_lock:
-                if chat_target not in self.user_queues:
-                    self.user_queues[chat_target] = {
-                        'messages': [content],
-                        'sender_name': sender_name,
-                        'username': chat_target,
-                        'last_message_time': time.time()
-                    }
-                    logger.info(f"已为 {chat_target} 初始化消息队列")
-                else:
-                    if len(self.user_queues[chat_target]['messages']) >= 5:
-                        self.user_queues[chat_target]['messages'].pop(0)
-                    self.user_queues[chat_target]['messages'].append(content)
-                    self.user_queues[chat_target]['last_message_time'] = time.time()
-                    logger.info(f"{chat_target} 的消息已加入队列并更新最后消息时间")
-        except Exception as e:
-            logger.error(f"消息处理失败: {str(e)}")
-
-    def handle_emoji_message(self, msg):
-        """
-        处理表情包消息的备用方法
-        在无法直接识别表情包图片时使用
-
-        Args:
-            msg: 微信表情包消息对象
-        """
-        try:
-            # 获取消息发送者和目标
-            sender_name = msg.sender  # 实际发送者的昵称
-            chat_target = getattr(msg, 'chat_who', sender_name)
-            
-            # 重置用户定时器
-            self.on_user_message(chat_target)
-            
-            # 创建表情包回复内容
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            content = f"[{current_time}] 发送了一个表情包，但无法识别具体内容"
-            
-            # 添加到消息队列处理
-            with self.queue_lock:
-                if chat_target not in self.user_queues:
-                    self.user_queues[chat_target] = {
-                        'messages': [content],
-                        'sender_name': sender_name,
-                        'username': chat_target,
-                        'last_message_time': time.time()
-                    }
-                else:
-                    if len(self.user_queues[chat_target]['messages']) >= 5:
-                        self.user_queues[chat_target]['messages'].pop(0)
-                    self.user_queues[chat_target]['messages'].append(content)
-                    self.user_queues[chat_target]['last_message_time'] = time.time()
-            
-            logger.info(f"处理无法识别的表情包 ({chat_target})")
-        except Exception as e:
-            logger.error(f"处理表情包消息失败: {str(e)}")
-
-    def process_user_messages(self, user_id):
-        """
-        处理用户消息队列
-
-        Args:
-            user_id (str): 用户 ID
-        """
-        self.is_sending_message = True
-        try:
-            with self.queue_lock:
-                if user_id not in self.user_queues:
-                    self.is_sending_message = False
-                    return
-                user_data = self.user_queues.pop(user_id)
-                messages = user_data['messages']
-                sender_name = user_data['sender_name']
-                username = user_data['username']
-
-            # 合并消息
-            merged_message = ' '.join(messages)
-            logger.info(f"处理合并消息 ({sender_name}): {merged_message}")
-
-            # 判断是否为群聊：如果发送者昵称与聊天目标不同，则认为是群聊消息
-            if sender_name != username:
-                # 调用意图识别专家，获取意图关键词
-                intention_key = get_intention_key(merged_message, self.root_dir)
-            else:
-                intention_key = "None"
-
-            # 在函数内部导入get_ai_response，避免循环导入
-            from ai_clients.router import get_ai_response
-            # 获取 AI 响应，并传递意图关键词
-            reply = get_ai_response(merged_message, user_id, intention_key)
-
-            # 处理 DeepSeek R1 的思考输出（若存在）
-            if "</think>" in reply:
-                reply = reply.split("</think>", 1)[1].strip()
-                
-            # 移除回复中的时间戳
-            if "发送了图片：" in reply or "发送了表情包：" in reply:
-                # 使用正则表达式移除时间戳 [YYYY-MM-DD HH:MM:SS]
-                reply = re.sub(r'\[\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\] ', '', reply)
-                logger.info(f"已移除图片/表情包回复中的时间戳")
-
-            # 发送回复
-            self.sender.send_reply(user_id, sender_name, username, merged_message, reply)
-        except Exception as e:
-            logger.error(f"处理用户消息失败: {str(e)}")
-        finally:
-            self.is_sending_message = False
-
-    def save_message(self, sender_id, sender_name, message, reply):
-        """
-        保存消息到数据库
-
-        Args:
-            sender_id (str): 发送者ID
-            sender_name (str): 发送者名称
-            message (str): 发送的消息
-            reply (str): 机器人回复
-        """
-        try:
-            session = Session()
-            chat_message = ChatMessage(
-                sender_id=sender_id,
-                sender_name=sender_name,
-                message=message,
-                reply=reply
-            )
-            session.add(chat_message)
-            session.commit()
-            session.close()
-            logger.info(f"消息已保存到数据库: {sender_name}")
-        except Exception as e:
-            logger.error(f"保存消息失败: {str(e)}")
\ No newline at end of file
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+用户管理器
+负责管理用户消息队列、超时检查和自动消息发送
+"""
+
+import functools
+import logging
+import random
+import threading
+import time
+import os
+from datetime import datetime
+from typing import Dict, List, Any
+
+from utils.chat_context_manager import save_chat_record
+from config import (
+    AUTO_MESSAGE, MIN_COUNTDOWN_HOURS, MAX_COUNTDOWN_HOURS,
+    LISTEN_LIST, GROUP_LIST, MESSAGE_DEBOUNCE_SECONDS, MESSAGE_DEBOUNCE_OVERRIDES,
+    REPLY_WORKER_COUNT, STREAM_REPLIES
+)
+from utils.time_utils import is_quiet_time, strip_timestamps
+from utils.keyword_matcher import get_intention_key
+from utils.metrics import (
+    DEBOUNCE_HOLD_SECONDS, QUEUE_WAIT_SECONDS, INTENT_SECONDS,
+    QUEUED_MESSAGES, QUEUED_CHATS, ACTIVE_CHATS
+)
+from user.scheduler import DebounceScheduler
+from user.workers import ConversationWorkerPool
+from user.chat_state import ChatStateTracker, AWAITING_MEDIA, COLLECTING, GENERATING, SENDING
+
+logger = logging.getLogger(__name__)
+
+# 会话到期但仍有图片在识别时，重新等待的秒数
+FLUSH_RETRY_SECONDS = 1
+
+
+def strip_think_stream(deltas):
+    """
+    过滤推理模型（如 DeepSeek R1）流式输出开头的思考过程 <think>...</think>
+
+    Args:
+        deltas (Iterator[str]): 回复文本增量
+
+    Yields:
+        str: 去除思考过程后的文本增量
+    """
+    buffer = ""
+    passthrough = False
+    for delta in deltas:
+        if passthrough:
+            yield delta
+            continue
+        buffer += delta
+        if "</think>" in buffer:
+            passthrough = True
+            rest = buffer.split("</think>", 1)[1].lstrip()
+            if rest:
+                yield rest
+            continue
+        head = buffer.lstrip()
+        if not head.startswith("<think>") and not "<think>".startswith(head):
+            passthrough = True
+            yield buffer
+    # 思考过程没有闭合时与非流式处理一致，保留全部内容
+    if not passthrough and buffer:
+        yield buffer
+
+class UserManager:
+    """用户管理器"""
+
+    def __init__(self, sender):
+        """
+        初始化用户管理器
+
+        Args:
+            sender: 微信消息发送器
+        """
+        self.sender = sender
+        self.root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        # 用户消息队列
+        self.user_queues = {}  # {user_id: {'messages': [], 'last_message_time': 时间戳, ...}}
+        self.queue_lock = threading.Lock()
+
+        # 消息合并调度器，每个会话入队时设置一次到期时间
+        self.debounce_scheduler = DebounceScheduler()
+
+        # 会话状态机，合并时只查看到期会话自己的状态
+        self.chat_states = ChatStateTracker()
+
+        # 用户定时器
+        self.user_timers = {}  # {user_id: 上次活跃时间}
+        self.user_wait_times = {}  # {user_id: 随机等待时间}
+
+        # 表情包定时器
+        self.emoji_timer = None
+        self.emoji_timer_lock = threading.Lock()
+
+        # 会话回复工作池，不同会话并行生成回复
+        self.worker_pool = ConversationWorkerPool(REPLY_WORKER_COUNT)
+
+        # 监听用户列表
+        self.listen_list = LISTEN_LIST + GROUP_LIST
+
+        self.register_metrics()
+
+        logger.info("用户管理器初始化完成")
+
+    def register_metrics(self):
+        """注册消息队列和会话状态的指标，抓取指标时才计算"""
+        QUEUED_CHATS.set_function(lambda: len(self.user_queues))
+        QUEUED_MESSAGES.set_function(
+            lambda: sum(len(data['messages']) for data in list(self.user_queues.values()))
+        )
+        for state in (COLLECTING, AWAITING_MEDIA, GENERATING, SENDING):
+            ACTIVE_CHATS.set_function(
+                lambda state=state: sum(1 for s in self.chat_states.snapshot().values() if s == state),
+                state=state
+            )
+
+    def on_user_message(self, user):
+        """
+        处理用户新消息，重置用户定时器
+
+        Args:
+            user (str): 用户ID
+        """
+        if user not in self.listen_list:
+            self.listen_list.append(user)
+            logger.info(f"添加新用户到监听列表: {user}")
+        self.reset_user_timer(user)
+
+    def reset_user_timer(self, user):
+        """
+        重置用户的定时器和等待时间
+
+        Args:
+            user (str): 用户ID
+        """
+        self.user_timers[user] = time.time()
+        self.user_wait_times[user] = self.get_random_wait_time()
+        logger.debug(f"重置用户 {user} 的定时器，等待时间: {self.user_wait_times[user]/3600:.2f}小时")
+
+    def get_random_wait_time(self):
+        """
+        获取随机等待时间
+
+        Returns:
+            float: 随机等待时间（秒）
+        """
+        return random.uniform(MIN_COUNTDOWN_HOURS, MAX_COUNTDOWN_HOURS) * 3600
+
+    def check_user_timeouts(self):
+        """
+        检查用户超时，发送自动消息
+        持续运行的后台线程
+        """
+        while True:
+            current_time = time.time()
+            for user in self.listen_list:
+                last_active = self.user_timers.get(user)
+                wait_time = self.user_wait_times.get(user)
+                if last_active and wait_time:
+                    if current_time - last_active >= wait_time:
+                        if not is_quiet_time():
+                            logger.info(f"用户 {user} 超时，发送自动消息")
+                            # 在使用时导入get_ai_response，避免循环导入
+                            from ai_clients.router import get_ai_response
+                            reply = get_ai_response(AUTO_MESSAGE, user, "None")
+                            self.sender.send_reply(user, user, user, AUTO_MESSAGE, reply)
+                        # 重置计时器和等待时间
+                        self.reset_user_timer(user)
+            time.sleep(10)  # 每10秒检查一次
+
+    def get_debounce_window(self, chat_id):
+        """
+        获取会话的静默合并时间
+
+        Args:
+            chat_id (str): 会话ID
+
+        Returns:
+            float: 用户停止发言多少秒后处理消息
+        """
+        return MESSAGE_DEBOUNCE_OVERRIDES.get(chat_id, MESSAGE_DEBOUNCE_SECONDS)
+
+    def hold_media(self, chat_id):
+        """
+        会话有图片开始识别，暂缓该会话的消息合并
+
+        Args:
+            chat_id (str): 会话ID
+        """
+        self.chat_states.hold_media(chat_id)
+
+    def release_media(self, chat_id):
+        """
+        会话的一张图片识别完成（结果已写入队列）
+
+        Args:
+            chat_id (str): 会话ID
+        """
+        self.chat_states.release_media(chat_id)
+
+    def check_inactive_users(self):
+        """
+        处理静默期已结束的会话消息队列
+        持续运行的后台线程，由合并调度器唤醒，到期的会话交给回复工作池处理
+        """
+        while True:
+            for username in self.debounce_scheduler.wait_due():
+                blocked = self.chat_states.begin_flush(username)
+                if blocked == AWAITING_MEDIA:
+                    # 该会话还有图片在识别，稍后再合并
+                    self.debounce_scheduler.arm(username, FLUSH_RETRY_SECONDS)
+                    continue
+                if blocked:
+                    # 该会话正在生成或发送回复，结束后再处理新批次
+                    continue
+                self.worker_pool.submit(username, self.process_user_messages, username)
+
+    def handle_message(self, msg):
+        """
+        处理微信消息
+
+        Args:
+            msg: 微信消息对象
+
+        Returns:
+            str: 消息所属的聊天对象，处理失败时返回 None
+        """
+        try:
+            # 如果消息来自群聊，则 chat_target 为群聊名称，否则为发送者的昵称
+            sender_name = msg.sender  # 实际发送者的昵称
+            chat_target = getattr(msg, 'chat_who', sender_name)
+
+            # 获取消息内容
+            content = getattr(msg, 'content', None) or getattr(msg, 'text', None)
+            if not content:
+                logger.warning("无法获取消息内容")
+                return None
+
+            # 添加时间戳
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            content = f"[{current_time}] {content}"
+            logger.info(f"处理消息 - {chat_target}: {content}")
+
+            # 重置用户定时器
+            self.on_user_message(chat_target)
+
+            # 添加到消息队列
+            with self.queue_lock:
+                if chat_target not in self.user_queues:
+                    self.user_queues[chat_target] = {
+                        'messages': [content],
+                        'sender_name': sender_name,
+                        'username': chat_target,
+                        'last_message_time': time.time(),
+                        'first_message_at': time.monotonic()
+                    }
+                    logger.info(f"已为 {chat_target} 初始化消息队列")
+                else:
+                    if len(self.user_queues[chat_target]['messages']) >= 5:
+                        self.user_queues[chat_target]['messages'].pop(0)
+                    self.user_queues[chat_target]['messages'].append(content)
+                    self.user_queues[chat_target]['last_message_time'] = time.time()
+                    logger.info(f"{chat_target} 的消息已加入队列并更新最后消息时间")
+            self.chat_states.on_message(chat_target)
+            self.debounce_scheduler.arm(chat_target, self.get_debounce_window(chat_target))
+            return chat_target
+        except Exception as e:
+            logger.error(f"消息处理失败: {str(e)}")
+            return None
+
+    def handle_emoji_message(self, msg):
+        """
+        处理表情包消息的备用方法
+        在无法直接识别表情包图片时使用
+
+        Args:
+            msg: 微信表情包消息对象
+
+        Returns:
+            str: 消息所属的聊天对象，处理失败时返回 None
+        """
+        try:
+            # 获取消息发送者和目标
+            sender_name = msg.sender  # 实际发送者的昵称
+            chat_target = getattr(msg, 'chat_who', sender_name)
+            
+            # 重置用户定时器
+            self.on_user_message(chat_target)
+            
+            # 创建表情包回复内容
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            content = f"[{current_time}] 发送了一个表情包，但无法识别具体内容"
+            
+            # 添加到消息队列处理
+            with self.queue_lock:
+                if chat_target not in self.user_queues:
+                    self.user_queues[chat_target] = {
+                        'messages': [content],
+                        'sender_name': sender_name,
+                        'username': chat_target,
+                        'last_message_time': time.time(),
+                        'first_message_at': time.monotonic()
+                    }
+                else:
+                    if len(self.user_queues[chat_target]['messages']) >= 5:
+                        self.user_queues[chat_target]['messages'].pop(0)
+                    self.user_queues[chat_target]['messages'].append(content)
+                    self.user_queues[chat_target]['last_message_time'] = time.time()
+            self.chat_states.on_message(chat_target)
+            self.debounce_scheduler.arm(chat_target, self.get_debounce_window(chat_target))
+            
+            logger.info(f"处理无法识别的表情包 ({chat_target})")
+            return chat_target
+        except Exception as e:
+            logger.error(f"处理表情包消息失败: {str(e)}")
+            return None
+
+    def process_user_messages(self, user_id):
+        """
+        处理用户消息队列
+
+        Args:
+            user_id (str): 用户 ID
+        """
+        done = None
+        try:
+            user_data = self.pop_user_batch(user_id)
+            if not user_data:
+                return
+            done = self.reply_to_batch(user_data)
+        except Exception as e:
+            logger.error(f"处理用户消息失败: {str(e)}")
+        finally:
+            # 回复交给发送调度器后工作线程即可处理其它会话；
+            # 会话保持 SENDING 直到回复全部发出，发送期间到期的新批次等待当前回复
+            if done is None:
+                self.finish_batch(user_id)
+            else:
+                done.add_done_callback(functools.partial(self.finish_batch, user_id))
+
+    def finish_batch(self, user_id):
+        """
+        会话的本次回复结束，处理期间又到期的批次立即合并
+
+        Args:
+            user_id (str): 用户 ID
+        """
+        if self.chat_states.finish(user_id):
+            self.debounce_scheduler.arm(user_id, 0)
+
+    def reply_to_batch(self, user_data):
+        """
+        为消息批次生成并发送回复
+        开启流式回复且路由支持时，模型输出的每一段完整后立即发送
+
+        Args:
+            user_data (dict): pop_user_batch 取出的消息批次
+
+        Returns:
+            SendDone: 回复全部发送后置位，没有内容需要发送时为 None
+        """
+        sender_name = user_data['sender_name']
+        username = user_data['username']
+        merged_message, intention_key = self.merge_batch(user_data)
+
+        if STREAM_REPLIES:
+            # 在函数内部导入，避免循环导入
+            from ai_clients.router import stream_ai_response
+            deltas = stream_ai_response(merged_message, username, intention_key)
+            if deltas is not None:
+                self.chat_states.mark_sending(username)
+                return self.sender.send_stream(username, sender_name, username, merged_message, strip_think_stream(deltas))
+
+        reply = self.get_reply(merged_message, username, intention_key)
+        self.chat_states.mark_sending(username)
+        return self.sender.send_reply(username, sender_name, username, merged_message, reply)
+
+    def pop_user_batch(self, user_id):
+        """
+        取出用户当前积攒的消息批次
+
+        Args:
+            user_id (str): 用户 ID
+
+        Returns:
+            dict: 消息批次（messages、sender_name、username），队列为空时返回 None
+        """
+        with self.queue_lock:
+            user_data = self.user_queues.pop(user_id, None)
+        # 会话进入 GENERATING 的时间即开始合并的时间：之前是静默等待，之后是排队等待工作者
+        flushed_at = self.chat_states.since(user_id)
+        if user_data and flushed_at is not None:
+            DEBOUNCE_HOLD_SECONDS.observe(max(0.0, flushed_at - user_data['first_message_at']))
+            QUEUE_WAIT_SECONDS.observe(max(0.0, time.monotonic() - flushed_at))
+        return user_data
+
+    def generate_reply(self, user_data):
+        """
+        合并消息批次并调用 AI 生成回复
+
+        Args:
+            user_data (dict): pop_user_batch 取出的消息批次
+
+        Returns:
+            tuple: (合并后的消息, 回复内容)
+        """
+        merged_message, intention_key = self.merge_batch(user_data)
+        return merged_message, self.get_reply(merged_message, user_data['username'], intention_key)
+
+    def merge_batch(self, user_data):
+        """
+        合并消息批次，群聊消息同时进行意图识别
+
+        Args:
+            user_data (dict): pop_user_batch 取出的消息批次
+
+        Returns:
+            tuple: (合并后的消息, 意图关键词)
+        """
+        sender_name = user_data['sender_name']
+        username = user_data['username']
+
+        # 合并消息
+        merged_message = ' '.join(user_data['messages'])
+        logger.info(f"处理合并消息 ({sender_name}): {merged_message}")
+
+        # 判断是否为群聊：如果发送者昵称与聊天目标不同，则认为是群聊消息
+        if sender_name != username:
+            # 调用意图识别专家，获取意图关键词
+            with INTENT_SECONDS.time():
+                intention_key = get_intention_key(merged_message)
+        else:
+            intention_key = "None"
+        return merged_message, intention_key
+
+    def get_reply(self, merged_message, username, intention_key):
+        """
+        调用 AI 获取回复并做后处理
+
+        Args:
+            merged_message (str): 合并后的消息
+            username (str): 会话ID
+            intention_key (str): 意图关键词
+
+        Returns:
+            str: 回复内容
+        """
+        # 在函数内部导入get_ai_response，避免循环导入
+        from ai_clients.router import get_ai_response
+        # 获取 AI 响应，并传递意图关键词
+        reply = get_ai_response(merged_message, username, intention_key)
+
+        # 处理 DeepSeek R1 的思考输出（若存在）
+        if "</think>" in reply:
+            reply = reply.split("</think>", 1)[1].strip()
+
+        # 移除回复中的时间戳
+        if "发送了图片：" in reply or "发送了表情包：" in reply:
+            # 使用正则表达式移除时间戳 [YYYY-MM-DD HH:MM:SS]
+            reply = strip_timestamps(reply)
+            logger.info(f"已移除图片/表情包回复中的时间戳")
+
+        return reply
+
+    def save_message(self, sender_id, sender_name, message, reply):
+        """
+        保存消息到数据库
+
+        Args:
+            sender_id (str): 发送者ID
+            sender_name (str): 发送者名称
+            message (str): 发送的消息
+            reply (str): 机器人回复
+        """
+        save_chat_record(sender_id, sender_name, message, reply)
\ No newline at end of file
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+消息合并调度器
+为每个会话维护一个到期时间，只唤醒已到期的会话
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DebounceScheduler:
+    """
+    基于最小堆的合并定时器
+
+    每次 arm 都会向堆中压入新的到期时间，旧的条目不立即删除，
+    出堆时与 _deadlines 中记录的最新到期时间比对后丢弃（惰性删除）。
+    """
+
+    def __init__(self):
+        """初始化调度器"""
+        self._heap = []  # [(到期时间, 序号, 会话ID)]
+        self._deadlines = {}  # {会话ID: 最新到期时间}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def arm(self, chat_id, delay):
+        """
+        设置（或推迟）会话的到期时间
+
+        Args:
+            chat_id (str): 会话ID
+            delay (float): 距离到期的秒数
+        """
+        deadline = time.monotonic() + delay
+        with self._cond:
+            self._deadlines[chat_id] = deadline
+            heapq.heappush(self._heap, (deadline, next(self._counter), chat_id))
+            # 过期条目过多时重建堆，避免频繁发言的会话让堆无限增长
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._heap = [
+                    (d, next(self._counter), c) for c, d in self._deadlines.items()
+                ]
+                heapq.heapify(self._heap)
+            if self._heap[0][2] == chat_id:
+                self._cond.notify()
+
+    def cancel(self, chat_id):
+        """
+        取消会话的到期时间
+
+        Args:
+            chat_id (str): 会话ID
+        """
+        with self._cond:
+            self._deadlines.pop(chat_id, None)
+
+    def pending(self):
+        """
+        获取等待到期的会话数量
+
+        Returns:
+            int: 会话数量
+        """
+        with self._cond:
+            return len(self._deadlines)
+
+    def wait_due(self, timeout=None):
+        """
+        阻塞直到有会话到期，返回所有已到期的会话
+
+        Args:
+            timeout (float, optional): 最长等待秒数，超时返回空列表
+
+        Returns:
+            list: 已到期的会话ID列表
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, _, chat_id = heapq.heappop(self._heap)
+                    if self._deadlines.get(chat_id) == deadline:
+                        del self._deadlines[chat_id]
+                        due.append(chat_id)
+                if due:
+                    return due
+
+                wait = self._heap[0][0] - now if self._heap else None
+                if end is not None:
+                    remaining = end - now
+                    if remaining <= 0:
+                        return []
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
@@ -1,100 +1,497 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-"""
-用户服务模块
-处理与数据库相关的用户操作，如签到、金币查询等
-"""
-
-import logging
-from datetime import datetime, timezone, timedelta
-from database import Session
-from models import GameUser
-
-logger = logging.getLogger(__name__)
-
-def query_coin_balance(user_id: str) -> str:
-    """
-    查询用户金币余额
-    
-    Args:
-        user_id (str): 用户ID
-        
-    Returns:
-        str: 格式化的余额信息
-    """
-    session = Session()
-    try:
-        user = session.query(GameUser).filter_by(id=user_id).first()
-        if not user:
-            return "您还没有账户，发送【签到】即可创建"
-
-        status = (
-            "今日已签到 ✅" if user.last_sign_in_date == datetime.now().date()
-            else "今日未签到 ❌"
-        )
-
-        return (
-            f"💰 金币余额：{user.coin_balance}\n"
-            f"📅 签到状态：{status}"
-        )
-    except Exception as e:
-        logger.error(f"查询金币余额失败: {str(e)}")
-        return "查询金币余额失败，请稍后再试"
-    finally:
-        session.close()
-
-def perform_sign_in(user_id: str) -> str:
-    """
-    用户签到功能
-    每天只能签到一次，签到成功后获得10个金币
-    
-    Args:
-        user_id (str): 用户ID
-        
-    Returns:
-        str: 签到结果消息
-    """
-    session = Session()
-    try:
-        # 获取中国时区时间（UTC+8）
-        tz = timezone(timedelta(hours=8))
-        today = datetime.now(tz).date()
-
-        # 查询用户记录
-        user = session.query(GameUser).filter_by(id=user_id).first()
-
-        # 用户不存在时初始化
-        if not user:
-            user = GameUser(
-                id=user_id,
-                name=user_id,
-                coin_balance=0,
-                last_sign_in_date=None
-            )
-            session.add(user)
-            session.commit()  # 确保生成用户记录
-
-        # 检查今日是否签到
-        if user.last_sign_in_date == today:
-            return f"今天已经签到过啦！当前金币余额：{user.coin_balance}"
-
-        # 执行签到
-        old_balance = user.coin_balance
-        user.coin_balance += 10
-        user.last_sign_in_date = today
-        session.commit()
-
-        return (
-            f"🎉 签到成功！\n"
-            f"• 签到前余额：{old_balance}\n"
-            f"• 获得奖励：+10\n"
-            f"• 当前余额：{user.coin_balance}"
-        )
-
-    except Exception as e:
-        session.rollback()
-        logger.error(f"签到异常 {user_id}: {str(e)}")
-        return "签到系统暂时故障，请稍后再试"
-    finally:
-        session.close() 
\ No newline at end of file
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+用户服务模块
+处理与数据库相关的用户操作，如签到、金币查询等
+
+金币的每次变动都是一条 INSERT ... ON CONFLICT DO UPDATE ... RETURNING 语句，
+不存在的账户自动创建，并发签到不会出现先读后写的竞争；语句返回的最新余额同步写入内存缓存，
+查询余额和重复签到在缓存命中时不访问数据库。
+每次变动在同一事务中追加一条金币流水（coin_transactions），game_users 中的余额随流水增量维护；
+排行榜按余额索引读取前 N 名并短时间缓存，任何余额变动都会清除缓存的排行榜。
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.sqlite import insert
+from database import Session
+from models import GameUser, CoinTransaction
+from config import SIGN_IN_REWARD, BALANCE_CACHE_MAX_USERS, LEADERBOARD_SIZE, LEADERBOARD_CACHE_SECONDS
+from utils.metrics import DB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 签到按中国时区（UTC+8）计算日期
+SIGN_IN_TZ = timezone(timedelta(hours=8))
+# 批量发放金币时每条语句最多包含的用户数（SQLite 单条语句的参数数量有上限）
+BULK_CHUNK_SIZE = 500
+
+# 金币流水的变动原因
+REASON_SIGN_IN = 'sign_in'  # 每日签到
+REASON_REWARD = 'reward'  # 发放或扣除
+
+
+class BalanceCache:
+    """
+    账户余额的内存缓存
+    写入语句返回的最新值直接覆盖缓存（write-through），按最近使用顺序（LRU）淘汰。
+    """
+
+    def __init__(self, max_users):
+        """
+        初始化缓存
+
+        Args:
+            max_users (int): 最多缓存的账户数量
+        """
+        self.max_users = max_users
+        self._accounts = OrderedDict()  # {user_id: (余额, 最后签到日期)}
+        # {user_id: 最后一次写入的序号}，用于识别加载期间发生的写入；
+        # 序号全局递增，版本被清理后重新写入也不会与清理前取得的版本相同
+        self._versions = OrderedDict()
+        self._seq = itertools.count(1)
+        self._listeners = []  # 每次写入或移除账户后调用的函数，参数为 user_id（清空时为 None）
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        读取缓存的账户
+
+        Args:
+            user_id (str): 用户ID
+
+        Returns:
+            tuple: (余额, 最后签到日期)，未缓存时返回 None
+        """
+        with self._lock:
+            account = self._accounts.get(user_id)
+            if account is not None:
+                self._accounts.move_to_end(user_id)
+            return account
+
+    def version(self, user_id):
+        """
+        获取账户的写入版本，在从数据库加载前调用
+
+        Args:
+            user_id (str): 用户ID
+
+        Returns:
+            int: 写入版本
+        """
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def load(self, user_id, account, version):
+        """
+        放入从数据库读取的账户；读取期间发生过写入时放弃
+
+        Args:
+            user_id (str): 用户ID
+            account (tuple): (余额, 最后签到日期)
+            version (int): 读取前通过 version() 取得的写入版本
+        """
+        with self._lock:
+            if self._versions.get(user_id, 0) == version:
+                self._put(user_id, account)
+
+    def add_listener(self, func):
+        """
+        注册余额变动后的回调，用于清除依赖余额的缓存
+
+        Args:
+            func (Callable[[str], None]): 回调函数，参数为 user_id，清空所有账户时为 None
+        """
+        self._listeners.append(func)
+
+    def update(self, user_id, account):
+        """
+        写入语句完成后更新缓存
+
+        Args:
+            user_id (str): 用户ID
+            account (tuple): 语句返回的 (余额, 最后签到日期)
+        """
+        with self._lock:
+            self._bump(user_id)
+            self._put(user_id, account)
+        self._notify(user_id)
+
+    def invalidate(self, user_id=None):
+        """
+        移除缓存的账户
+
+        Args:
+            user_id (str, optional): 用户ID，不指定时清空所有账户
+        """
+        with self._lock:
+            if user_id is None:
+                for key in list(self._accounts):
+                    self._bump(key)
+                self._accounts.clear()
+            else:
+                self._bump(user_id)
+                self._accounts.pop(user_id, None)
+            self._evict()
+        self._notify(user_id)
+
+    def _bump(self, user_id):
+        """记录一次写入（调用方需持有锁）"""
+        self._versions[user_id] = next(self._seq)
+        self._versions.move_to_end(user_id)
+
+    def _notify(self, user_id):
+        """调用余额变动的回调（不持有锁）"""
+        for func in self._listeners:
+            func(user_id)
+
+    def _put(self, user_id, account):
+        """放入账户并淘汰超出容量的账户（调用方需持有锁）"""
+        self._accounts[user_id] = account
+        self._accounts.move_to_end(user_id)
+        self._evict()
+
+    def _evict(self):
+        """淘汰超出容量的账户及其写入版本（调用方需持有锁）"""
+        while len(self._accounts) > self.max_users:
+            user_id, _ = self._accounts.popitem(last=False)
+            self._versions.pop(user_id, None)
+        # 未缓存账户的写入版本只在其加载期间有用，超出容量时清理最早写入的
+        while len(self._versions) > self.max_users * 2:
+            self._versions.popitem(last=False)
+
+
+# 全局余额缓存
+balance_cache = BalanceCache(BALANCE_CACHE_MAX_USERS)
+
+
+def _today():
+    """获取签到使用的当天日期"""
+    return datetime.now(SIGN_IN_TZ).date()
+
+
+def _upsert(rows, set_, where=None):
+    """
+    构造创建或更新账户的语句，返回受影响账户的最新状态
+
+    Args:
+        rows (list): 新账户的初始值
+        set_ (callable): 接收 excluded 伪表，返回账户已存在时要更新的列
+        where (optional): 账户已存在时执行更新的条件
+
+    Returns:
+        Insert: SQL 语句
+    """
+    stmt = insert(GameUser).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[GameUser.id],
+        set_=set_(stmt.excluded),
+        where=where
+    ).returning(GameUser.id, GameUser.coin_balance, GameUser.last_sign_in_date)
+
+
+def get_account(user_id: str):
+    """
+    获取账户的余额和最后签到日期，优先读取缓存
+
+    Args:
+        user_id (str): 用户ID
+
+    Returns:
+        tuple: (余额, 最后签到日期)，账户不存在时返回 None
+    """
+    account = balance_cache.get(user_id)
+    if account is not None:
+        return account
+
+    version = balance_cache.version(user_id)
+    session = Session()
+    try:
+        with DB_SECONDS.time(operation='get_account'):
+            row = session.execute(
+                select(GameUser.coin_balance, GameUser.last_sign_in_date).where(GameUser.id == user_id)
+            ).first()
+    finally:
+        session.close()
+    if row is None:
+        return None
+    account = (row.coin_balance or 0, row.last_sign_in_date)
+    balance_cache.load(user_id, account, version)
+    return account
+
+
+def _record_transactions(session, rows, amount, reason):
+    """
+    为语句返回的账户追加金币流水（与余额更新在同一事务中）
+
+    Args:
+        session: 数据库会话
+        rows (list): RETURNING 返回的行，含 id 和 coin_balance
+        amount (int): 每个账户的变动数量
+        reason (str): 变动原因
+    """
+    if rows:
+        now = datetime.now()
+        session.execute(insert(CoinTransaction), [
+            {'user_id': row.id, 'amount': amount, 'balance_after': row.coin_balance,
+             'reason': reason, 'created_at': now}
+            for row in rows
+        ])
+
+
+def add_coins(user_id: str, amount: int, reason: str = REASON_REWARD) -> int:
+    """
+    增减单个账户的金币，账户不存在时自动创建
+
+    Args:
+        user_id (str): 用户ID
+        amount (int): 变动数量，负数为扣除
+        reason (str): 记入流水的变动原因
+
+    Returns:
+        int: 变动后的余额
+    """
+    return reward_users([user_id], amount, reason)[user_id]
+
+
+def reward_users(user_ids, amount: int, reason: str = REASON_REWARD) -> dict:
+    """
+    批量增减金币（例如给群里的所有成员发放奖励），不存在的账户自动创建
+
+    Args:
+        user_ids (Iterable[str]): 用户ID
+        amount (int): 每个账户的变动数量，负数为扣除
+        reason (str): 记入流水的变动原因
+
+    Returns:
+        dict: {user_id: 变动后的余额}
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    balances = {}
+    session = Session()
+    try:
+        with DB_SECONDS.time(operation='reward_users'):
+            for start in range(0, len(user_ids), BULK_CHUNK_SIZE):
+                rows = [
+                    {'id': user_id, 'name': user_id, 'coin_balance': amount, 'last_sign_in_date': None}
+                    for user_id in user_ids[start:start + BULK_CHUNK_SIZE]
+                ]
+                stmt = _upsert(rows, lambda excluded: {
+                    'coin_balance': func.coalesce(GameUser.coin_balance, 0) + excluded.coin_balance
+                })
+                returned = session.execute(stmt).all()
+                _record_transactions(session, returned, amount, reason)
+                for row in returned:
+                    balances[row.id] = (row.coin_balance, row.last_sign_in_date)
+            session.commit()
+    except Exception:
+        session.rollback()
+        # 部分语句可能已执行但被回滚，缓存中的账户不再可信
+        for user_id in user_ids:
+            balance_cache.invalidate(user_id)
+        raise
+    finally:
+        session.close()
+
+    for user_id, account in balances.items():
+        balance_cache.update(user_id, account)
+    if len(user_ids) > 1:
+        logger.info(f"已为 {len(user_ids)} 个账户发放金币: {amount:+d}")
+    return {user_id: account[0] for user_id, account in balances.items()}
+
+
+def query_coin_balance(user_id: str) -> str:
+    """
+    查询用户金币余额
+
+    Args:
+        user_id (str): 用户ID
+
+    Returns:
+        str: 格式化的余额信息
+    """
+    try:
+        account = get_account(user_id)
+        if account is None:
+            return "您还没有账户，发送【签到】即可创建"
+
+        balance, last_sign_in_date = account
+        status = "今日已签到 ✅" if last_sign_in_date == _today() else "今日未签到 ❌"
+
+        return (
+            f"💰 金币余额：{balance}\n"
+            f"📅 签到状态：{status}"
+        )
+    except Exception as e:
+        logger.error(f"查询金币余额失败: {str(e)}")
+        return "查询金币余额失败，请稍后再试"
+
+def perform_sign_in(user_id: str) -> str:
+    """
+    用户签到功能
+    每天只能签到一次，签到成功后获得 SIGN_IN_REWARD 个金币
+
+    Args:
+        user_id (str): 用户ID
+
+    Returns:
+        str: 签到结果消息
+    """
+    today = _today()
+
+    # 缓存显示今天已签到时不访问数据库
+    account = balance_cache.get(user_id)
+    if account is not None and account[1] == today:
+        return f"今天已经签到过啦！当前金币余额：{account[0]}"
+
+    session = Session()
+    try:
+        # 一条语句完成创建账户、检查今日是否签到和发放奖励；今天已签到时不更新也不返回行
+        stmt = _upsert(
+            [{'id': user_id, 'name': user_id, 'coin_balance': SIGN_IN_REWARD, 'last_sign_in_date': today}],
+            lambda excluded: {
+                'coin_balance': func.coalesce(GameUser.coin_balance, 0) + excluded.coin_balance,
+                'last_sign_in_date': excluded.last_sign_in_date
+            },
+            where=or_(GameUser.last_sign_in_date.is_(None), GameUser.last_sign_in_date != today)
+        )
+        with DB_SECONDS.time(operation='sign_in'):
+            row = session.execute(stmt).first()
+            if row is not None:
+                _record_transactions(session, [row], SIGN_IN_REWARD, REASON_SIGN_IN)
+            session.commit()
+    except Exception as e:
+        session.rollback()
+        balance_cache.invalidate(user_id)
+        logger.error(f"签到异常 {user_id}: {str(e)}")
+        return "签到系统暂时故障，请稍后再试"
+    finally:
+        session.close()
+
+    if row is None:
+        balance_cache.invalidate(user_id)
+        account = get_account(user_id)
+        return f"今天已经签到过啦！当前金币余额：{account[0] if account else 0}"
+
+    balance_cache.update(user_id, (row.coin_balance, row.last_sign_in_date))
+    return (
+        f"🎉 签到成功！\n"
+        f"• 签到前余额：{row.coin_balance - SIGN_IN_REWARD}\n"
+        f"• 获得奖励：+{SIGN_IN_REWARD}\n"
+        f"• 当前余额：{row.coin_balance}"
+    )
+
+
+def get_transactions(user_id: str, limit: int = 10) -> list:
+    """
+    获取账户最近的金币流水
+
+    Args:
+        user_id (str): 用户ID
+        limit (int): 最多返回多少条
+
+    Returns:
+        list: [(时间, 变动数量, 变动后余额, 原因), ...]，按时间倒序
+    """
+    session = Session()
+    try:
+        rows = session.execute(
+            select(CoinTransaction.created_at, CoinTransaction.amount,
+                   CoinTransaction.balance_after, CoinTransaction.reason)
+            .where(CoinTransaction.user_id == user_id)
+            .order_by(CoinTransaction.created_at.desc(), CoinTransaction.id.desc())
+            .limit(limit)
+        ).all()
+        return [tuple(row) for row in rows]
+    finally:
+        session.close()
+
+
+class Leaderboard:
+    """金币排行榜，按余额索引读取前 N 名，结果缓存一小段时间"""
+
+    def __init__(self, size, ttl_seconds):
+        """
+        初始化
+
+        Args:
+            size (int): 排行榜人数
+            ttl_seconds (float): 结果缓存时间（秒）
+        """
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self._rows = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, user_id=None):
+        """
+        清除缓存的排行榜，余额变动后调用
+
+        Args:
+            user_id (str, optional): 余额变动的用户ID，排行榜不区分用户
+        """
+        with self._lock:
+            self._rows = None
+
+    def top(self):
+        """
+        获取余额最高的账户
+
+        Returns:
+            list: [(用户名, 余额), ...]，按余额倒序
+        """
+        with self._lock:
+            if self._rows is not None and time.monotonic() < self._expires_at:
+                return self._rows
+            session = Session()
+            try:
+                with DB_SECONDS.time(operation='leaderboard'):
+                    rows = session.execute(
+                        select(GameUser.id, GameUser.name, GameUser.coin_balance)
+                        .where(GameUser.coin_balance > 0)
+                        .order_by(GameUser.coin_balance.desc())
+                        .limit(self.size)
+                    ).all()
+            finally:
+                session.close()
+            self._rows = [(row.name or row.id, row.coin_balance) for row in rows]
+            self._expires_at = time.monotonic() + self.ttl_seconds
+            return self._rows
+
+
+# 全局金币排行榜
+leaderboard = Leaderboard(LEADERBOARD_SIZE, LEADERBOARD_CACHE_SECONDS)
+balance_cache.add_listener(leaderboard.invalidate)
+
+
+def query_leaderboard(user_id: str) -> str:
+    """
+    查询金币排行榜
+
+    Args:
+        user_id (str): 用户ID
+
+    Returns:
+        str: 格式化的排行榜
+    """
+    try:
+        rows = leaderboard.top()
+        if not rows:
+            return "还没有人拥有金币，发送【签到】领取第一笔吧"
+
+        lines = [f"🏆 金币排行榜 TOP {len(rows)}"]
+        lines.extend(f"{rank}. {name}：{balance}" for rank, (name, balance) in enumerate(rows, 1))
+        account = get_account(user_id)
+        if account is not None:
+            lines.append(f"你的余额：{account[0]}")
+        return "\n".join(lines)
+    except Exception as e:
+        logger.error(f"查询金币排行榜失败: {str(e)}")
+        return "查询金币排行榜失败，请稍后再试"
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+会话回复工作池
+不同会话的回复在线程池中并行生成，同一会话的任务严格按提交顺序执行
+"""
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationWorkerPool:
+    """按会话串行、跨会话并行的工作池"""
+
+    def __init__(self, worker_count):
+        """
+        初始化工作池
+
+        Args:
+            worker_count (int): 工作线程数量
+        """
+        self.worker_count = max(1, worker_count)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.worker_count, thread_name_prefix='reply-worker'
+        )
+        self._lock = threading.Lock()
+        # 正在处理的会话及其排队任务，会话在字典中即表示已有工作线程负责
+        self._pending = {}  # {chat_id: deque([(func, args), ...])}
+        logger.info(f"会话回复工作池初始化完成，工作线程数量: {self.worker_count}")
+
+    def submit(self, chat_id, func, *args):
+        """
+        提交会话任务；该会话已有任务在执行时排到其后面
+
+        Args:
+            chat_id (str): 会话ID
+            func (callable): 要执行的函数
+            *args: 函数参数
+        """
+        with self._lock:
+            if chat_id in self._pending:
+                self._pending[chat_id].append((func, args))
+                return
+            self._pending[chat_id] = deque()
+        self._executor.submit(self._run, chat_id, func, args)
+
+    def is_busy(self, chat_id):
+        """
+        判断会话是否有任务正在执行
+
+        Args:
+            chat_id (str): 会话ID
+
+        Returns:
+            bool: 是否正在执行
+        """
+        with self._lock:
+            return chat_id in self._pending
+
+    def active_count(self):
+        """
+        获取正在处理的会话数量
+
+        Returns:
+            int: 会话数量
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self, wait=True):
+        """
+        关闭工作池
+
+        Args:
+            wait (bool): 是否等待正在执行的任务完成
+        """
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, chat_id, func, args):
+        """在同一个工作线程中依次执行会话的全部排队任务"""
+        while True:
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error(f"会话 {chat_id} 任务执行失败: {str(e)}")
+
+            with self._lock:
+                queue = self._pending[chat_id]
+                if not queue:
+                    del self._pending[chat_id]
+                    return
+                func, args = queue.popleft()
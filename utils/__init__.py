@@ -1,13 +1,13 @@
-"""
-实用工具包
-"""
-
-from utils.time_utils import is_quiet_time, parse_time, setup_logging
-from utils.image_utils import capture_and_save_screenshot
-from utils.emoji_utils import is_emoji_request, get_random_emoji
-
-__all__ = [
-    'is_quiet_time', 'parse_time', 'setup_logging',
-    'capture_and_save_screenshot',
-    'is_emoji_request', 'get_random_emoji'
+"""
+实用工具包
+"""
+
+from utils.time_utils import is_quiet_time, parse_time, setup_logging
+from utils.image_utils import capture_and_save_screenshot
+from utils.emoji_utils import is_emoji_request, get_random_emoji
+
+__all__ = [
+    'is_quiet_time', 'parse_time', 'setup_logging',
+    'capture_and_save_screenshot',
+    'is_emoji_request', 'get_random_emoji'
 ] 
\ No newline at end of file
@@ -1,81 +1,263 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-"""
-聊天记录管理模块
-用于记录用户与机器人之间的对话，并提供查询最近对话的功能，
-以便在调用 AI 接口时构造上下文提示，保证回复语气、格式一致。
-
-格式示例：
-    用户：你好，今天怎么样？
-    机器人：我很好，谢谢你！
-    用户：那你觉得天气如何？
-    机器人：天气很晴朗……
-"""
-
-import logging
-from datetime import datetime
-from sqlalchemy import desc
-from database import Session, ChatMessage
-
-logger = logging.getLogger(__name__)
-
-def save_chat_record(user_id: str, sender_name: str, message: str, reply: str) -> None:
-    """
-    保存聊天记录到数据库
-
-    Args:
-        user_id (str): 用户ID
-        sender_name (str): 用户昵称（或发送者名称）
-        message (str): 用户消息
-        reply (str): 机器人回复
-    """
-    session = Session()
-    try:
-        chat_record = ChatMessage(
-            sender_id=user_id,
-            sender_name=sender_name,
-            message=message,
-            reply=reply,
-            created_at=datetime.now()
-        )
-        session.add(chat_record)
-        session.commit()
-        logger.info(f"聊天记录保存成功: {sender_name}")
-    except Exception as e:
-        logger.error(f"保存聊天记录失败: {e}")
-        session.rollback()
-    finally:
-        session.close()
-
-def get_recent_conversation(user_id: str, limit: int = 30) -> str:
-    """
-    查询指定用户的最近对话记录，并按照固定格式拼接为对话上下文文本
-
-    Args:
-        user_id (str): 用户ID
-        limit (int): 获取最近多少条记录，默认为30条
-
-    Returns:
-        str: 拼接好的对话上下文文本
-    """
-    session = Session()
-    try:
-        # 按创建时间倒序查询最新记录，再反转为正序排列
-        records = session.query(ChatMessage)\
-            .filter_by(sender_id=user_id)\
-            .order_by(desc(ChatMessage.created_at))\
-            .limit(limit)\
-            .all()
-        records.reverse()
-        conversation_lines = []
-        for record in records:
-            conversation_lines.append(f"用户：{record.message}")
-            conversation_lines.append(f"机器人：{record.reply}")
-        context = "\n".join(conversation_lines)
-        logger.info(f"查询到 {len(records)} 条聊天记录，构造上下文成功")
-        return context
-    except Exception as e:
-        logger.error(f"查询聊天记录失败: {e}")
-        return ""
-    finally:
-        session.close()
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+聊天记录管理模块
+用于记录用户与机器人之间的对话，并提供查询最近对话的功能，
+以便在调用 AI 接口时构造上下文提示，保证回复语气、格式一致。
+
+格式示例：
+    用户：你好，今天怎么样？
+    机器人：我很好，谢谢你！
+    用户：那你觉得天气如何？
+    机器人：天气很晴朗……
+"""
+
+import itertools
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from sqlalchemy import desc
+from database import Session, ChatMessage
+from config import (
+    CONTEXT_CACHE_MAX_USERS, CONTEXT_CACHE_TURNS,
+    CHAT_WRITE_BATCH_SIZE, CHAT_WRITE_FLUSH_SECONDS
+)
+from utils.record_writer import ChatRecordWriter
+from utils.metrics import DB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationCache:
+    """
+    最近对话的内存缓存
+    每个用户一个有界环形缓冲区保存最近的对话轮次，用户之间按最近使用顺序（LRU）淘汰。
+    只缓存从数据库完整加载过的用户，写入时同步追加（write-through）。
+    """
+
+    def __init__(self, max_users, max_turns):
+        """
+        初始化缓存
+
+        Args:
+            max_users (int): 最多缓存的用户数量
+            max_turns (int): 每个用户保留的对话轮次
+        """
+        self.max_users = max_users
+        self.max_turns = max_turns
+        self._users = OrderedDict()  # {user_id: deque([(message, reply), ...])}
+        # {user_id: 最后一次写入的序号}，用于识别加载期间发生的写入；
+        # 序号全局递增，记录被清理后重新写入也不会与清理前取得的版本相同
+        self._versions = OrderedDict()
+        self._seq = itertools.count(1)
+        self._listeners = []  # 每次追加后调用的函数，参数为 user_id
+        self._lock = threading.Lock()
+
+    def get(self, user_id, limit):
+        """
+        读取用户最近的对话轮次
+
+        Args:
+            user_id (str): 用户ID
+            limit (int): 最多返回多少轮
+
+        Returns:
+            list: [(message, reply), ...]，按时间正序；未缓存或超出缓存容量时返回 None
+        """
+        if limit > self.max_turns:
+            return None
+        with self._lock:
+            turns = self._users.get(user_id)
+            if turns is None:
+                return None
+            self._users.move_to_end(user_id)
+            return list(turns)[-limit:]
+
+    def version(self, user_id):
+        """
+        获取用户的写入版本，在从数据库加载前调用
+
+        Args:
+            user_id (str): 用户ID
+
+        Returns:
+            int: 写入版本
+        """
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def _evict(self):
+        """淘汰超出容量的用户及其写入版本（调用方需持有锁）"""
+        while len(self._users) > self.max_users:
+            user_id, _ = self._users.popitem(last=False)
+            self._versions.pop(user_id, None)
+        # 未缓存用户的写入版本只在其加载期间有用，超出容量时清理最早写入的
+        while len(self._versions) > self.max_users * 2:
+            self._versions.popitem(last=False)
+
+    def load(self, user_id, turns, version):
+        """
+        放入从数据库加载的对话轮次；加载期间发生过写入时放弃，等下次读取重新加载
+
+        Args:
+            user_id (str): 用户ID
+            turns (list): [(message, reply), ...]，按时间正序
+            version (int): 加载前通过 version() 取得的写入版本
+        """
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return
+            self._users[user_id] = deque(turns, maxlen=self.max_turns)
+            self._users.move_to_end(user_id)
+            self._evict()
+
+    def add_listener(self, func):
+        """
+        注册追加对话后的回调，用于统计各用户新增的轮次
+
+        Args:
+            func (Callable[[str], None]): 回调函数，参数为 user_id
+        """
+        self._listeners.append(func)
+
+    def append(self, user_id, message, reply):
+        """
+        追加一轮新对话，未缓存的用户只记录写入版本
+
+        Args:
+            user_id (str): 用户ID
+            message (str): 用户消息
+            reply (str): 机器人回复
+        """
+        with self._lock:
+            self._versions[user_id] = next(self._seq)
+            self._versions.move_to_end(user_id)
+            turns = self._users.get(user_id)
+            if turns is not None:
+                turns.append((message, reply))
+            else:
+                self._evict()
+        for func in self._listeners:
+            func(user_id)
+
+
+# 全局对话缓存
+conversation_cache = ConversationCache(CONTEXT_CACHE_MAX_USERS, CONTEXT_CACHE_TURNS)
+
+# 全局聊天记录写入器
+chat_record_writer = ChatRecordWriter(CHAT_WRITE_BATCH_SIZE, CHAT_WRITE_FLUSH_SECONDS)
+
+def save_chat_record(user_id: str, sender_name: str, message: str, reply: str) -> None:
+    """
+    保存聊天记录
+    记录立即写入内存缓存，数据库写入交给后台写入器批量提交
+
+    Args:
+        user_id (str): 用户ID
+        sender_name (str): 用户昵称（或发送者名称）
+        message (str): 用户消息
+        reply (str): 机器人回复
+    """
+    conversation_cache.append(user_id, message, reply)
+    chat_record_writer.submit({
+        'sender_id': user_id,
+        'sender_name': sender_name,
+        'message': message,
+        'reply': reply,
+        'created_at': datetime.now()
+    })
+    logger.info(f"聊天记录已提交保存: {sender_name}")
+
+def get_recent_conversation(user_id: str, limit: int = 30) -> str:
+    """
+    查询指定用户的最近对话记录，并按照固定格式拼接为对话上下文文本
+    优先读取内存缓存，只有缓存未命中时才查询数据库
+
+    Args:
+        user_id (str): 用户ID
+        limit (int): 获取最近多少条记录，默认为30条
+
+    Returns:
+        str: 拼接好的对话上下文文本
+    """
+    return format_turns(get_recent_turns(user_id, limit))
+
+def get_recent_turns(user_id: str, limit: int = 30) -> list:
+    """
+    查询指定用户最近的对话轮次
+    优先读取内存缓存，只有缓存未命中时才查询数据库
+
+    Args:
+        user_id (str): 用户ID
+        limit (int): 获取最近多少轮
+
+    Returns:
+        list: [(message, reply), ...]，按时间正序
+    """
+    turns = conversation_cache.get(user_id, limit)
+    if turns is None:
+        turns = _load_recent_turns(user_id, limit)
+    return turns
+
+def format_turn(message: str, reply: str) -> str:
+    """
+    把一轮对话格式化为上下文文本
+
+    Args:
+        message (str): 用户消息
+        reply (str): 机器人回复
+
+    Returns:
+        str: 格式化后的文本
+    """
+    return f"用户：{message}\n机器人：{reply}"
+
+def format_turns(turns: list) -> str:
+    """
+    把多轮对话拼接为上下文文本
+
+    Args:
+        turns (list): [(message, reply), ...]
+
+    Returns:
+        str: 拼接好的对话上下文文本
+    """
+    return "\n".join(format_turn(message, reply) for message, reply in turns)
+
+def _load_recent_turns(user_id: str, limit: int) -> list:
+    """
+    从数据库加载用户最近的对话轮次，并回填内存缓存
+
+    Args:
+        user_id (str): 用户ID
+        limit (int): 获取最近多少条记录
+
+    Returns:
+        list: [(message, reply), ...]，按时间正序
+    """
+    # 先取写入版本再写完队列中的记录：此后的任何写入都会改变版本，回填时发现不一致即放弃
+    version = conversation_cache.version(user_id)
+    chat_record_writer.flush()
+    session = Session()
+    try:
+        # 缓存容量以内的请求按缓存容量加载，后续读取都能直接命中
+        fetch = max(limit, conversation_cache.max_turns)
+        # 按创建时间倒序查询最新记录，再反转为正序排列
+        with DB_SECONDS.time(operation='load_context'):
+            records = session.query(ChatMessage.message, ChatMessage.reply)\
+                .filter_by(sender_id=user_id)\
+                .order_by(desc(ChatMessage.created_at))\
+                .limit(fetch)\
+                .all()
+        records.reverse()
+        turns = [(record.message, record.reply) for record in records]
+        if fetch == conversation_cache.max_turns:
+            conversation_cache.load(user_id, turns, version)
+        logger.info(f"查询到 {len(records)} 条聊天记录，构造上下文成功")
+        return turns[-limit:]
+    except Exception as e:
+        logger.error(f"查询聊天记录失败: {e}")
+        return []
+    finally:
+        session.close()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上下文构造器
+按模型的 token 预算构造系统提示：人设 Prompt 和对话摘要之后从最新一轮开始向前填充历史对话，
+超出预算的旧对话不再发送，单轮过长的消息或回复会被截断，并记录每次请求使用的 token 数
+"""
+
+import logging
+import re
+from config import (
+    CONTEXT_TOKEN_BUDGET, CONTEXT_TOKEN_BUDGETS, CONTEXT_TURN_MAX_TOKENS, CONTEXT_CACHE_TURNS
+)
+from utils.chat_context_manager import get_recent_turns, format_turn
+from utils.conversation_summary import conversation_summaries
+
+logger = logging.getLogger(__name__)
+
+# 中日韩文字、全角符号等按每个字符约 1 个 token 估算
+_WIDE_CHARS = re.compile(r'[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+# 其余字符（英文、数字、空白、半角符号）按约 4 个字符 1 个 token 估算
+_NARROW_CHARS_PER_TOKEN = 4
+# 截断后追加的标记
+TRUNCATED_MARK = "……"
+
+
+def estimate_tokens(text):
+    """
+    估算文本的 token 数量（不依赖具体模型的分词器，略偏保守）
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        int: 估算的 token 数量
+    """
+    if not text:
+        return 0
+    wide = len(_WIDE_CHARS.findall(text))
+    narrow = len(text) - wide
+    return wide + (narrow + _NARROW_CHARS_PER_TOKEN - 1) // _NARROW_CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    把文本截断到不超过给定的 token 数量，保留开头部分
+
+    Args:
+        text (str): 文本
+        max_tokens (int): 最多保留的 token 数量
+
+    Returns:
+        str: 截断后的文本，未超出时原样返回
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max(0, max_tokens - estimate_tokens(TRUNCATED_MARK)) * _NARROW_CHARS_PER_TOKEN
+    for index, char in enumerate(text):
+        budget -= _NARROW_CHARS_PER_TOKEN if _WIDE_CHARS.match(char) else 1
+        if budget < 0:
+            return text[:index] + TRUNCATED_MARK
+    return text
+
+
+def get_token_budget(model):
+    """
+    获取模型的上下文 token 预算
+
+    Args:
+        model (str): 模型名称
+
+    Returns:
+        int: token 预算
+    """
+    return CONTEXT_TOKEN_BUDGETS.get(model, CONTEXT_TOKEN_BUDGET)
+
+
+def build_context_messages(user_prompt, message, user_id, model):
+    """
+    构造请求的消息列表：系统提示（Prompt + 对话摘要 + 预算内的历史对话）与用户消息
+    已有摘要时只发送尚未合并进摘要的对话
+
+    Args:
+        user_prompt (str): 人设 Prompt
+        message (str): 用户消息
+        user_id (str): 用户ID
+        model (str): 模型名称，用于选择 token 预算
+
+    Returns:
+        list: 消息列表
+    """
+    budget = get_token_budget(model)
+    summary, pending = conversation_summaries.get(user_id) if conversation_summaries else (None, None)
+    if summary:
+        user_prompt = f"{user_prompt}\n\n对话摘要：\n{summary}"
+        limit = min(pending, CONTEXT_CACHE_TURNS)
+    else:
+        limit = CONTEXT_CACHE_TURNS
+    prompt_tokens = estimate_tokens(user_prompt)
+    message_tokens = estimate_tokens(message)
+    remaining = budget - prompt_tokens - message_tokens
+
+    # 从最新一轮开始向前填充，放不下时停止
+    history = []
+    history_tokens = 0
+    turns = get_recent_turns(user_id, limit=limit) if limit > 0 else []
+    for user_message, reply in reversed(turns):
+        text = format_turn(
+            truncate_to_tokens(user_message, CONTEXT_TURN_MAX_TOKENS),
+            truncate_to_tokens(reply, CONTEXT_TURN_MAX_TOKENS)
+        )
+        tokens = estimate_tokens(text) + 1
+        if tokens > remaining - history_tokens:
+            break
+        history.append(text)
+        history_tokens += tokens
+    history.reverse()
+
+    if history:
+        system_message = f"{user_prompt}\n\n历史对话记录：\n" + "\n".join(history)
+    else:
+        system_message = user_prompt
+
+    logger.info(
+        f"上下文 token 估算 ({user_id}, {model}): Prompt{'+摘要' if summary else ''} {prompt_tokens}，"
+        f"历史 {len(history)}/{len(turns)} 轮 {history_tokens}，消息 {message_tokens}，"
+        f"合计 {prompt_tokens + history_tokens + message_tokens}/{budget}"
+    )
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": message}
+    ]
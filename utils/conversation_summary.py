@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+对话滚动摘要
+保留窗口之外的旧对话积攒到一定数量后，由后台线程调用低成本模型合并进该用户的摘要。
+构造上下文时只发送摘要和尚未合并进摘要的最近对话，对话再长提示词长度也基本不变。
+"""
+
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from sqlalchemy import desc, func
+from database import Session, ChatMessage
+from models import ConversationSummary
+from config import (
+    SUMMARY_ENABLED, SUMMARY_KEEP_TURNS, SUMMARY_TRIGGER_TURNS, SUMMARY_MAX_BACKLOG_TURNS,
+    CONTEXT_CACHE_MAX_USERS
+)
+from utils.chat_context_manager import conversation_cache, chat_record_writer, format_turn
+
+logger = logging.getLogger(__name__)
+
+# 一次摘要请求最多合并的对话轮次，更早的积压分多次合并
+SUMMARY_BATCH_TURNS = 50
+# 合并进摘要时单条消息或回复保留的最大字符数
+SUMMARY_TURN_MAX_CHARS = 300
+
+
+class ConversationSummaries:
+    """用户对话摘要的内存索引和后台摘要线程"""
+
+    def __init__(self, keep_turns, trigger_turns, max_backlog_turns, max_users):
+        """
+        初始化
+
+        Args:
+            keep_turns (int): 最近多少轮对话保留原文
+            trigger_turns (int): 保留窗口之外积攒多少轮时触发摘要
+            max_backlog_turns (int): 一次最多合并保留窗口之外最新的多少轮，更早的直接跳过
+            max_users (int): 内存中最多保留多少个用户的摘要，按最近使用顺序（LRU）淘汰
+        """
+        self.keep_turns = keep_turns
+        self.trigger_turns = trigger_turns
+        self.max_backlog_turns = max_backlog_turns
+        self.max_users = max_users
+        # {user_id: {'summary': 摘要, 'until': 已摘要到的时间, 'pending': 未摘要的轮次}}
+        self._entries = OrderedDict()
+        self._loading = {}  # {user_id: 加载期间新增的轮次}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._thread = None
+        conversation_cache.add_listener(self._on_append)
+
+    def _on_append(self, user_id):
+        """新增一轮对话，计入该用户未摘要的轮次"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry['pending'] += 1
+            elif user_id in self._loading:
+                self._loading[user_id] += 1
+
+    def get(self, user_id):
+        """
+        获取用户的摘要和尚未合并进摘要的对话轮次，积压过多时安排后台摘要
+
+        Args:
+            user_id (str): 用户ID
+
+        Returns:
+            tuple: (摘要, 未摘要的轮次)，没有摘要时摘要为 None
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        if entry is None:
+            entry = self._load(user_id)
+        with self._lock:
+            pending = entry['pending']
+            summary = entry['summary']
+        if pending >= self.keep_turns + self.trigger_turns:
+            self._schedule(user_id)
+        return summary, pending
+
+    def _load(self, user_id):
+        """从数据库加载用户的摘要，并统计尚未摘要的轮次"""
+        with self._lock:
+            self._loading.setdefault(user_id, 0)
+        chat_record_writer.flush()
+        session = Session()
+        try:
+            record = session.get(ConversationSummary, user_id)
+            query = session.query(func.count(ChatMessage.id)).filter(ChatMessage.sender_id == user_id)
+            if record is not None:
+                query = query.filter(ChatMessage.created_at > record.summarized_until)
+            entry = {
+                'summary': record.summary if record else None,
+                'until': record.summarized_until if record else None,
+                'pending': query.scalar() or 0
+            }
+        except Exception as e:
+            logger.error(f"加载对话摘要失败: {str(e)}")
+            entry = {'summary': None, 'until': None, 'pending': 0}
+        finally:
+            session.close()
+        with self._lock:
+            # 加上加载期间新增、可能尚未写入数据库的轮次
+            entry['pending'] += self._loading.pop(user_id, 0)
+            entry = self._entries.setdefault(user_id, entry)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+            return entry
+
+    def _schedule(self, user_id):
+        """把用户加入后台摘要队列，已在队列中时忽略"""
+        with self._lock:
+            if user_id in self._queued:
+                return
+            self._queued.add(user_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='summarizer', daemon=True)
+                self._thread.start()
+        self._queue.put(user_id)
+
+    def _run(self):
+        """后台线程：依次为排队的用户生成摘要"""
+        while True:
+            user_id = self._queue.get()
+            try:
+                self._summarize(user_id)
+            except Exception as e:
+                logger.error(f"对话摘要失败 ({user_id}): {str(e)}")
+            finally:
+                with self._lock:
+                    self._queued.discard(user_id)
+
+    def _summarize(self, user_id):
+        """把保留窗口之外、尚未摘要的对话分批合并进摘要"""
+        # 在函数内部导入，避免循环导入
+        from ai_clients.deepseek import summarize_conversation
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is None:
+            # 排队期间被淘汰，重新加载
+            entry = self._load(user_id)
+        chat_record_writer.flush()
+        session = Session()
+        try:
+            query = session.query(ChatMessage.message, ChatMessage.reply, ChatMessage.created_at)\
+                .filter(ChatMessage.sender_id == user_id)
+            if entry['until'] is not None:
+                query = query.filter(ChatMessage.created_at > entry['until'])
+            total = query.count()
+            # 只取保留窗口和最新的积压，开启摘要前留下的大量历史记录不逐批调用模型
+            rows = query.order_by(desc(ChatMessage.created_at))\
+                .limit(self.keep_turns + self.max_backlog_turns)\
+                .all()
+            rows.reverse()
+            old = rows[:-self.keep_turns] if self.keep_turns else rows
+            if not old:
+                return
+            skipped = total - len(rows)
+            if skipped > 0:
+                logger.info(f"{user_id} 有 {skipped} 轮较早的对话超出摘要积压上限，跳过不合并")
+
+            record = session.get(ConversationSummary, user_id)
+            summary = record.summary if record else ""
+            for start in range(0, len(old), SUMMARY_BATCH_TURNS):
+                batch = old[start:start + SUMMARY_BATCH_TURNS]
+                conversation = "\n".join(
+                    format_turn((row.message or '')[:SUMMARY_TURN_MAX_CHARS], (row.reply or '')[:SUMMARY_TURN_MAX_CHARS])
+                    for row in batch
+                )
+                new_summary = summarize_conversation(summary, conversation)
+                if not new_summary:
+                    return
+
+                summary = new_summary
+                if record is None:
+                    record = ConversationSummary(user_id=user_id, summarized_turns=0)
+                    session.add(record)
+                record.summary = summary
+                record.summarized_until = batch[-1].created_at
+                record.summarized_turns = (record.summarized_turns or 0) + len(batch)
+                session.commit()
+
+                # 摘要时间推进到本批之后，跳过的更早对话随第一批一起视为已处理
+                with self._lock:
+                    entry['summary'] = summary
+                    entry['until'] = batch[-1].created_at
+                    entry['pending'] = max(0, entry['pending'] - len(batch) - max(0, skipped))
+                skipped = 0
+                logger.info(f"已将 {user_id} 的 {len(batch)} 轮对话合并进摘要，累计 {record.summarized_turns} 轮")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"保存对话摘要失败 ({user_id}): {str(e)}")
+        finally:
+            session.close()
+
+
+# 全局对话摘要，未启用时为 None
+conversation_summaries = ConversationSummaries(
+    SUMMARY_KEEP_TURNS, SUMMARY_TRIGGER_TURNS, SUMMARY_MAX_BACKLOG_TURNS, CONTEXT_CACHE_MAX_USERS
+) if SUMMARY_ENABLED else None
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+表情包目录索引
+启动时扫描一次表情包目录，记录文件信息和标签；之后只在目录或标签索引文件被修改时增量刷新。
+按标签随机选择表情包为 O(1)。
+
+标签来源：
+    1. 文件名：按 _ - 空格 逗号 分隔，纯数字部分忽略，例如 开心_哈哈_01.gif -> 开心、哈哈
+    2. 目录下的 index.json：{"文件名": ["标签", ...]}，与文件名中的标签合并
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from config import EMOJI_REFRESH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 支持的表情包扩展名
+EMOJI_EXTENSIONS = ('.gif', '.jpg', '.png', '.jpeg')
+# 标签索引文件名
+TAG_INDEX_FILE = 'index.json'
+# 文件名中的标签分隔符
+_TAG_SEPARATORS = re.compile(r'[_\-\s,，]+')
+
+
+def parse_file_tags(filename):
+    """
+    从文件名解析标签
+
+    Args:
+        filename (str): 文件名
+
+    Returns:
+        set: 标签集合
+    """
+    stem = os.path.splitext(filename)[0]
+    return {part for part in _TAG_SEPARATORS.split(stem) if part and not part.isdigit()}
+
+
+class _Bucket:
+    """支持 O(1) 增删和随机选择的路径集合"""
+
+    def __init__(self):
+        self.items = []
+        self.positions = {}  # {路径: 在 items 中的下标}
+
+    def add(self, path):
+        if path not in self.positions:
+            self.positions[path] = len(self.items)
+            self.items.append(path)
+
+    def remove(self, path):
+        index = self.positions.pop(path, None)
+        if index is None:
+            return
+        last = self.items.pop()
+        if index < len(self.items):
+            self.items[index] = last
+            self.positions[last] = index
+
+    def choice(self):
+        return random.choice(self.items) if self.items else None
+
+
+class EmojiCatalog:
+    """表情包目录索引"""
+
+    def __init__(self, emoji_dir, check_interval=EMOJI_REFRESH_SECONDS):
+        """
+        初始化并扫描表情包目录
+
+        Args:
+            emoji_dir (str): 表情包目录
+            check_interval (float): 两次检查目录是否变化的最小间隔（秒）
+        """
+        self.emoji_dir = emoji_dir
+        self.check_interval = check_interval
+        self._files = {}  # {文件名: (大小, 修改时间, 标签集合)}
+        self._all = _Bucket()
+        self._tags = {}  # {标签: _Bucket}
+        self._dir_mtime = None
+        self._index_mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self):
+        return len(self._files)
+
+    def tags(self):
+        """
+        获取所有标签
+
+        Returns:
+            list: 标签列表
+        """
+        with self._lock:
+            return list(self._tags)
+
+    def choose(self, tags=None):
+        """
+        随机选择一个表情包，优先从给定标签中选择
+
+        Args:
+            tags (Iterable[str], optional): 期望的标签，多个标签时随机选择其中一个有表情包的标签
+
+        Returns:
+            str: 表情包路径，目录中没有表情包时返回 None
+        """
+        self._maybe_refresh()
+        with self._lock:
+            if tags:
+                buckets = [self._tags[tag] for tag in tags if tag in self._tags]
+                if buckets:
+                    return random.choice(buckets).choice()
+            return self._all.choice()
+
+    def _maybe_refresh(self):
+        """检查间隔到期时刷新索引"""
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+
+    def refresh(self):
+        """目录或标签索引文件的修改时间变化时，增量更新索引"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                dir_mtime = os.stat(self.emoji_dir).st_mtime_ns
+            except OSError:
+                if self._dir_mtime is not None or self._files:
+                    logger.error(f"表情包目录不存在: {self.emoji_dir}")
+                self._dir_mtime = None
+                self._apply({}, {})
+                return
+            index_path = os.path.join(self.emoji_dir, TAG_INDEX_FILE)
+            try:
+                index_mtime = os.stat(index_path).st_mtime_ns
+            except OSError:
+                index_mtime = None
+            if dir_mtime == self._dir_mtime and index_mtime == self._index_mtime:
+                return
+
+            extra_tags = self._load_tag_index(index_path) if index_mtime is not None else {}
+            entries = {}
+            with os.scandir(self.emoji_dir) as scan:
+                for entry in scan:
+                    if entry.is_file() and entry.name.lower().endswith(EMOJI_EXTENSIONS):
+                        stat = entry.stat()
+                        entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+            self._apply(entries, extra_tags)
+            self._dir_mtime = dir_mtime
+            self._index_mtime = index_mtime
+
+    def _load_tag_index(self, index_path):
+        """读取标签索引文件"""
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {name: set(tags) for name, tags in data.items()}
+        except Exception as e:
+            logger.error(f"读取表情包标签索引失败: {str(e)}")
+            return {}
+
+    def _apply(self, entries, extra_tags):
+        """根据最新的文件列表增删索引项（调用方需持有锁）"""
+        added = removed = 0
+        for name in list(self._files):
+            if name not in entries:
+                self._remove(name)
+                removed += 1
+        for name, (size, mtime) in entries.items():
+            tags = parse_file_tags(name) | extra_tags.get(name, set())
+            old = self._files.get(name)
+            if old is not None and old == (size, mtime, tags):
+                continue
+            if old is not None:
+                self._remove(name)
+            else:
+                added += 1
+            path = os.path.join(self.emoji_dir, name)
+            self._files[name] = (size, mtime, tags)
+            self._all.add(path)
+            for tag in tags:
+                self._tags.setdefault(tag, _Bucket()).add(path)
+        if added or removed:
+            logger.info(f"表情包索引已更新: 新增 {added}，移除 {removed}，共 {len(self._files)} 个，标签 {len(self._tags)} 个")
+
+    def _remove(self, name):
+        """从索引中移除一个文件（调用方需持有锁）"""
+        _, _, tags = self._files.pop(name)
+        path = os.path.join(self.emoji_dir, name)
+        self._all.remove(path)
+        for tag in tags:
+            bucket = self._tags.get(tag)
+            if bucket is not None:
+                bucket.remove(path)
+                if not bucket.items:
+                    del self._tags[tag]
+
+
+_catalogs = {}  # {表情包目录: EmojiCatalog}
+_catalogs_lock = threading.Lock()
+
+
+def get_emoji_catalog(emoji_dir):
+    """
+    获取表情包目录的索引，首次调用时扫描目录
+
+    Args:
+        emoji_dir (str): 表情包目录
+
+    Returns:
+        EmojiCatalog: 表情包目录索引
+    """
+    catalog = _catalogs.get(emoji_dir)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(emoji_dir)
+            if catalog is None:
+                catalog = _catalogs[emoji_dir] = EmojiCatalog(emoji_dir)
+                logger.info(f"已建立表情包索引: {emoji_dir}，共 {len(catalog)} 个")
+    return catalog
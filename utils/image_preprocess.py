@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图片预处理
+上传给视觉模型之前限制分辨率并重新压缩，动图抽取几帧拼成一张静态图，
+减少上传数据量和识别耗时
+"""
+
+import base64
+import io
+import logging
+from PIL import Image, ImageSequence
+from config import VISION_MAX_SIDE, VISION_IMAGE_FORMAT, VISION_IMAGE_QUALITY, VISION_GIF_FRAMES
+
+logger = logging.getLogger(__name__)
+
+# 文件头与 MIME 类型的对应关系，无法处理图片时按原格式上传
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+_MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+
+
+def guess_mime_type(image_bytes):
+    """
+    根据文件头判断图片的 MIME 类型
+
+    Args:
+        image_bytes (bytes): 图片文件内容
+
+    Returns:
+        str: MIME 类型，无法识别时返回 image/jpeg
+    """
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mime in _SIGNATURES:
+        if image_bytes.startswith(signature):
+            return mime
+    return 'image/jpeg'
+
+
+def _sample_frames(image, count):
+    """从动图中均匀抽取最多 count 帧（包含第一帧和最后一帧）"""
+    total = getattr(image, 'n_frames', 1)
+    if total <= 1 or count <= 1:
+        return [image.copy()]
+    count = min(count, total)
+    wanted = {round(i * (total - 1) / (count - 1)) for i in range(count)}
+    return [frame.copy() for index, frame in enumerate(ImageSequence.Iterator(image)) if index in wanted]
+
+
+def _flatten(image):
+    """转换为 RGB，透明部分填充白色背景"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _tile(frames, max_side):
+    """把多帧按时间顺序横向拼接，整体不超过 max_side"""
+    cell = max(1, max_side // len(frames))
+    for frame in frames:
+        frame.thumbnail((cell, max_side))
+    width = sum(frame.width for frame in frames)
+    height = max(frame.height for frame in frames)
+    canvas = Image.new('RGB', (width, height), (255, 255, 255))
+    x = 0
+    for frame in frames:
+        canvas.paste(frame, (x, 0))
+        x += frame.width
+    return canvas
+
+
+def prepare_vision_image(image_bytes):
+    """
+    预处理待识别的图片：限制最长边、动图抽帧拼接、重新压缩
+
+    Args:
+        image_bytes (bytes): 原始图片文件内容
+
+    Returns:
+        tuple: (图片数据, MIME 类型, 拼接的帧数)，图片无法解码时返回原始数据
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            original_side = max(image.size)
+            # JPEG 解码时直接按目标尺寸缩小，避免大照片完整解码占用内存
+            if image.format == 'JPEG':
+                image.draft('RGB', (VISION_MAX_SIDE, VISION_MAX_SIDE))
+            frames = [_flatten(frame) for frame in _sample_frames(image, VISION_GIF_FRAMES)]
+    except Exception as e:
+        logger.warning(f"图片预处理失败，按原图上传: {str(e)}")
+        return image_bytes, guess_mime_type(image_bytes), 1
+
+    if len(frames) > 1:
+        result = _tile(frames, VISION_MAX_SIDE)
+    else:
+        result = frames[0]
+        result.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE))
+
+    output = io.BytesIO()
+    result.save(output, format=VISION_IMAGE_FORMAT, quality=VISION_IMAGE_QUALITY)
+    data = output.getvalue()
+
+    # 无需缩小的静态图重新压缩后可能反而更大，此时直接使用原图
+    if len(frames) == 1 and original_side <= VISION_MAX_SIDE and len(data) >= len(image_bytes):
+        return image_bytes, guess_mime_type(image_bytes), 1
+
+    logger.info(
+        f"图片预处理完成: {len(image_bytes)} -> {len(data)} 字节，"
+        f"尺寸 {result.width}x{result.height}，帧数 {len(frames)}"
+    )
+    return data, _MIME_TYPES.get(VISION_IMAGE_FORMAT, 'image/jpeg'), len(frames)
+
+
+def to_data_url(data, mime_type):
+    """
+    把图片数据编码为 data URL
+
+    Args:
+        data (bytes): 图片数据
+        mime_type (str): MIME 类型
+
+    Returns:
+        str: data URL
+    """
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+关键词匹配器
+把所有配置的关键词集合编译成一个 Aho-Corasick 自动机，
+一次扫描消息即可得到命中的全部类别，耗时与关键词数量无关
+"""
+
+import logging
+from collections import deque
+from config import (
+    BOT_NAME, COZE_TRIGGER_KEYWORDS, COZE_DATABASE_KEYWORDS,
+    CONSTELLATION_KEYWORDS, EMOJI_REQUEST_KEYWORDS, EMOTION_KEYWORDS, LEADERBOARD_KEYWORDS,
+    PROFILER_KEYWORDS
+)
+
+logger = logging.getLogger(__name__)
+
+# 关键词类别
+CONSTELLATION = 'constellation'  # 星座相关（意图识别）
+COZE_TRIGGER = 'coze_trigger'  # Coze 触发关键词
+COMMAND = 'command'  # 群聊中无需 @ 也会回复的指令（签到、金币余额、金币排行）
+SIGN_IN = 'sign_in'  # 签到
+COIN_BALANCE = 'coin_balance'  # 查询金币余额
+LEADERBOARD = 'leaderboard'  # 查询金币排行榜
+PROFILE = 'profile'  # 管理员开启性能分析
+MEDIA = 'media'  # 图片/表情包识别结果
+EMOJI_REQUEST = 'emoji_request'  # 直接请求表情包
+EMOTION = 'emotion'  # 情感表达
+AT_BOT = 'at_bot'  # @机器人
+
+
+class KeywordMatcher:
+    """
+    多模式关键词匹配器（Aho-Corasick 自动机）
+
+    关键词和文本都按小写匹配，中文不受影响。
+    """
+
+    def __init__(self, keyword_sets):
+        """
+        构建自动机
+
+        Args:
+            keyword_sets (dict): {类别: 关键词列表}
+        """
+        self._goto = [{}]  # 每个状态的转移表 {字符: 下一状态}
+        self._fail = [0]  # 每个状态的失败指针
+        self._output = [frozenset()]  # 每个状态命中的类别（已合并失败链上的类别）
+        self._hits = [frozenset()]  # 每个状态命中的 (类别, 关键词)（已合并失败链上的关键词）
+
+        outputs = [set()]
+        for category, keywords in keyword_sets.items():
+            for keyword in keywords:
+                if keyword:
+                    outputs[self._insert(keyword.lower(), outputs)].add((category, keyword))
+
+        # 按广度优先顺序计算失败指针，并把失败链上的关键词合并到当前状态
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                outputs[child] |= outputs[self._fail[child]]
+                queue.append(child)
+
+        self._hits = [frozenset(hits) for hits in outputs]
+        self._output = [frozenset(category for category, _ in hits) for hits in outputs]
+        logger.info(f"关键词自动机已构建: {len(keyword_sets)} 个类别，{len(self._goto)} 个状态")
+
+    def _insert(self, keyword, outputs):
+        """把关键词插入字典树，返回结束状态"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                outputs.append(set())
+                self._goto[state][char] = next_state
+            state = next_state
+        return state
+
+    def classify(self, text):
+        """
+        扫描一次文本，返回命中的全部类别
+
+        Args:
+            text (str): 需要分析的文本
+
+        Returns:
+            set: 命中的类别集合
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        categories = set()
+        for char in (text or "").lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                categories |= output[state]
+        return categories
+
+    def matches(self, text):
+        """
+        扫描一次文本，返回每个类别命中的关键词
+
+        Args:
+            text (str): 需要分析的文本
+
+        Returns:
+            dict: {类别: 命中的关键词集合}
+        """
+        goto, fail, hits = self._goto, self._fail, self._hits
+        state = 0
+        found = {}
+        for char in (text or "").lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for category, keyword in hits[state]:
+                found.setdefault(category, set()).add(keyword)
+        return found
+
+
+# 全局匹配器，启动时根据配置构建一次
+keyword_matcher = KeywordMatcher({
+    CONSTELLATION: CONSTELLATION_KEYWORDS,
+    COZE_TRIGGER: COZE_TRIGGER_KEYWORDS,
+    COMMAND: COZE_DATABASE_KEYWORDS + LEADERBOARD_KEYWORDS,
+    SIGN_IN: ['签到'],
+    COIN_BALANCE: ['金币余额'],
+    LEADERBOARD: LEADERBOARD_KEYWORDS,
+    PROFILE: PROFILER_KEYWORDS,
+    MEDIA: ['发送了图片：', '发送了表情包：'],
+    EMOJI_REQUEST: EMOJI_REQUEST_KEYWORDS,
+    EMOTION: EMOTION_KEYWORDS,
+    AT_BOT: [f'@{BOT_NAME}'],
+})
+
+
+def classify(text):
+    """
+    使用全局匹配器扫描文本
+
+    Args:
+        text (str): 需要分析的文本
+
+    Returns:
+        set: 命中的类别集合
+    """
+    return keyword_matcher.classify(text)
+
+
+def matches(text):
+    """
+    使用全局匹配器扫描文本，返回每个类别命中的关键词
+
+    Args:
+        text (str): 需要分析的文本
+
+    Returns:
+        dict: {类别: 命中的关键词集合}
+    """
+    return keyword_matcher.matches(text)
+
+
+def get_intention_key(text):
+    """
+    根据消息内容返回意图关键词
+    当前的意图识别按星座关键词识别，输出 "Constellation" 或 "None"
+
+    Args:
+        text (str): 消息内容
+
+    Returns:
+        str: 意图关键词
+    """
+    return "Constellation" if CONSTELLATION in classify(text) else "None"
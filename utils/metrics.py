@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+运行指标
+进程内的计数器、直方图和仪表盘，按 Prometheus 文本格式输出；
+开启 METRICS_ENABLED 后在本机启动 HTTP 服务，Prometheus 或 curl 访问 /metrics 即可读取。
+
+各处理阶段在这里统一定义指标，调用方只需导入并记录：
+
+    from utils.metrics import PROVIDER_SECONDS
+    with PROVIDER_SECONDS.time(provider='deepseek'):
+        ...
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 延迟类直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape_label_value(value):
+    """按 Prometheus 文本格式转义标签值中的反斜杠、双引号和换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    """把标签格式化为 {a="1",b="2"}，没有标签时返回空字符串"""
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    """格式化数值，整数不带小数点"""
+    if value == float('inf'):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    """指标基类：按标签值分组保存数据"""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        初始化
+
+        Args:
+            name (str): 指标名称
+            documentation (str): 说明
+            labelnames (tuple): 标签名称
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # {标签值元组: 数据}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """按标签名称的顺序取出标签值"""
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def collect(self):
+        """
+        输出 Prometheus 文本格式
+
+        Returns:
+            list: 文本行
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._sample_lines(key, value))
+        return lines
+
+    def _sample_lines(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """
+        计数增加
+
+        Args:
+            amount (float): 增加的数量
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的仪表盘，也可以在读取时调用函数取值"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}  # {标签值元组: 取值函数}
+
+    def set(self, value, **labels):
+        """
+        设置当前值
+
+        Args:
+            value (float): 当前值
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        """
+        当前值增加（amount 为负数时减少）
+
+        Args:
+            amount (float): 变化量
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_function(self, func, **labels):
+        """
+        读取指标时调用 func 取值，适合队列长度等可以直接计算的值
+
+        Args:
+            func (Callable[[], float]): 取值函数
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = func
+
+    def collect(self):
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, func in functions:
+            try:
+                value = func()
+            except Exception as e:
+                logger.error(f"读取指标 {self.name} 失败: {str(e)}")
+                continue
+            with self._lock:
+                self._values[key] = value
+        return super().collect()
+
+
+class Histogram(_Metric):
+    """按分桶统计观测值分布的直方图"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """
+        记录一次观测值
+
+        Args:
+            value (float): 观测值
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                # [各分桶计数..., 总和, 总次数]
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[index] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        计时上下文：记录代码块的耗时（秒），代码块抛出异常时同样记录
+
+        Args:
+            **labels: 标签值
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _sample_lines(self, key, data):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, data):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key, ('le', '+Inf'))
+        lines.append(f"{self.name}_bucket{labels} {data[-1]}")
+        base = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{base} {_format_value(data[-2])}")
+        lines.append(f"{self.name}_count{base} {data[-1]}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        注册指标，同名指标只保留第一个
+
+        Args:
+            metric (_Metric): 指标
+
+        Returns:
+            _Metric: 已注册的指标
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """
+        输出所有指标的 Prometheus 文本格式
+
+        Returns:
+            str: 指标文本
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    """创建并注册计数器"""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    """创建并注册仪表盘"""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """创建并注册直方图"""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# 各处理阶段的指标
+MESSAGES_TOTAL = counter('wxbot_messages_total', "收到的微信消息数", ('kind',))
+LISTENER_POLL_SECONDS = histogram('wxbot_listener_poll_seconds', "监听器一次拉取消息的耗时")
+DEBOUNCE_HOLD_SECONDS = histogram('wxbot_debounce_hold_seconds', "批次第一条消息到开始合并的时间")
+QUEUE_WAIT_SECONDS = histogram('wxbot_queue_wait_seconds', "开始合并到回复工作者取出批次的等待时间")
+INTENT_SECONDS = histogram('wxbot_intent_seconds', "意图识别耗时")
+PROVIDER_SECONDS = histogram('wxbot_provider_seconds', "各 AI 服务的请求耗时，流式请求计到最后一个增量", ('provider',))
+PROVIDER_FIRST_DELTA_SECONDS = histogram('wxbot_provider_first_delta_seconds', "流式请求收到第一个增量的耗时", ('provider',))
+DB_SECONDS = histogram('wxbot_db_seconds', "数据库读写耗时", ('operation',))
+SEND_SECONDS = histogram('wxbot_send_seconds', "发送一条微信消息（文本或文件）的耗时", ('kind',))
+SEND_FAILURES_TOTAL = counter('wxbot_send_failures_total', "发送失败的微信消息数", ('kind',))
+QUEUED_MESSAGES = gauge('wxbot_queued_messages', "用户消息队列中等待合并的消息数")
+QUEUED_CHATS = gauge('wxbot_queued_chats', "有待合并消息的会话数")
+ACTIVE_CHATS = gauge('wxbot_active_chats', "非空闲状态的会话数", ('state',))
+OUTBOUND_PENDING = gauge('wxbot_outbound_pending', "发送调度器中尚未发送的消息数")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics 请求处理"""
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 不把每次抓取写入日志
+        pass
+
+
+def start_metrics_server(host, port):
+    """
+    在后台线程启动指标 HTTP 服务
+
+    Args:
+        host (str): 监听地址，默认只监听本机
+        port (int): 端口
+
+    Returns:
+        ThreadingHTTPServer: HTTP 服务，启动失败时返回 None
+    """
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"指标服务启动失败 ({host}:{port}): {str(e)}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"指标服务已启动: http://{host}:{port}/metrics")
+    return server
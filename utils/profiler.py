@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+按需采样分析器
+运行中可随时开启：定时读取所有线程的调用栈，持续指定秒数后写出折叠栈文件（每行 "栈;栈;栈 次数"），
+可直接交给 flamegraph.pl、speedscope 等工具生成火焰图，查看时间花在 wxauto 界面操作、SQLAlchemy 还是 HTTP 请求上。
+
+触发方式：
+    - 信号：kill -USR1 <pid>（仅限支持 SIGUSR1 的系统）
+    - 标记文件：在项目根目录创建 PROFILER_TRIGGER_FILE，文件内容可写采样秒数
+    - 聊天指令：PROFILER_ADMINS 中的联系人私聊发送 "性能分析 30"
+
+未采样时只有标记文件检查线程每隔几秒查看一次文件是否存在，不影响消息处理。
+"""
+
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from config import (
+    PROFILER_ENABLED, PROFILER_OUTPUT_DIR, PROFILER_INTERVAL_SECONDS, PROFILER_DEFAULT_SECONDS,
+    PROFILER_MAX_SECONDS, PROFILER_TRIGGER_FILE, PROFILER_FLAG_CHECK_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 每个调用栈最多记录的层数，超出部分只保留最内层
+MAX_STACK_DEPTH = 128
+
+
+def clamp_seconds(seconds):
+    """把采样时长限制在 1 秒到 PROFILER_MAX_SECONDS 之间"""
+    return max(1, min(seconds, PROFILER_MAX_SECONDS))
+
+
+def _frame_label(frame):
+    """调用栈中一层的名称：模块名:函数名，第三方库按模块名即可区分"""
+    module = frame.f_globals.get('__name__') or os.path.basename(frame.f_code.co_filename)
+    return f"{module}:{frame.f_code.co_name}".replace(';', ':').replace(' ', '_')
+
+
+def collapse_stack(thread_name, frame):
+    """
+    把线程当前的调用栈转换为折叠栈格式
+
+    Args:
+        thread_name (str): 线程名称，作为栈的最外层
+        frame (FrameType): 线程当前执行的帧
+
+    Returns:
+        str: 由外到内、以分号分隔的调用栈
+    """
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name.replace(';', ':').replace(' ', '_'))
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class SamplingProfiler:
+    """定时采样所有线程调用栈的分析器，同一时间只进行一次采样"""
+
+    def __init__(self, output_dir, interval):
+        """
+        初始化分析器
+
+        Args:
+            output_dir (str): 折叠栈文件的输出目录
+            interval (float): 采样间隔（秒）
+        """
+        self.output_dir = output_dir
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._running = None  # 正在进行的采样的输出文件路径
+
+    def running(self):
+        """
+        获取正在进行的采样
+
+        Returns:
+            str: 输出文件路径，没有进行中的采样时返回 None
+        """
+        with self._lock:
+            return self._running
+
+    def start(self, seconds, reason):
+        """
+        在后台线程开始采样
+
+        Args:
+            seconds (float): 采样时长（秒），超过 PROFILER_MAX_SECONDS 时按最大值处理
+            reason (str): 触发方式，写入日志
+
+        Returns:
+            str: 输出文件路径，已有采样在进行时返回 None
+        """
+        seconds = clamp_seconds(seconds)
+        filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+        path = os.path.join(self.output_dir, filename)
+        with self._lock:
+            if self._running is not None:
+                logger.warning(f"性能分析进行中，忽略新的请求（{reason}）")
+                return None
+            self._running = path
+        logger.info(f"开始性能分析（{reason}），采样 {seconds:g} 秒")
+        threading.Thread(target=self._run, args=(seconds, path), name='profiler', daemon=True).start()
+        return path
+
+    def _run(self, seconds, path):
+        """采样线程：按间隔读取调用栈，结束后写出文件"""
+        try:
+            stacks, samples = self.sample(seconds)
+            self._write(path, stacks)
+            logger.info(f"性能分析完成，共采样 {samples} 次，结果已写入 {path}")
+        except Exception as e:
+            logger.error(f"性能分析失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._running = None
+
+    def sample(self, seconds):
+        """
+        在当前线程中采样指定时长
+
+        Args:
+            seconds (float): 采样时长（秒）
+
+        Returns:
+            tuple: (Counter{折叠栈: 次数}, 采样次数)
+        """
+        stacks = Counter()
+        own_ident = threading.get_ident()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stacks[collapse_stack(names.get(ident, f'thread-{ident}'), frame)] += 1
+            samples += 1
+            time.sleep(self.interval)
+        return stacks, samples
+
+    def _write(self, path, stacks):
+        """按次数从多到少写出折叠栈文件"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# 全局分析器
+profiler = SamplingProfiler(os.path.join(ROOT_DIR, PROFILER_OUTPUT_DIR), PROFILER_INTERVAL_SECONDS)
+
+
+def _read_flag_seconds(path):
+    """读取标记文件中的采样秒数，文件为空或内容无效时使用默认时长"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+        return float(content) if content else PROFILER_DEFAULT_SECONDS
+    except (OSError, ValueError):
+        return PROFILER_DEFAULT_SECONDS
+
+
+def watch_trigger_file():
+    """
+    检查标记文件，文件出现时开始采样并删除文件
+    持续运行的后台线程
+    """
+    path = os.path.join(ROOT_DIR, PROFILER_TRIGGER_FILE)
+    while True:
+        time.sleep(PROFILER_FLAG_CHECK_SECONDS)
+        if not os.path.exists(path):
+            continue
+        seconds = _read_flag_seconds(path)
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"删除性能分析标记文件失败: {str(e)}")
+        profiler.start(seconds, 'file')
+
+
+def _on_signal(signum, frame):
+    """信号处理函数，只启动采样线程，立即返回"""
+    profiler.start(PROFILER_DEFAULT_SECONDS, 'signal')
+
+
+def install_profiler_triggers():
+    """
+    注册信号和标记文件触发方式，需在主线程中调用
+    Windows 没有 SIGUSR1，只注册标记文件
+    """
+    if not PROFILER_ENABLED:
+        return
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _on_signal)
+        logger.info(f"性能分析可通过 kill -USR1 {os.getpid()} 触发")
+    threading.Thread(target=watch_trigger_file, name='profiler-trigger', daemon=True).start()
+
+
+def start_profiling_command(message):
+    """
+    处理聊天中的性能分析指令，例如 "性能分析 30"
+
+    Args:
+        message (str): 指令消息
+
+    Returns:
+        str: 回复内容
+    """
+    if not PROFILER_ENABLED:
+        return "性能分析未开启"
+    seconds = PROFILER_DEFAULT_SECONDS
+    for token in message.split():
+        if token.isdigit():
+            seconds = int(token)
+            break
+    path = profiler.start(seconds, 'command')
+    if path is None:
+        running = profiler.running()
+        where = f"，结果将写入 {os.path.relpath(running, ROOT_DIR)}" if running else ""
+        return f"性能分析正在进行{where}，请稍后再试"
+    return f"已开始性能分析 {clamp_seconds(seconds)} 秒，结果将写入 {os.path.relpath(path, ROOT_DIR)}"
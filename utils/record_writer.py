@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+聊天记录后台写入器
+聊天记录先进入内存队列，由后台线程攒批后在一个事务中提交（组提交），
+回复流程不再等待数据库写盘。
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from sqlalchemy import insert
+from database import Session, ChatMessage
+from utils.metrics import DB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 队列控制标记：停止写入线程
+_STOP = object()
+
+
+class _Flush:
+    """立即提交当前批次的请求，标记之前入队的记录全部写入后置位 done"""
+
+    __slots__ = ('done',)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class ChatRecordWriter:
+    """写回式（write-behind）聊天记录写入器"""
+
+    def __init__(self, batch_size, flush_interval):
+        """
+        初始化写入器
+
+        Args:
+            batch_size (int): 攒够多少条记录立即提交
+            flush_interval (float): 第一条记录入队后最多等待多少秒提交
+        """
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, record):
+        """
+        提交一条聊天记录，首次调用时启动后台线程
+
+        Args:
+            record (dict): ChatMessage 的字段值
+        """
+        self._ensure_started()
+        self._queue.put(record)
+
+    def flush(self):
+        """
+        立即提交当前批次，并阻塞直到调用前提交的记录全部写入数据库
+        只等待自己的标记，之后其它会话提交的记录不会延长等待
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        marker = _Flush()
+        self._queue.put(marker)
+        # 写入线程已停止时标记不会再被处理，不能无限等待
+        while not marker.done.wait(1):
+            if not thread.is_alive():
+                return
+
+    def stop(self):
+        """写完队列中剩余的记录后停止后台线程，可重复调用"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+        logger.info("聊天记录写入器已停止")
+
+    def _ensure_started(self):
+        """启动后台写入线程，并在进程退出时自动写完剩余记录"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        """后台线程：攒批并提交"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if isinstance(item, _Flush):
+                item.done.set()
+                continue
+
+            batch = [item]
+            marker = None
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, _Flush):
+                    marker = item
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            if marker is not None:
+                marker.done.set()
+            if stopping:
+                return
+
+    def _write(self, batch):
+        """在一个事务中写入一批记录"""
+        session = Session()
+        try:
+            with DB_SECONDS.time(operation='save_records'):
+                session.execute(insert(ChatMessage), batch)
+                session.commit()
+            logger.info(f"批量保存聊天记录 {len(batch)} 条")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"批量保存聊天记录失败（{len(batch)} 条）: {e}")
+        finally:
+            session.close()
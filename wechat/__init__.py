@@ -1,9 +1,9 @@
-"""
-微信操作模块
-包含微信消息监听和发送功能
-"""
-
-from wechat.listener import WeChatListener
-from wechat.sender import WeChatSender
-
+"""
+微信操作模块
+包含微信消息监听和发送功能
+"""
+
+from wechat.listener import WeChatListener
+from wechat.sender import WeChatSender
+
 __all__ = ['WeChatListener', 'WeChatSender'] 
\ No newline at end of file
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图片识别流水线
+图片和表情包交给后台线程调用 Moonshot 识别，监听线程不再等待识别接口。
+识别期间只暂缓该会话的消息合并，识别结果作为普通消息写入该会话的队列。
+"""
+
+import logging
+import queue
+import threading
+from config import IMAGE_RECOGNITION_WORKERS, IMAGE_RECOGNITION_QUEUE_SIZE
+from ai_clients.moonshot import recognize_image_with_moonshot, RECOGNITION_FAILED_TEXT
+
+logger = logging.getLogger(__name__)
+
+
+class ImageRecognitionPipeline:
+    """有界的图片识别队列和识别线程"""
+
+    def __init__(self, user_manager, workers=IMAGE_RECOGNITION_WORKERS, queue_size=IMAGE_RECOGNITION_QUEUE_SIZE):
+        """
+        初始化流水线
+
+        Args:
+            user_manager: 用户管理器（或异步运行时的分发器），需提供
+                          handle_message、hold_media、release_media
+            workers (int): 同时进行的识别请求数量
+            queue_size (int): 最多排队的图片数量，队列满时直接按识别失败处理
+        """
+        self.user_manager = user_manager
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, msg, image_path, is_emoji=False):
+        """
+        提交一张待识别的图片，立即返回
+
+        Args:
+            msg: 微信消息对象，识别完成后其内容被替换为识别结果
+            image_path (str): 图片路径
+            is_emoji (bool): 是否为表情包图片
+        """
+        self._ensure_started()
+        chat_target = getattr(msg, 'chat_who', msg.sender)
+        # 先暂缓该会话的消息合并，直到识别结果写入队列
+        self.user_manager.hold_media(chat_target)
+        try:
+            self._queue.put_nowait((msg, image_path, is_emoji))
+        except queue.Full:
+            logger.warning(f"图片识别队列已满，放弃识别 ({chat_target}): {image_path}")
+            msg.content = RECOGNITION_FAILED_TEXT
+            self.user_manager.handle_message(msg)
+            self.user_manager.release_media(chat_target)
+            return
+        logger.info(f"图片已加入识别队列 ({chat_target})，排队数量: {self._queue.qsize()}")
+
+    def _ensure_started(self):
+        """首次提交时启动识别线程"""
+        if self._threads:
+            return
+        with self._lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f'vision-worker-{i}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+                logger.info(f"图片识别线程已启动，数量: {self.workers}")
+
+    def _run(self):
+        """识别线程：识别图片并把结果写入会话队列"""
+        while True:
+            msg, image_path, is_emoji = self._queue.get()
+            chat_target = getattr(msg, 'chat_who', msg.sender)
+            try:
+                msg.content = recognize_image_with_moonshot(image_path, is_emoji)
+                self.user_manager.handle_message(msg)
+            except Exception as e:
+                logger.error(f"图片识别流水线处理失败 ({chat_target}): {str(e)}")
+            finally:
+                self.user_manager.release_media(chat_target)
+                self._queue.task_done()
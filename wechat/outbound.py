@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+微信发送调度器
+每个发送目标一个先进先出队列，每条待发送内容带有与同一目标上一条之间的最小间隔（模拟打字时间）。
+调度线程按到期时间交替发送各目标的内容：一条长回复的打字延迟只推迟它自己的后续分段，
+不会占用回复线程，也不会挡住发给其它会话的消息。
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from utils.metrics import SEND_SECONDS, SEND_FAILURES_TOTAL, OUTBOUND_PENDING
+
+logger = logging.getLogger(__name__)
+
+# 发送内容类型
+TEXT = 'text'  # 文本消息
+FILE = 'file'  # 文件（表情包）
+
+
+class SendDone(threading.Event):
+    """一组内容全部发送后置位的事件，可以注册置位后在发送线程中调用的回调"""
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def add_done_callback(self, func):
+        """
+        注册发送完毕后的回调，已发送完毕时立即在当前线程调用
+
+        Args:
+            func (Callable[[], None]): 回调函数，应尽快返回，不能阻塞发送线程
+        """
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(func)
+                return
+        func()
+
+    def set(self):
+        """置位并依次调用已注册的回调"""
+        with self._callbacks_lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for func in callbacks:
+            try:
+                func()
+            except Exception as e:
+                logger.error(f"发送完成回调执行失败: {str(e)}")
+
+
+class _Item:
+    """一条待发送的内容"""
+
+    __slots__ = ('kind', 'payload', 'delay', 'done')
+
+    def __init__(self, kind, payload, delay, done):
+        self.kind = kind
+        self.payload = payload
+        self.delay = delay
+        self.done = done
+
+
+class OutboundScheduler:
+    """按目标排队、按到期时间交替发送的调度器"""
+
+    def __init__(self, send_text, send_file):
+        """
+        初始化并启动调度线程
+
+        Args:
+            send_text (Callable[[str, str], None]): 发送文本，参数为 (内容, 目标)
+            send_file (Callable[[str, str], None]): 发送文件，参数为 (文件路径, 目标)
+        """
+        self._senders = {TEXT: send_text, FILE: send_file}
+        self._targets = {}  # {目标: {'items': deque([_Item]), 'last_sent': 上一条发送完成的时间}}
+        self._heap = []  # [(到期时间, 序号, 目标)]，每个有待发送内容的目标一项
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='wx-outbound', daemon=True)
+        self._thread.start()
+        OUTBOUND_PENDING.set_function(self.pending)
+
+    def enqueue(self, target, items):
+        """
+        把一组内容追加到目标的队列末尾
+
+        Args:
+            target (str): 发送目标
+            items (list): [(类型, 内容, 间隔秒数), ...]，间隔为距同一目标上一条发送完成的最小时间
+
+        Returns:
+            SendDone: 这组内容全部发送（或发送失败）后置位
+        """
+        done = SendDone()
+        if not items:
+            done.set()
+            return done
+        with self._cond:
+            state = self._targets.setdefault(target, {'items': deque(), 'last_sent': 0.0})
+            idle = not state['items']
+            last = len(items) - 1
+            for index, (kind, payload, delay) in enumerate(items):
+                state['items'].append(_Item(kind, payload, delay, done if index == last else None))
+            if idle:
+                self._schedule(target, state)
+                self._cond.notify_all()
+        return done
+
+    def pending(self):
+        """
+        获取尚未发送的内容数量
+
+        Returns:
+            int: 所有目标队列中的内容总数
+        """
+        with self._cond:
+            return sum(len(state['items']) for state in self._targets.values())
+
+    def wait_idle(self, timeout=None):
+        """
+        等待所有队列发送完毕
+
+        Args:
+            timeout (float, optional): 最长等待时间（秒）
+
+        Returns:
+            bool: 是否已全部发送
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(state['items'] for state in self._targets.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _schedule(self, target, state):
+        """按队首内容的间隔计算目标的到期时间（调用方需持有锁）"""
+        item = state['items'][0]
+        due = max(time.monotonic(), state['last_sent'] + item.delay)
+        heapq.heappush(self._heap, (due, next(self._seq), target))
+
+    def _run(self):
+        """调度线程：取出最早到期的目标，发送其队首内容"""
+        while True:
+            with self._cond:
+                while True:
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                _, _, target = heapq.heappop(self._heap)
+                state = self._targets[target]
+                item = state['items'][0]
+
+            try:
+                with SEND_SECONDS.time(kind=item.kind):
+                    self._senders[item.kind](item.payload, target)
+            except Exception as e:
+                SEND_FAILURES_TOTAL.inc(kind=item.kind)
+                logger.error(f"发送到 {target} 失败: {str(e)}")
+
+            with self._cond:
+                state['items'].popleft()
+                state['last_sent'] = time.monotonic()
+                if state['items']:
+                    self._schedule(target, state)
+                else:
+                    # 通知 wait_idle
+                    self._cond.notify_all()
+            if item.done is not None:
+                item.done.set()
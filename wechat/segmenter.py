@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+回复分段器
+一次线性扫描把回复切分为可以发送的段落，完整回复和流式输出的回复增量共用同一套规则：
+
+    1. 代码块（```）整体作为一段，块内不再切分
+    2. 反斜杠分隔符和 Markdown 标题行是硬边界；出现代码块或标题后视为 Markdown 回复，
+       之后的反斜杠按原文保留（如 Windows 路径、正则表达式）
+    3. 空行分隔段落；开启合并时相邻的短段落以空行连接，合并到不超过长度上限
+    4. 超过长度上限的段落按句末标点切分后合并，单句仍超长时按上限截断
+"""
+
+import re
+
+# Markdown 代码块标记
+FENCE = '```'
+# 单条消息的最大长度
+MAX_SEGMENT_LENGTH = 500
+
+# 代码块之外的分段边界：代码块开始、反斜杠分隔符、空行、标题行（换行后紧跟 #）
+_BOUNDARY = re.compile(r'```|\\|\n[ \t]*\n(?:[ \t]*\n)*|\n(?=#)')
+# 句末位置（句末标点之后的空白一并去掉）
+_SENTENCE_END = re.compile(r'(?<=[。！？.!?])\s*')
+# 边界模式可能跨越增量的最大长度：流式输入时缓冲区末尾这么多字符等下一段增量到达后再判断
+_LOOKAHEAD = len(FENCE)
+
+
+class StreamSegmenter:
+    """
+    增量分段器
+
+    每次 feed 传入新的文本增量，返回其中已经完整的段落；剩余文本在 flush 时返回。
+    扫描位置只向前移动，整段回复的分段开销与长度成正比。
+    """
+
+    def __init__(self, max_length=MAX_SEGMENT_LENGTH, pack=False, split_backslash=True):
+        """
+        初始化分段器
+
+        Args:
+            max_length (int): 单段最大长度（代码块除外）
+            pack (bool): 是否把相邻的短段落合并为一段，流式发送时关闭以便每段完整后立即发送
+            split_backslash (bool): 是否把反斜杠作为分段边界，已知是 Markdown 的回复应关闭
+        """
+        self.max_length = max_length
+        self.pack = pack
+        self.split_backslash = split_backslash
+        self._buffer = ""
+        self._scan = 0  # 下一次查找边界的起始位置
+        self._in_fence = False
+        self._markdown = False  # 已出现代码块或标题，之后的反斜杠不再分段
+        self._packed = []  # 等待合并的段落
+        self._packed_length = 0
+
+    def feed(self, delta):
+        """
+        追加文本增量
+
+        Args:
+            delta (str): 新收到的文本
+
+        Returns:
+            list: 已完整的段落列表
+        """
+        self._buffer += delta
+        segments = []
+        self._consume(segments, final=False)
+        return segments
+
+    def flush(self):
+        """
+        结束输入，返回缓冲区中剩余的文本
+
+        Returns:
+            list: 剩余段落列表
+        """
+        segments = []
+        self._consume(segments, final=True)
+        if self._in_fence:
+            # 未闭合的代码块原样发送
+            tail = self._buffer.strip()
+            if tail:
+                segments.append(tail)
+        else:
+            self._add_paragraph(self._buffer, segments)
+        self._emit_packed(segments)
+        self._buffer = ""
+        self._scan = 0
+        self._in_fence = False
+        self._markdown = False
+        return segments
+
+    def _consume(self, segments, final):
+        """从缓冲区开头依次切出完整的段落"""
+        buffer = self._buffer
+        start = 0
+        # 流式输入时，末尾可能是不完整的边界，留到下一次判断
+        limit = len(buffer) if final else len(buffer) - _LOOKAHEAD
+        while True:
+            if self._in_fence:
+                close = buffer.find(FENCE, max(self._scan, start + len(FENCE)))
+                if close < 0:
+                    self._scan = max(start + len(FENCE), len(buffer) - len(FENCE) + 1)
+                    break
+                end = close + len(FENCE)
+                self._emit_packed(segments)
+                segments.append(buffer[start:end].strip())
+                start = self._scan = end
+                self._in_fence = False
+                continue
+
+            if buffer.startswith('#', start):
+                self._markdown = True
+            match = _BOUNDARY.search(buffer, max(self._scan, start))
+            if match is None:
+                # 末尾的空白可能是尚未完整的空行，下次从空白开始处继续查找
+                self._scan = max(start, min(limit, len(buffer.rstrip(' \t\n'))))
+                break
+            if match.end() > limit:
+                self._scan = match.start()
+                break
+
+            token = match.group()
+            if token == '\\' and (self._markdown or not self.split_backslash):
+                # Markdown 中的反斜杠是正文内容，继续向后查找
+                self._scan = match.end()
+                continue
+            self._add_paragraph(buffer[start:match.start()], segments)
+            if token == FENCE:
+                self._emit_packed(segments)
+                start = self._scan = match.start()
+                self._in_fence = True
+                self._markdown = True
+                continue
+            start = self._scan = match.end()
+            if token.strip(' \t') != '\n' and token != '\\' and not buffer.startswith('#', start):
+                # 空行：段落边界，可与下一段合并
+                continue
+            # 反斜杠、标题行：硬边界
+            self._emit_packed(segments)
+
+        if start:
+            self._buffer = buffer[start:]
+            self._scan -= start
+
+    def _add_paragraph(self, text, segments):
+        """处理一个完整的段落：超长时按句切分，开启合并时放入待合并列表，否则直接输出"""
+        text = text.strip()
+        if not text:
+            return
+        pieces = [text] if len(text) <= self.max_length else self._split_sentences(text)
+        for piece in pieces:
+            if not self.pack:
+                segments.append(piece)
+                continue
+            joined = self._packed_length + (2 if self._packed else 0) + len(piece)
+            if self._packed and joined > self.max_length:
+                self._emit_packed(segments)
+                joined = len(piece)
+            self._packed.append(piece)
+            self._packed_length = joined
+
+    def _split_sentences(self, text):
+        """把超长段落按句末标点切分，并合并到不超过长度上限"""
+        pieces = []
+        current = []
+        length = 0
+        for sentence in _SENTENCE_END.split(text):
+            while len(sentence) > self.max_length:
+                # 单句超长，按上限截断
+                if current:
+                    pieces.append("".join(current))
+                    current, length = [], 0
+                pieces.append(sentence[:self.max_length])
+                sentence = sentence[self.max_length:]
+            if not sentence:
+                continue
+            if length + len(sentence) > self.max_length:
+                pieces.append("".join(current))
+                current, length = [], 0
+            current.append(sentence)
+            length += len(sentence)
+        if current:
+            pieces.append("".join(current))
+        return pieces
+
+    def _emit_packed(self, segments):
+        """输出待合并的段落"""
+        if self._packed:
+            segments.append("\n\n".join(self._packed))
+            self._packed = []
+            self._packed_length = 0
+
+
+def segment_reply(text, max_length=MAX_SEGMENT_LENGTH, pack=True, split_backslash=True):
+    """
+    把完整的回复切分为段落
+
+    Args:
+        text (str): 回复内容
+        max_length (int): 单段最大长度（代码块除外）
+        pack (bool): 是否把相邻的短段落合并为一段
+        split_backslash (bool): 是否把反斜杠作为分段边界
+
+    Returns:
+        list: 段落列表
+    """
+    segmenter = StreamSegmenter(max_length, pack, split_backslash)
+    return segmenter.feed(text) + segmenter.flush()
@@ -1,193 +1,242 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-"""
-微信消息发送器
-负责发送微信消息、表情包等
-"""
-
-import logging
-import random
-import time
-import os
-import re
-from wxauto import WeChat
-from config import GROUP_LIST
-from utils.emoji_utils import is_emoji_request, get_random_emoji
-from utils.chat_context_manager import save_chat_record
-
-logger = logging.getLogger(__name__)
-
-class WeChatSender:
-    """微信消息发送器"""
-
-    def __init__(self):
-        """初始化微信消息发送器"""
-        self.wx = WeChat()
-        self.is_sending_message = False
-        self.root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        logger.info("微信消息发送器初始化完成")
-
-    def send_reply(self, user_id, sender_name, username, message, reply):
-        """
-        发送回复消息
-
-        Args:
-            user_id (str): 用户ID
-            sender_name (str): 发送者名称
-            username (str): 用户名
-            message (str): 原始消息
-            reply (str): 回复内容
-        """
-        try:
-            self.is_sending_message = True
-
-            # 判断回复目标
-            if user_id in GROUP_LIST:
-                target = user_id
-                reply = f"@{sender_name} {reply}"
-            else:
-                target = sender_name
-
-            # 检查是否需要发送表情包
-            if is_emoji_request(message) or is_emoji_request(reply):
-                emoji_path = get_random_emoji(self.root_dir)
-                if emoji_path:
-                    try:
-                        logger.info(f"发送表情包到 {target}: {emoji_path}")
-                        self.wx.SendFiles(filepath=emoji_path, who=target)
-                    except Exception as e:
-                        logger.error(f"发送表情包失败: {str(e)}")
-
-            # 处理Markdown格式的回复
-            if '```' in reply or '#' in reply:
-                logger.info("检测到可能的Markdown格式内容，进行分段处理")
-                segments = self.split_markdown_content(reply)
-                for segment in segments:
-                    if segment.strip():
-                        self.wx.SendMsg(segment, target)
-                        logger.info(f"分段回复Markdown内容给 {sender_name}")
-                        # 添加延迟，模拟打字速度
-                        typing_delay = min(len(segment) * 0.01, 2) + random.uniform(0.5, 1.5)
-                        time.sleep(typing_delay)
-            # 处理回复文本中可能的分段逻辑
-            elif '\\' in reply:
-                parts = [p.strip() for p in reply.split('\\') if p.strip()]
-                for i, part in enumerate(parts):
-                    self.wx.SendMsg(part, target)
-                    logger.info(f"分段回复 {sender_name}: {part}")
-                    if i < len(parts) - 1:
-                        next_part = parts[i + 1]
-                        average_typing_speed = 0.1
-                        delay = len(next_part) * (average_typing_speed + random.uniform(0.05, 0.15))
-                        time.sleep(delay)
-            # 处理长文本回复
-            elif len(reply) > 500:
-                segments = self.split_long_text(reply)
-                for segment in segments:
-                    if segment.strip():
-                        self.wx.SendMsg(segment, target)
-                        logger.info(f"长文本分段回复给 {sender_name}")
-                        # 添加延迟，模拟打字速度
-                        typing_delay = min(len(segment) * 0.01, 2) + random.uniform(0.5, 1.5)
-                        time.sleep(typing_delay)
-            else:
-                self.wx.SendMsg(reply, target)
-                logger.info(f"回复 {sender_name}: {reply}")
-
-            # 保存当前对话记录到数据库
-            save_chat_record(username, sender_name, message, reply)
-
-        except Exception as e:
-            logger.error(f"发送回复失败: {str(e)}")
-        finally:
-            self.is_sending_message = False
-            
-    def split_markdown_content(self, content):
-        """
-        将Markdown内容分段处理
-        
-        Args:
-            content (str): Markdown格式的内容
-            
-        Returns:
-            list: 分段后的内容列表
-        """
-        # 处理代码块
-        if '```' in content:
-            # 匹配代码块的正则表达式
-            code_block_pattern = r'(```[\s\S]*?```)'
-            parts = re.split(code_block_pattern, content)
-            
-            # 继续处理非代码块部分
-            result = []
-            for part in parts:
-                if part.startswith('```') and part.endswith('```'):
-                    # 代码块部分保持完整
-                    result.append(part)
-                else:
-                    # 非代码块部分按段落分割
-                    paragraphs = self.split_paragraphs(part)
-                    result.extend(paragraphs)
-            return result
-        else:
-            # 没有代码块，直接按段落分割
-            return self.split_paragraphs(content)
-    
-    def split_paragraphs(self, text):
-        """
-        按段落和标题分割文本
-        
-        Args:
-            text (str): 待分割的文本
-            
-        Returns:
-            list: 分段后的文本列表
-        """
-        # 按标题和段落分割
-        # 匹配标题(#开头)或连续两个换行符
-        segments = re.split(r'(?=\n*#)|(?<=\n)\n+(?=\S)', text)
-        return [seg.strip() for seg in segments if seg.strip()]
-        
-    def split_long_text(self, text, max_length=500):
-        """
-        将长文本分割为适合发送的段落
-        
-        Args:
-            text (str): 待分割的长文本
-            max_length (int): 单条消息的最大长度
-            
-        Returns:
-            list: 分段后的文本列表
-        """
-        # 首先尝试按段落分割
-        paragraphs = re.split(r'\n{2,}', text)
-        
-        result = []
-        current_segment = ""
-        
-        for para in paragraphs:
-            # 如果段落本身就超过最大长度，按句子分割
-            if len(para) > max_length:
-                sentences = re.split(r'(?<=[。！？.!?])\s*', para)
-                for sentence in sentences:
-                    if len(current_segment) + len(sentence) <= max_length:
-                        current_segment += sentence
-                    else:
-                        if current_segment:
-                            result.append(current_segment)
-                        current_segment = sentence
-            # 段落不超过最大长度，检查与当前段落合并是否会超过
-            elif len(current_segment) + len(para) <= max_length:
-                if current_segment and not current_segment.endswith("\n"):
-                    current_segment += "\n\n" + para
-                else:
-                    current_segment += para
-            else:
-                result.append(current_segment)
-                current_segment = para
-        
-        # 添加最后一个段落
-        if current_segment:
-            result.append(current_segment)
-            
-        return result
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+微信消息发送器
+负责发送微信消息、表情包等
+"""
+
+import logging
+import random
+import threading
+import os
+from wxauto import WeChat
+from config import GROUP_LIST, EMOJI_DIR
+from utils.emoji_utils import is_emoji_request, get_random_emoji, get_emotion_tags
+from utils.emoji_catalog import get_emoji_catalog
+from utils.chat_context_manager import save_chat_record
+from wechat.segmenter import StreamSegmenter, segment_reply, MAX_SEGMENT_LENGTH
+from wechat.outbound import OutboundScheduler, TEXT, FILE
+
+logger = logging.getLogger(__name__)
+
+
+def _typing_delay(segment):
+    """段落之间的打字延迟（秒）"""
+    return min(len(segment) * 0.01, 2) + random.uniform(0.5, 1.5)
+
+
+def _part_delay(part):
+    """反斜杠分隔的短句之间的打字延迟（秒），按下一句的长度计算"""
+    average_typing_speed = 0.1
+    return len(part) * (average_typing_speed + random.uniform(0.05, 0.15))
+
+
+class WeChatSender:
+    """微信消息发送器"""
+
+    def __init__(self):
+        """初始化微信消息发送器"""
+        self.wx = WeChat()
+        # wxauto 通过界面自动化发送消息，多个回复工作线程需串行操作微信窗口
+        self.ui_lock = threading.Lock()
+        # 分段之间的打字延迟由发送调度器按目标排队等待，不占用回复线程
+        self.outbound = OutboundScheduler(self._send_text, self._send_file)
+        self.root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # 启动时建立表情包索引
+        get_emoji_catalog(os.path.join(self.root_dir, EMOJI_DIR))
+        logger.info("微信消息发送器初始化完成")
+
+    def send_reply(self, user_id, sender_name, username, message, reply):
+        """
+        发送回复消息
+        回复按格式分段后交给发送调度器，本方法不等待发送完成
+
+        Args:
+            user_id (str): 用户ID
+            sender_name (str): 发送者名称
+            username (str): 用户名
+            message (str): 原始消息
+            reply (str): 回复内容
+
+        Returns:
+            SendDone: 回复全部发送后置位，发送失败时返回 None
+        """
+        try:
+            # 判断回复目标
+            if user_id in GROUP_LIST:
+                target = user_id
+                reply = f"@{sender_name} {reply}"
+            else:
+                target = sender_name
+
+            items = []
+            # 检查是否需要发送表情包
+            if is_emoji_request(message) or is_emoji_request(reply):
+                emoji_path = self._choose_emoji(get_emotion_tags(message, reply))
+                if emoji_path:
+                    items.append((FILE, emoji_path, 0))
+
+            # Markdown 格式的回复按标题和段落逐段发送，其余回复把短段落合并后发送
+            is_markdown = '```' in reply or '#' in reply
+            if is_markdown:
+                logger.info("检测到可能的Markdown格式内容，进行分段处理")
+            segments = segment_reply(reply, pack=not is_markdown, split_backslash=not is_markdown)
+            # 反斜杠分隔的短句按下一句的长度模拟打字时间
+            delay = _part_delay if '\\' in reply and not is_markdown else _typing_delay
+            items.extend((TEXT, segment, delay(segment) if i else 0) for i, segment in enumerate(segments))
+
+            done = self.outbound.enqueue(target, items)
+            logger.info(f"回复 {sender_name} 已加入发送队列，共 {len(items)} 条: {reply}")
+
+            # 保存当前对话记录到数据库
+            save_chat_record(username, sender_name, message, reply)
+            return done
+
+        except Exception as e:
+            logger.error(f"发送回复失败: {str(e)}")
+            return None
+
+    def send_stream(self, user_id, sender_name, username, message, deltas):
+        """
+        流式发送回复：边接收模型输出边分段，每段完整后立即加入发送队列
+
+        Args:
+            user_id (str): 用户ID
+            sender_name (str): 发送者名称
+            username (str): 用户名
+            message (str): 原始消息
+            deltas (Iterator[str]): 回复文本增量
+
+        Returns:
+            SendDone: 已加入队列的内容全部发送后置位，没有任何内容加入队列时返回 None
+        """
+        is_group = user_id in GROUP_LIST
+        target = user_id if is_group else sender_name
+        segmenter = StreamSegmenter()
+        chunks = []
+        sent_count = 0
+        # 同一目标的队列按顺序发送，最后加入的内容发送完时之前的内容都已发出
+        done = None
+
+        def send_segment(segment):
+            nonlocal sent_count, done
+            if sent_count == 0 and is_group:
+                segment = f"@{sender_name} {segment}"
+            # 模拟打字速度：间隔从上一段发送完成时算起，模型生成本身耗费的时间计入延迟
+            delay = _typing_delay(segment) if sent_count else 0
+            done = self.outbound.enqueue(target, [(TEXT, segment, delay)])
+            sent_count += 1
+            logger.info(f"流式分段回复 {sender_name}: {segment}")
+
+        try:
+            # 原始消息就请求了表情包时先发送表情包，其余情况等回复完整后再判断
+            emoji_done = self._send_random_emoji(target, get_emotion_tags(message)) if is_emoji_request(message) else None
+            done = emoji_done
+
+            for delta in deltas:
+                chunks.append(delta)
+                for segment in segmenter.feed(delta):
+                    send_segment(segment)
+            for segment in segmenter.flush():
+                send_segment(segment)
+
+            reply = "".join(chunks).strip()
+            if emoji_done is None and is_emoji_request(reply):
+                done = self._send_random_emoji(target, get_emotion_tags(reply)) or done
+
+            # 保存当前对话记录到数据库
+            save_chat_record(username, sender_name, message, f"@{sender_name} {reply}" if is_group else reply)
+            return done
+        except Exception as e:
+            logger.error(f"流式发送回复失败: {str(e)}")
+            return done
+
+    def _choose_emoji(self, tags=None):
+        """
+        随机选择一个表情包，优先选择带有给定标签的表情包
+
+        Args:
+            tags (Iterable[str], optional): 期望的标签
+
+        Returns:
+            str: 表情包路径，没有可用的表情包时返回 None
+        """
+        emoji_path = get_random_emoji(self.root_dir, tags)
+        if emoji_path:
+            logger.info(f"选择表情包: {emoji_path}")
+        return emoji_path
+
+    def _send_random_emoji(self, target, tags=None):
+        """
+        随机选择一个表情包加入目标的发送队列
+
+        Args:
+            target (str): 发送目标
+            tags (Iterable[str], optional): 期望的标签
+
+        Returns:
+            SendDone: 表情包发送后置位，没有表情包可发送时返回 None
+        """
+        emoji_path = self._choose_emoji(tags)
+        if not emoji_path:
+            return None
+        return self.outbound.enqueue(target, [(FILE, emoji_path, 0)])
+
+    def _send_text(self, text, target):
+        """
+        发送一条文本消息，只在操作微信窗口期间持有界面锁
+
+        Args:
+            text (str): 消息内容
+            target (str): 发送目标
+        """
+        with self.ui_lock:
+            self.wx.SendMsg(text, target)
+
+    def _send_file(self, filepath, target):
+        """
+        发送一个文件（表情包），只在操作微信窗口期间持有界面锁
+
+        Args:
+            filepath (str): 文件路径
+            target (str): 发送目标
+        """
+        with self.ui_lock:
+            self.wx.SendFiles(filepath=filepath, who=target)
+
+    def split_markdown_content(self, content):
+        """
+        将Markdown内容分段处理：代码块保持完整，按标题和段落分割
+
+        Args:
+            content (str): Markdown格式的内容
+
+        Returns:
+            list: 分段后的内容列表
+        """
+        return segment_reply(content, pack=False, split_backslash=False)
+
+    def split_paragraphs(self, text):
+        """
+        按段落和标题分割文本
+
+        Args:
+            text (str): 待分割的文本
+
+        Returns:
+            list: 分段后的文本列表
+        """
+        return segment_reply(text, pack=False, split_backslash=False)
+
+    def split_long_text(self, text, max_length=MAX_SEGMENT_LENGTH):
+        """
+        将长文本分割为适合发送的段落，相邻的短段落合并到不超过最大长度
+
+        Args:
+            text (str): 待分割的长文本
+            max_length (int): 单条消息的最大长度
+
+        Returns:
+            list: 分段后的文本列表
+        """
+        return segment_reply(text, max_length)